@@ -0,0 +1,67 @@
+from board.benchmark import DEFAULT_REGRESSION_THRESHOLD
+from board.benchmark import compare_benchmarks
+from board.benchmark import default_strategy_names
+from board.benchmark import load_benchmarks
+from board.benchmark import run_benchmarks
+from board.benchmark import save_benchmarks
+import argparse
+import sys
+
+# Benchmark the update strategies headless, and check for regressions against
+# a saved baseline.
+
+def parse_size(size):
+  """Parse a board size given as ROWSxCOLS."""
+
+  rows, _, cols = size.partition("x")
+  return int(rows), int(cols)
+
+def main():
+
+  arg_parser = argparse.ArgumentParser("Update strategy benchmarks")
+
+  arg_parser.add_argument("--strategies", dest="strategies", nargs="+", required=False, default=default_strategy_names(), help="Strategies to benchmark")
+  arg_parser.add_argument("--sizes", dest="sizes", nargs="+", required=False, type=parse_size, default=[(100, 100), (1000, 1000)], help="Board sizes to benchmark, as ROWSxCOLS")
+  arg_parser.add_argument("--densities", dest="densities", nargs="+", required=False, type=float, default=[0.1, 0.5], help="Fractions of cells alive on the starting boards")
+  arg_parser.add_argument("--generations", dest="generations", nargs="+", required=False, type=int, default=[100], help="Numbers of generations to time")
+  arg_parser.add_argument("--seed", dest="seed", required=False, type=int, default=0, help="Seed for the random starting boards")
+  arg_parser.add_argument("--output", dest="output_path", required=False, default=None, help="Write the results to this JSON file")
+  arg_parser.add_argument("--input", dest="input_path", required=False, default=None, help="Read results from this JSON file instead of running the benchmarks")
+  arg_parser.add_argument("--compare", dest="baseline_path", required=False, default=None, help="Compare the results with the baseline in this JSON file, exiting with an error on regressions")
+  arg_parser.add_argument("--threshold", dest="threshold", required=False, type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="Fraction an update rate can drop below its baseline before it is a regression")
+  arg_parser.add_argument("--no-isolation", action="store_false", dest="isolate", required=False, default=True, help="Run every case in this process, instead of a fresh one each")
+  args = arg_parser.parse_args()
+
+  def report(result):
+    case = (result["strategy"] + " " + str(result["rows"]) + "x" + str(result["cols"])
+      + " density " + str(result["density"]) + " generations " + str(result["generations"]))
+    if "skipped" in result:
+      print(case, " Skipped:", result["skipped"])
+    else:
+      latency = result["latency_seconds"]
+      print(case, " Update rate:", round(result["cells_per_second"]), "cells/s",
+        " Latency p50/p90/p99:", round(latency["p50"] * 1000, 3), round(latency["p90"] * 1000, 3),
+        round(latency["p99"] * 1000, 3), "ms",
+        " Peak RSS:", round(result["peak_rss_bytes"] / (1 << 20), 1), "MiB")
+
+  if args.input_path is not None:
+    benchmarks = load_benchmarks(args.input_path)
+  else:
+    benchmarks = run_benchmarks(args.strategies, args.sizes, args.densities, args.generations,
+      seed=args.seed, isolate=args.isolate, report=report)
+
+  if args.output_path is not None:
+    save_benchmarks(benchmarks, args.output_path)
+
+  if args.baseline_path is not None:
+    regressions = compare_benchmarks(load_benchmarks(args.baseline_path), benchmarks,
+      args.threshold)
+    for (strategy, rows, cols, density, generations), baseline_rate, rate in regressions:
+      print("Regression:", strategy, str(rows) + "x" + str(cols), "density", density,
+        "generations", generations, " Update rate:", round(rate), "cells/s, was",
+        round(baseline_rate), "cells/s")
+    if regressions:
+      sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,194 @@
+from board.registry import NAMED_ONLY_STRATEGIES
+from board.registry import STRATEGIES
+from board.registry import create_strategy
+import concurrent.futures
+import json
+import multiprocessing
+import numpy
+import os
+import platform
+import resource
+import sys
+import time
+import unittest
+
+# Fraction by which a result's update rate can drop below its baseline
+# before it counts as a regression.
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+
+def default_strategy_names():
+  """Returns the names of the strategies benchmarked when none are given."""
+
+  return [name for name in STRATEGIES if name not in NAMED_ONLY_STRATEGIES]
+
+def peak_rss_bytes():
+  """Returns the peak resident set size of this process, in bytes."""
+
+  peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports kilobytes, macOS bytes.
+  return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+def benchmark_case(strategy_name, rows, cols, density, generations, seed):
+  """
+    Time updates of a seeded random board with the given strategy. Returns a
+    dictionary describing the case and its results, or why it was skipped.
+  """
+
+  result = {"strategy": strategy_name, "rows": rows, "cols": cols, "density": density,
+    "generations": generations, "seed": seed}
+
+  try:
+    strategy, board_state_class = create_strategy(strategy_name)
+  except ImportError as error:
+    result["skipped"] = str(error)
+    return result
+
+  try:
+    board_state = board_state_class(rows, cols)
+    board_state.randomize_state(density=density, seed=seed)
+
+    # The first update may compile kernels or start workers, so leave it out
+    # of the timing.
+    board_state.update(strategy)
+
+    latencies = numpy.zeros(generations)
+    generations_per_update = strategy.generations_per_update
+    for update in range(0, generations):
+      start_time = time.perf_counter()
+      board_state.update(strategy)
+      latencies[update] = time.perf_counter() - start_time
+  finally:
+    if hasattr(strategy, "close"):
+      strategy.close()
+
+  result["cells_per_second"] = (
+    rows * cols * generations * generations_per_update / latencies.sum())
+  result["latency_seconds"] = {
+    "p50": numpy.percentile(latencies, 50),
+    "p90": numpy.percentile(latencies, 90),
+    "p99": numpy.percentile(latencies, 99),
+    "max": latencies.max(),
+  }
+  result["peak_rss_bytes"] = peak_rss_bytes()
+  return result
+
+def run_benchmarks(strategy_names, sizes, densities, generation_counts, seed=0,
+    isolate=True, report=None):
+  """
+    Benchmark each combination of strategy, (rows, cols) board size, density
+    and generation count. Returns a dictionary of the environment and a list
+    of results, suitable for writing as JSON.
+
+    When isolated, each case runs in a fresh process, so that its peak RSS
+    is its own and not left over from earlier cases. Each result is passed to
+    the report function, if given, as soon as it is ready.
+  """
+
+  cases = [(strategy_name, rows, cols, density, generations, seed)
+    for strategy_name in strategy_names
+    for rows, cols in sizes
+    for density in densities
+    for generations in generation_counts]
+
+  results = []
+
+  if isolate:
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=1,
+      mp_context=multiprocessing.get_context("spawn"), max_tasks_per_child=1)
+    with executor:
+      for case in cases:
+        results.append(executor.submit(benchmark_case, *case).result())
+        if report:
+          report(results[-1])
+  else:
+    for case in cases:
+      results.append(benchmark_case(*case))
+      if report:
+        report(results[-1])
+
+  return {"environment": benchmark_environment(), "results": results}
+
+def benchmark_environment():
+  """Returns a description of the machine and software the benchmarks ran on."""
+
+  return {
+    "python": platform.python_version(),
+    "numpy": numpy.__version__,
+    "platform": platform.platform(),
+    "processor": platform.processor(),
+    "cpu_count": os.cpu_count(),
+  }
+
+def result_key(result):
+  """Returns what identifies a benchmark case, for matching it to a baseline."""
+
+  return (result["strategy"], result["rows"], result["cols"], result["density"],
+    result["generations"])
+
+def compare_benchmarks(baseline, current, threshold=DEFAULT_REGRESSION_THRESHOLD):
+  """
+    Compare the results of two benchmark runs. Returns a list of
+    (result key, baseline rate, current rate) for each case whose update rate
+    dropped by more than the threshold fraction. Cases that either run
+    skipped, or that only one run has, are ignored.
+  """
+
+  baseline_rates = {result_key(result): result["cells_per_second"]
+    for result in baseline["results"] if "cells_per_second" in result}
+
+  regressions = []
+  for result in current["results"]:
+    baseline_rate = baseline_rates.get(result_key(result))
+    if baseline_rate is None or "cells_per_second" not in result:
+      continue
+
+    if result["cells_per_second"] < baseline_rate * (1 - threshold):
+      regressions.append((result_key(result), baseline_rate, result["cells_per_second"]))
+
+  return regressions
+
+def save_benchmarks(benchmarks, path):
+  """Write benchmark results to a JSON file."""
+
+  with open(path, "w") as file:
+    json.dump(benchmarks, file, indent=2)
+
+def load_benchmarks(path):
+  """Read benchmark results from a JSON file."""
+
+  with open(path) as file:
+    return json.load(file)
+
+
+class BenchmarkTests(unittest.TestCase):
+  """Tests for running and comparing benchmarks."""
+
+  def test_run_benchmarks_covers_every_case(self):
+
+    benchmarks = run_benchmarks(["numpy", "packed"], [(20, 30)], [0.2, 0.5], [3],
+      seed=1, isolate=False)
+
+    self.assertEqual(len(benchmarks["results"]), 4)
+    for result in benchmarks["results"]:
+      self.assertGreater(result["cells_per_second"], 0)
+      self.assertLessEqual(result["latency_seconds"]["p50"], result["latency_seconds"]["max"])
+      self.assertGreater(result["peak_rss_bytes"], 0)
+
+    # Results can be written as JSON.
+    json.dumps(benchmarks)
+
+  def test_compare_flags_slower_cases(self):
+
+    def benchmarks(*rates):
+      return {"results": [
+        {"strategy": strategy, "rows": 10, "cols": 10, "density": 0.5, "generations": 5,
+          "cells_per_second": rate}
+        for strategy, rate in zip(["numpy", "packed", "numba"], rates)]}
+
+    regressions = compare_benchmarks(benchmarks(100.0, 100.0, 100.0),
+      benchmarks(95.0, 50.0, 200.0))
+
+    self.assertEqual(regressions, [(("packed", 10, 10, 0.5, 5), 100.0, 50.0)])
+
+if __name__ == '__main__':
+  unittest.main()
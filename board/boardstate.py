@@ -1,15 +1,55 @@
-import random
+import time
 import unittest
 import numpy
 from abc import ABC, abstractmethod
+from board.instrumentation import NULL_INSTRUMENTATION
+
+# Characters for dead and live cells in board strings, indexed by cell value.
+CELL_CHARACTERS = numpy.array([ord("-"), ord("X")], dtype=numpy.uint8)
 
 class UpdateStrategy(ABC):
   """
     Object for implementing a given way to update the board state.
   """
 
+  # Number of generations the board state advances by for each update.
+  generations_per_update = 1
+
   @abstractmethod
   def update(self, board_state):
+    """
+      Set the board state's new_cells to the next generation of its cells.
+    """
+    pass
+
+  def advance(self, board_state, updates):
+    """
+      Perform the given number of updates, leaving the result in the board
+      state's cells. Strategies that can run several generations without
+      returning to Python should override this.
+    """
+
+    for update in range(0, updates):
+      self.update(board_state)
+      board_state.swap_cells()
+
+class DeviceCells(ABC):
+  """
+    Cells that a strategy keeps on a device (such as a GPU) between updates,
+    set as a board state's device_cells. While set, the board state's own
+    cell arrays may be out of date, and are only brought up to date when the
+    board is read.
+  """
+
+  # The strategy that updates these cells.
+  strategy = None
+
+  @abstractmethod
+  def copy_to_host(self, board_state):
+    """
+      Make the board state's cells (and new_cells, the previous generation)
+      match the device, if they don't already.
+    """
     pass
 
 class BoardObserver(ABC):
@@ -23,41 +63,164 @@ class BoardObserver(ABC):
     """Called whenver the board state changes."""
     pass
 
+class NotificationPolicy(ABC):
+  """
+    Decides when an observer registered with BoardState.add_observer is
+    notified of updates. Observers added without a policy are notified after
+    every update.
+  """
+
+  @abstractmethod
+  def should_notify(self, board_state):
+    """Returns True if the observer should be notified of the current state."""
+    pass
+
+class EveryNGenerations(NotificationPolicy):
+  """Notify an observer once every given number of generations."""
+
+  def __init__(self, generations):
+    self.generations = generations
+    self.last_notified_generation = 0
+
+  def should_notify(self, board_state):
+
+    # Advancing several generations at once may step past the exact
+    # generation, so notify on the first update at or after it.
+    if (board_state.generation // self.generations
+        > self.last_notified_generation // self.generations):
+      self.last_notified_generation = board_state.generation
+      return True
+    return False
+
+class AtMostNPerSecond(NotificationPolicy):
+  """Notify an observer no more than the given number of times per second."""
+
+  def __init__(self, notifications_per_second):
+    self.interval = 1.0 / notifications_per_second
+    self.next_notification_time = time.monotonic()
+
+  def should_notify(self, board_state):
+
+    current_time = time.monotonic()
+    if current_time >= self.next_notification_time:
+      self.next_notification_time = current_time + self.interval
+      return True
+    return False
+
+class OnDemand(NotificationPolicy):
+  """
+    Only notify an observer when BoardState.notify_observers is called with
+    force=True.
+  """
+
+  def should_notify(self, board_state):
+    return False
+
 class BoardState:
     """Stores the state of the cells (alive or dead) on the board."""
 
+    # Records where the time goes when updating the board (see
+    # board.instrumentation). Set to a Profiler to record it.
+    instrumentation = NULL_INSTRUMENTATION
+
+    # Cells kept on a device by the strategy updating the board (see
+    # DeviceCells), or None if the cell arrays are always current.
+    device_cells = None
+
+    # Number of generations the board has advanced.
+    generation = 0
+
     def update(self, strategy):
       """
         Perform one iteration of the game, updating which cells
         are alive or dead.
       """
-      
+
+      self.advance(strategy, 1)
+
+    def advance(self, strategy, updates):
+      """
+        Perform the given number of iterations of the game, then notify
+        observers. Observers only see the final state.
+      """
+
+      # Cells on a device are only of use to the strategy that put them there.
+      if self.device_cells is not None and self.device_cells.strategy is not strategy:
+        self.release_device_cells()
+
       # Delegate to whatever strategy was chosen.
-      strategy.update(self)
+      with self.instrumentation.phase("strategy"):
+        strategy.advance(self, updates)
+      self.generation += updates * strategy.generations_per_update
+
+      with self.instrumentation.phase("notify"):
+        self.notify_observers()
 
-      # Swap the cell arrays.
-      self.new_cells, self.cells = self.cells, self.new_cells
+    def swap_cells(self):
+      """Swap the cell arrays, making the new cells the current ones."""
 
-      # Notify observers
-      for observer in self.observers:
-        observer.on_update(self)
+      with self.instrumentation.phase("swap"):
+        self.new_cells, self.cells = self.cells, self.new_cells
 
-    def add_observer(self, observer):
-      """Add an observer so that it receives notification of state updates."""
+    def add_observer(self, observer, policy=None):
+      """
+        Add an observer so that it receives notification of state updates,
+        optionally with a NotificationPolicy deciding which updates.
+      """
       self.observers.append(observer)
+      self.notification_policies.append(policy)
+
+    def notify_observers(self, force=False):
+      """
+        Notify observers of the current state, subject to their notification
+        policies unless forced.
+      """
+
+      for observer, policy in zip(self.observers, self.notification_policies):
+        if force or policy is None or policy.should_notify(self):
+          self.sync_cells()
+          observer.on_update(self)
+
+    def sync_cells(self):
+      """
+        Bring the cell arrays up to date with any cells kept on a device.
+        Observers are notified, and the board is read, only after this.
+      """
+
+      if self.device_cells is not None:
+        self.device_cells.copy_to_host(self)
+
+    def release_device_cells(self):
+      """
+        Bring the cell arrays up to date, and stop keeping the cells on a
+        device, so that they can be changed. The strategy copies them back to
+        the device on its next update.
+      """
+
+      self.sync_cells()
+      self.device_cells = None
 
     def __init__(self, rows, cols):
 
       self.observers = []
+      self.notification_policies = []
       self.rows = rows
       self.cols = cols
+      self.allocate_cells()
+
+    def allocate_cells(self):
+      """
+        Allocate empty cell arrays for the board's dimensions. Subclasses
+        holding their cells differently override this.
+      """
 
       # Use numpy arrays to support updating via CUDA (though they also
       # work with straight Python)
-      self.cells = numpy.zeros((rows+2) * (cols+2),dtype=numpy.uint8)
-      self.new_cells = numpy.zeros((rows+2) * (cols+2),dtype=numpy.uint8)
+      self.cells = numpy.zeros((self.rows+2) * (self.cols+2),dtype=numpy.uint8)
+      self.new_cells = numpy.zeros((self.rows+2) * (self.cols+2),dtype=numpy.uint8)
 
-    def from_string(string):
+    @classmethod
+    def from_string(cls, string):
       """
         Create a BoardState with state specified by a string which uses:
         - 'X' as a live cell
@@ -72,51 +235,102 @@ class BoardState:
             "---")
       """
 
-      row_strings = string.split("\n")
-      rows = len(row_strings)
-      cols = len(row_strings[0])
+      try:
+        return cls.from_bytes(string.encode("ascii"))
+      except UnicodeEncodeError:
+        raise Exception("Unrecognized character in board string")
+
+    @classmethod
+    def from_bytes(cls, data):
+      """
+        Create a BoardState from the bytes of a board string, as described
+        in from_string.
+      """
+
+      rows = data.count(b"\n") + 1
+      cols = data.find(b"\n") if rows > 1 else len(data)
 
-      for row in range(0, rows):
-        if len(row_strings[row]) != cols:
-          raise Exception("Row lengths are not equal")
-      
-      board_state = BoardState(rows, cols)
+      # With equal row lengths, adding a final newline makes every row
+      # (including its newline) the same length.
+      if len(data) + 1 != rows * (cols + 1):
+        raise Exception("Row lengths are not equal")
+      text = numpy.frombuffer(data + b"\n", dtype=numpy.uint8).reshape(rows, cols + 1)
+      if (text[:, -1] != ord("\n")).any():
+        raise Exception("Row lengths are not equal")
 
-      for row in range(0, rows):
-        for col in range (0, cols):
-          if row_strings[row][col] == "X":
-            board_state.set_cell(row, col)
-          elif row_strings[row][col] != "-":
-            raise Exception("Unrecognized character in board string")
+      text = text[:, :-1]
+      live_cells = text == ord("X")
+      if (~live_cells & (text != ord("-"))).any():
+        raise Exception("Unrecognized character in board string")
+
+      board_state = cls(rows, cols)
+      board_state.load_rows(live_cells)
 
       return board_state
 
+    def randomize_state(self, density=0.5, seed=None):
+      """
+        Set board state to a random set of live/dead cells, where each cell is
+        alive with the given probability. Giving a seed makes the state
+        repeatable.
+      """
 
-    def randomize_state(self):
-      """Set board state to a random set of live/dead cells."""
+      generator = numpy.random.default_rng(seed)
 
-      for row in range(0, self.rows):
-        for col in range (0, self.cols):
-          if random.randint(0,1):
-            self.set_cell(row, col)
-          else:
-            self.clear_cell(row, col)
+      # Work through the board a band of rows at a time, so that the random
+      # numbers never take much more memory than the board itself.
+      rows_per_band = max(1, (1 << 20) // max(1, self.cols))
+      for start_row in range(0, self.rows, rows_per_band):
+        band_rows = min(rows_per_band, self.rows - start_row)
+        self.load_rows(generator.random((band_rows, self.cols), dtype=numpy.float32) < density,
+          start_row)
 
       return
 
+    def as_2d_view(self):
+      """
+        Returns the cells of the board, without its border, as a
+        two-dimensional (rows, cols) numpy view of the current cell array.
+        Changes to the view change the board. The view only shows the current
+        state until the next update, which swaps the cell arrays.
+      """
+
+      self.release_device_cells()
+      return self.cells.reshape(self.rows + 2, self.cols + 2)[1:-1, 1:-1]
+
+    def read_rows(self, start_row=0, end_row=None):
+      """
+        Returns the given rows of the board as a two-dimensional array with
+        one uint8 (0 or 1) per cell. The array may be a view of the cells.
+      """
+
+      self.sync_cells()
+      return self.cells.reshape(self.rows + 2, self.cols + 2)[1:-1, 1:-1][start_row:end_row]
+
+    def load_rows(self, cells, start_row=0):
+      """
+        Set the state of whole rows of the board, starting at the given row,
+        from a two-dimensional array of cells (any non-zero value is alive).
+      """
+
+      self.as_2d_view()[start_row:start_row + len(cells)] = cells != 0
+
     def cell_state(self, row, col):
       """ Returns True if the cell at the given location is alive, False otherwise."""
 
+      self.sync_cells()
       return False if self.cells[(row+1) * (self.cols+2) + (col+1)] == 0 else True
 
     def set_cell(self, row, col):
       """Set a cell as alive."""
 
+      self.release_device_cells()
       self.cells[(row+1) * (self.cols+2) + (col+1)] = 1
 
     def clear_cell(self, row, col):
       """Set a cell as dead."""
 
+      self.release_device_cells()
       self.cells[(row+1) * (self.cols+2) + (col+1)] = 0
 
     def to_string(self):
@@ -127,13 +341,16 @@ class BoardState:
         - '\\n' (newline) as the end of a row
       """
 
-      board_string = ""
-      for row in range(0, self.rows):
-        for col in range(0, self.cols):
-          board_string += "X" if self.cell_state(row, col) else "-"
-        if row < self.rows - 1:
-          board_string += "\n" 
-      return board_string
+      return self.to_bytes().decode("ascii")
+
+    def to_bytes(self):
+      """Return the state of the board as the bytes of its string form."""
+
+      text = numpy.full((self.rows, self.cols + 1), ord("\n"), dtype=numpy.uint8)
+      text[:, :-1] = CELL_CHARACTERS[self.read_rows()]
+
+      # Leave off the final row's newline.
+      return text.tobytes()[:-1]
 
 
 class BoardStateTests():
@@ -149,11 +366,14 @@ class BoardStateTests():
         def setUp(self):
           self.strategy=SomeUpdateStrategy()
 
-    These tests will then be run using that update strategy.
+    These tests will then be run using that update strategy. Strategies that
+    need a different BoardState implementation can also set board_state_class.
   """
 
+  board_state_class = BoardState
+
   def test_board_can_init_from_string(self):
-    board_state = BoardState.from_string(
+    board_state = self.board_state_class.from_string(
       "X-X\n" +
       "-X-\n" +
       "X-X")
@@ -167,7 +387,7 @@ class BoardStateTests():
   def test_all_cells_are_false_at_start(self):
     rows = 3
     cols = 4
-    board_state = BoardState(rows=rows, cols=cols)
+    board_state = self.board_state_class(rows=rows, cols=cols)
 
     self.assertEqual(board_state.to_string(),
       "----\n" +
@@ -175,7 +395,7 @@ class BoardStateTests():
       "----")
 
   def test_update_kills_cell_with_no_neighbors(self):
-    board_state = BoardState(rows=3, cols=3)
+    board_state = self.board_state_class(rows=3, cols=3)
     board_state.set_cell(0, 0)
 
     self.assertEqual(board_state.to_string(),
@@ -192,7 +412,7 @@ class BoardStateTests():
 
   def test_update_keeps_alive_cell_with_three_neighbors(self):
 
-    board_state = BoardState.from_string(
+    board_state = self.board_state_class.from_string(
       "XX-\n" +
       "XX-\n" +
       "---")
@@ -206,7 +426,7 @@ class BoardStateTests():
 
   def test_update_sets_cell_with_three_neighbors(self):
 
-    board_state = BoardState.from_string(
+    board_state = self.board_state_class.from_string(
       "XXX\n" +
       "---\n" +
       "---")
@@ -220,7 +440,7 @@ class BoardStateTests():
 
   def test_update_kills_cell_with_four_neighbors(self):
 
-    board_state = BoardState.from_string(
+    board_state = self.board_state_class.from_string(
       "-X-\n" +
       "XXX\n" +
       "-X-")
@@ -234,7 +454,7 @@ class BoardStateTests():
 
   def test_draw_state_is_updated(self):
 
-    board_state = BoardState.from_string(
+    board_state = self.board_state_class.from_string(
       "XXX\n" +
       "---\n" +
       "---")
@@ -246,18 +466,84 @@ class BoardStateTests():
       "-X-\n" +
       "---")
 
-    # One value for each of red/green/blue * four corners * board dimensions.
-    expected_cell_colors = [0] * (3 * 4 * 3 * 3)
+    self.assertEqual(list(self.opengl_draw_state.get_cell_intensities()),
+        [0, 255, 0, 0, 255, 0, 0, 0, 0])
+
+  def test_advance_matches_repeated_updates(self):
+
+    board_state = self.board_state_class.from_string(
+      "-X--\n" +
+      "--X-\n" +
+      "XXX-\n" +
+      "----")
+    expected_board_state = self.board_state_class.from_string(board_state.to_string())
+
+    board_state.advance(strategy=self.strategy, updates=3)
+    for update in range(0, 3):
+      expected_board_state.update(strategy=self.strategy)
+
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+    self.assertEqual(board_state.generation, expected_board_state.generation)
+
+  def test_observers_are_notified_according_to_policy(self):
+
+    class RecordingObserver(BoardObserver):
+      def __init__(self):
+        self.generations = []
+      def on_update(self, board_state):
+        self.generations.append(board_state.generation)
+
+    board_state = self.board_state_class(rows=3, cols=3)
+    every_update = RecordingObserver()
+    every_third = RecordingObserver()
+    on_demand = RecordingObserver()
+    board_state.add_observer(every_update)
+    board_state.add_observer(every_third, EveryNGenerations(3))
+    board_state.add_observer(on_demand, OnDemand())
+
+    for update in range(0, 7):
+      board_state.update(strategy=self.strategy)
+    board_state.notify_observers(force=True)
+
+    step = self.strategy.generations_per_update
+    self.assertEqual(every_update.generations,
+      [step * update for update in range(1, 8)] + [7 * step])
+    self.assertEqual(on_demand.generations, [7 * step])
+    if step == 1:
+      self.assertEqual(every_third.generations, [3, 6, 7])
+
+  def test_from_string_rejects_malformed_boards(self):
+
+    with self.assertRaises(Exception):
+      self.board_state_class.from_string("XX-\n" + "X-")
+
+    with self.assertRaises(Exception):
+      self.board_state_class.from_string("XX-\n" + "X-O")
+
+  def test_randomize_state_is_repeatable_and_uses_density(self):
+
+    board_state = self.board_state_class(rows=40, cols=70)
+    board_state.randomize_state(density=0.25, seed=7)
+    same_board_state = self.board_state_class(rows=40, cols=70)
+    same_board_state.randomize_state(density=0.25, seed=7)
+
+    self.assertEqual(board_state.to_string(), same_board_state.to_string())
+    self.assertAlmostEqual(board_state.to_string().count("X") / (40 * 70), 0.25, delta=0.05)
+
+class BoardStateViewTests(unittest.TestCase):
+  """Tests for the numpy view of a BoardState's cells."""
+
+  def test_as_2d_view_shares_cells_with_board(self):
+
+    board_state = BoardState.from_string(
+      "X--\n" +
+      "--X")
+    view = board_state.as_2d_view()
 
-    for cell_index in [1, 4]:
-      # Cell index, at a given corner's blue value.
-      expected_cell_colors[3 * 4 * cell_index + 0 * 3 + 2] = 127
-      expected_cell_colors[3 * 4 * cell_index + 1 * 3 + 2] = 127
-      expected_cell_colors[3 * 4 * cell_index + 2 * 3 + 2] = 127
-      expected_cell_colors[3 * 4 * cell_index + 3 * 3 + 2] = 127
+    self.assertEqual(view.tolist(), [[1, 0, 0], [0, 0, 1]])
 
-    self.assertEqual(list(self.opengl_draw_state.get_opengl_cell_vertex_colors()), 
-        expected_cell_colors)
+    view[1, 0] = 1
+    self.assertEqual(board_state.cell_state(1, 0), True)
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,208 @@
+from board.boardstate import BoardObserver
+from board.boardstate import BoardState
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.packedboardstate import PackedBoardState
+from board.packedboardstate import unpack_rows
+from board.packedboardstrategy import PackedUpdateStrategy
+import json
+import numpy
+import os
+import queue
+import tempfile
+import threading
+import unittest
+
+# Statistics recorded for each generation, in the order of CSV columns.
+# Births and deaths are since the previous update, and the bounding box is
+# of the live cells (all None when there are none).
+STATISTICS_FIELDS = ("generation", "population", "births", "deaths",
+  "min_row", "max_row", "min_col", "max_col")
+
+STATISTICS_FORMATS = ("ndjson", "csv")
+
+def live_cell_count(cells):
+  """Returns the number of live cells in an array of cells or packed cell words."""
+
+  if cells.dtype == numpy.uint64:
+    return int(numpy.bitwise_count(cells).sum(dtype=numpy.int64))
+  return int(numpy.count_nonzero(cells))
+
+def generation_statistics(board_state):
+  """
+    Returns a dictionary of statistics (see STATISTICS_FIELDS) about the
+    board's current generation.
+
+    Births and deaths compare the cells with the previous update's, which
+    every strategy leaves behind in new_cells when it swaps the arrays, so
+    nothing has to be kept between calls. Both byte-per-cell and packed
+    board states are counted without unpacking their cells.
+  """
+
+  cells = board_state.cells.reshape(board_state.rows + 2, -1)
+  previous_cells = board_state.new_cells.reshape(board_state.rows + 2, -1)
+
+  population = live_cell_count(cells)
+  births = live_cell_count(cells & ~previous_cells)
+  deaths = births + live_cell_count(previous_cells) - population
+
+  statistics = {"generation": board_state.generation, "population": population,
+    "births": births, "deaths": deaths,
+    "min_row": None, "max_row": None, "min_col": None, "max_col": None}
+
+  if population == 0:
+    return statistics
+
+  # Border rows and columns (or words) are always empty, so they don't
+  # need to be left out, just allowed for in the indices.
+  live_rows = numpy.flatnonzero(cells.any(axis=1))
+  statistics["min_row"] = int(live_rows[0]) - 1
+  statistics["max_row"] = int(live_rows[-1]) - 1
+
+  live_columns = numpy.bitwise_or.reduce(cells[live_rows[0]:live_rows[-1] + 1], axis=0)
+  if live_columns.dtype == numpy.uint64:
+    live_cols = numpy.flatnonzero(unpack_rows(live_columns[numpy.newaxis, 1:-1],
+      board_state.cols)[0]) + 1
+  else:
+    live_cols = numpy.flatnonzero(live_columns)
+  statistics["min_col"] = int(live_cols[0]) - 1
+  statistics["max_col"] = int(live_cols[-1]) - 1
+
+  return statistics
+
+def format_statistics(statistics, format):
+  """Returns a line of NDJSON or CSV for a generation's statistics."""
+
+  if format == "csv":
+    return ",".join("" if statistics[field] is None else str(statistics[field])
+      for field in STATISTICS_FIELDS) + "\n"
+  return json.dumps(statistics, separators=(",", ":")) + "\n"
+
+class StatisticsWriter(BoardObserver):
+  """
+    Observer that writes statistics about each generation it is notified of
+    to a file, as NDJSON (one JSON object per line) or CSV with a header.
+
+    Lines are collected into batches of batch_size, each written with a single
+    call. With a writer thread, batches are handed to a background thread to
+    write, so the update loop only waits for the file if max_pending_batches
+    of them are already waiting. Call close() to write out the last batch.
+  """
+
+  def __init__(self, path, format=None, batch_size=1024, writer_thread=False,
+      max_pending_batches=16):
+
+    if format is None:
+      format = "csv" if path.lower().endswith(".csv") else "ndjson"
+    if format not in STATISTICS_FORMATS:
+      raise Exception("Unrecognized statistics format " + format)
+
+    self.format = format
+    self.batch_size = batch_size
+    self.batch = []
+
+    self.file = open(path, "w", buffering=1 << 20)
+    if format == "csv":
+      self.file.write(",".join(STATISTICS_FIELDS) + "\n")
+
+    self.pending_batches = None
+    self.writer = None
+    if writer_thread:
+      self.pending_batches = queue.Queue(maxsize=max_pending_batches)
+      self.writer = threading.Thread(target=self.write_pending_batches, daemon=True)
+      self.writer.start()
+
+  def on_update(self, board_state):
+    """Record the statistics of the board's current generation."""
+
+    self.batch.append(format_statistics(generation_statistics(board_state), self.format))
+    if len(self.batch) >= self.batch_size:
+      self.write_batch()
+
+  def write_batch(self):
+    """Write out the lines collected so far, or pass them to the writer thread."""
+
+    if not self.batch:
+      return
+
+    lines = "".join(self.batch)
+    self.batch = []
+    if self.pending_batches is not None:
+      self.pending_batches.put(lines)
+    else:
+      self.file.write(lines)
+
+  def write_pending_batches(self):
+    """Write batches from the queue until given None."""
+
+    while (lines := self.pending_batches.get()) is not None:
+      self.file.write(lines)
+
+  def close(self):
+    """Write out any remaining statistics, and close the file."""
+
+    if self.file.closed:
+      return
+
+    self.write_batch()
+    if self.writer is not None:
+      self.pending_batches.put(None)
+      self.writer.join()
+    self.file.close()
+
+
+class StatisticsTests(unittest.TestCase):
+  """Tests for computing and writing generation statistics."""
+
+  def test_statistics_of_glider(self):
+
+    for board_state_class, strategy in ((BoardState, NumpyUpdateStrategy()),
+        (PackedBoardState, PackedUpdateStrategy())):
+      board_state = board_state_class.from_string(
+        "-----\n" +
+        "--X--\n" +
+        "---X-\n" +
+        "-XXX-\n" +
+        "-----")
+      board_state.update(strategy)
+
+      # The glider's first step kills two cells and gives birth to two.
+      self.assertEqual(generation_statistics(board_state), {"generation": 1,
+        "population": 5, "births": 2, "deaths": 2,
+        "min_row": 2, "max_row": 4, "min_col": 1, "max_col": 3})
+
+  def test_statistics_of_empty_board(self):
+
+    board_state = BoardState(rows=3, cols=3)
+    board_state.set_cell(1, 1)
+    board_state.update(NumpyUpdateStrategy())
+
+    statistics = generation_statistics(board_state)
+    self.assertEqual((statistics["population"], statistics["deaths"]), (0, 1))
+    self.assertIsNone(statistics["min_row"])
+
+  def test_writer_batches_lines(self):
+
+    with tempfile.TemporaryDirectory() as directory:
+      for format, writer_thread in (("ndjson", False), ("csv", True)):
+        path = os.path.join(directory, "statistics." + format)
+        board_state = BoardState(rows=20, cols=20)
+        board_state.randomize_state(seed=3)
+        writer = StatisticsWriter(path, batch_size=4, writer_thread=writer_thread)
+        board_state.add_observer(writer)
+
+        for update in range(0, 10):
+          board_state.update(NumpyUpdateStrategy())
+        writer.close()
+
+        with open(path) as file:
+          lines = file.read().splitlines()
+        if format == "csv":
+          self.assertEqual(lines[0], ",".join(STATISTICS_FIELDS))
+          lines = lines[1:]
+          self.assertEqual(lines[-1].split(",")[0], "10")
+        else:
+          self.assertEqual(json.loads(lines[-1])["generation"], 10)
+        self.assertEqual(len(lines), 10)
+
+if __name__ == '__main__':
+  unittest.main()
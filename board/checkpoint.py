@@ -0,0 +1,274 @@
+from board.boardstate import BoardObserver
+from board.boardstate import BoardState
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.packedboardstate import PackedBoardState
+from board.packedboardstrategy import PackedUpdateStrategy
+import numpy
+import os
+import struct
+import tempfile
+import threading
+import unittest
+
+# Checkpoint files hold a fixed-size header followed by the raw cell array of
+# a board state, border included, so that the cells can be memory-mapped
+# straight from the file.
+#
+# The header holds, in little-endian order: the magic bytes, the format
+# version, the cell layout, rows, columns, generation and the rule string
+# (null-padded), padded out to CHECKPOINT_HEADER_SIZE bytes.
+
+CHECKPOINT_MAGIC = b"CONWAYCP"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER_FORMAT = "<8sIIQQQ64s"
+CHECKPOINT_HEADER_SIZE = 128
+
+# Cell layouts: one byte per cell (BoardState) or one bit (PackedBoardState).
+BYTE_LAYOUT = 0
+PACKED_LAYOUT = 1
+
+def write_checkpoint(board_state, path, rule="B3/S23", cells=None, generation=None):
+  """
+    Write a checkpoint of a board state. The file is written under a
+    temporary name and then renamed, so the path always holds either the
+    previous checkpoint or the complete new one.
+
+    The cells (and generation) to write default to the board state's
+    current ones, but can be given to write a copy taken earlier.
+  """
+
+  if cells is None:
+    board_state.sync_cells()
+    cells = board_state.cells
+  if generation is None:
+    generation = board_state.generation
+
+  layout = PACKED_LAYOUT if isinstance(board_state, PackedBoardState) else BYTE_LAYOUT
+  header = struct.pack(CHECKPOINT_HEADER_FORMAT, CHECKPOINT_MAGIC, CHECKPOINT_VERSION,
+    layout, board_state.rows, board_state.cols, generation, rule.encode("ascii"))
+
+  directory = os.path.dirname(os.path.abspath(path))
+  file_descriptor, temporary_path = tempfile.mkstemp(dir=directory,
+    prefix=os.path.basename(path) + ".", suffix=".tmp")
+  try:
+    with os.fdopen(file_descriptor, "wb") as file:
+      file.write(header.ljust(CHECKPOINT_HEADER_SIZE, b"\0"))
+      file.write(memoryview(numpy.ascontiguousarray(cells)).cast("B"))
+      file.flush()
+      os.fsync(file.fileno())
+
+    # Temporary files are only readable by their owner; give the checkpoint
+    # the usual permissions.
+    os.chmod(temporary_path, 0o644)
+    os.replace(temporary_path, path)
+  except BaseException:
+    os.unlink(temporary_path)
+    raise
+
+def read_checkpoint_header(path):
+  """
+    Returns the layout, rows, columns, generation and rule of a checkpoint.
+  """
+
+  with open(path, "rb") as file:
+    header = file.read(struct.calcsize(CHECKPOINT_HEADER_FORMAT))
+
+  if len(header) < struct.calcsize(CHECKPOINT_HEADER_FORMAT):
+    raise Exception("Checkpoint file is too short")
+
+  magic, version, layout, rows, cols, generation, rule = struct.unpack(
+    CHECKPOINT_HEADER_FORMAT, header)
+  if magic != CHECKPOINT_MAGIC:
+    raise Exception("Not a checkpoint file")
+  if version != CHECKPOINT_VERSION:
+    raise Exception("Unsupported checkpoint version")
+
+  return layout, rows, cols, generation, rule.rstrip(b"\0").decode("ascii")
+
+def open_checkpoint(path, mode="c", scratch_path=None):
+  """
+    Open a checkpoint as a board state whose cells are memory-mapped from
+    the file, so only the parts of the board that are used get read in.
+    Returns the board state and the checkpoint's rule.
+
+    The default copy-on-write mode leaves the file untouched. Mode "r+"
+    maps the file for writing instead, so that the board state's cells can
+    be paged out to it; the file then becomes one of the board's working
+    arrays and stops being a consistent checkpoint. For boards too large to
+    hold in memory, give a scratch path to map the second cell array from
+    as well.
+  """
+
+  layout, rows, cols, generation, rule = read_checkpoint_header(path)
+
+  if layout == PACKED_LAYOUT:
+    board_state = PackedBoardState(rows, cols)
+  elif layout == BYTE_LAYOUT:
+    board_state = BoardState(rows, cols)
+  else:
+    raise Exception("Unknown checkpoint cell layout")
+
+  expected_size = CHECKPOINT_HEADER_SIZE + board_state.cells.nbytes
+  if os.path.getsize(path) != expected_size:
+    raise Exception("Checkpoint file size does not match its header")
+
+  board_state.cells = numpy.memmap(path, dtype=board_state.cells.dtype, mode=mode,
+    offset=CHECKPOINT_HEADER_SIZE, shape=board_state.cells.shape)
+  if scratch_path is not None:
+    board_state.new_cells = numpy.memmap(scratch_path, dtype=board_state.new_cells.dtype,
+      mode="w+", shape=board_state.new_cells.shape)
+  board_state.generation = generation
+
+  return board_state, rule
+
+class Checkpointer(BoardObserver):
+  """
+    Observer that periodically writes checkpoints of the board state.
+
+    Each checkpoint is a copy of the cells, taken when the observer is
+    notified and written out by a background thread, so the update loop only
+    waits for the copy. If the previous checkpoint is still being written
+    when the next is due, the next one is put off until a later update.
+
+    Any exception raised while writing a checkpoint is kept in the error
+    attribute, and raised from the next notification or from close().
+  """
+
+  def __init__(self, path, every_generations, rule="B3/S23"):
+    self.path = path
+    self.every_generations = every_generations
+    self.rule = rule
+
+    self.next_checkpoint_generation = None
+    self.writer = None
+    self.error = None
+
+  def on_update(self, board_state):
+    """Start writing a checkpoint, if one is due and none is being written."""
+
+    self.raise_error()
+
+    if self.next_checkpoint_generation is None:
+      self.schedule_next_checkpoint(board_state)
+
+    if board_state.generation < self.next_checkpoint_generation:
+      return
+
+    if self.writer is not None and self.writer.is_alive():
+      return
+
+    self.writer = threading.Thread(target=self.write,
+      args=(board_state, numpy.array(board_state.cells), board_state.generation))
+    self.writer.start()
+    self.schedule_next_checkpoint(board_state)
+
+  def write(self, board_state, cells, generation):
+    """Write a checkpoint of a copy of the cells. Runs in the writer thread."""
+
+    try:
+      write_checkpoint(board_state, self.path, self.rule, cells, generation)
+    except Exception as error:
+      self.error = error
+
+  def raise_error(self):
+    """Raise the exception a checkpoint failed with, if one has."""
+
+    if self.error is not None:
+      error, self.error = self.error, None
+      raise error
+
+  def schedule_next_checkpoint(self, board_state):
+    """Make the next checkpoint due at the next multiple of the interval."""
+
+    self.next_checkpoint_generation = (
+      (board_state.generation // self.every_generations + 1) * self.every_generations)
+
+  def close(self):
+    """Wait for any checkpoint being written to finish."""
+
+    if self.writer is not None:
+      self.writer.join()
+    self.raise_error()
+
+
+class CheckpointTests(unittest.TestCase):
+  """Tests for writing and opening checkpoints."""
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.directory.name, "board.checkpoint")
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def test_checkpoint_round_trips(self):
+
+    for board_state_class in (BoardState, PackedBoardState):
+      board_state = board_state_class(rows=20, cols=70)
+      board_state.randomize_state(seed=5)
+      board_state.generation = 123
+
+      write_checkpoint(board_state, self.path, rule="B36/S23")
+      opened_board_state, rule = open_checkpoint(self.path)
+
+      self.assertIsInstance(opened_board_state, board_state_class)
+      self.assertEqual(opened_board_state.to_string(), board_state.to_string())
+      self.assertEqual(opened_board_state.generation, 123)
+      self.assertEqual(rule, "B36/S23")
+      self.assertEqual(os.listdir(self.directory.name), ["board.checkpoint"])
+
+  def test_resumed_board_continues_without_changing_checkpoint(self):
+
+    board_state = BoardState(rows=30, cols=30)
+    board_state.randomize_state(seed=9)
+    write_checkpoint(board_state, self.path)
+
+    resumed_board_state, rule = open_checkpoint(self.path,
+      scratch_path=os.path.join(self.directory.name, "scratch"))
+    for update in range(0, 3):
+      board_state.update(NumpyUpdateStrategy())
+      resumed_board_state.update(NumpyUpdateStrategy())
+
+    self.assertEqual(resumed_board_state.to_string(), board_state.to_string())
+    self.assertEqual(open_checkpoint(self.path)[0].generation, 0)
+
+  def test_checkpointer_writes_periodically(self):
+
+    board_state = PackedBoardState(rows=10, cols=10)
+    board_state.randomize_state(seed=2)
+    checkpointer = Checkpointer(self.path, every_generations=4)
+    board_state.add_observer(checkpointer)
+
+    for update in range(0, 5):
+      board_state.update(PackedUpdateStrategy())
+    checkpointer.close()
+
+    self.assertEqual(read_checkpoint_header(self.path)[3], 4)
+
+  def test_checkpointer_raises_write_errors(self):
+
+    board_state = BoardState(rows=10, cols=10)
+    checkpointer = Checkpointer(os.path.join(self.directory.name, "missing", "board.checkpoint"),
+      every_generations=1)
+    board_state.add_observer(checkpointer)
+
+    for update in range(0, 2):
+      board_state.update(NumpyUpdateStrategy())
+    with self.assertRaises(OSError):
+      checkpointer.close()
+
+    board_state.update(NumpyUpdateStrategy())
+    checkpointer.writer.join()
+    with self.assertRaises(OSError):
+      board_state.update(NumpyUpdateStrategy())
+
+  def test_rejects_other_files(self):
+
+    with open(self.path, "wb") as file:
+      file.write(b"\0" * CHECKPOINT_HEADER_SIZE)
+
+    with self.assertRaises(Exception):
+      open_checkpoint(self.path)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,15 +1,25 @@
 from numba import jit, cuda
 from board.boardstate import UpdateStrategy
+from board.boardstate import BoardState
 from board.boardstate import BoardStateTests
-from screen.gldrawstate import OpenGLDrawState
+from board.boardstate import DeviceCells
+from board.instrumentation import Profiler
+from board.pythonboardstrategy import StraightPythonUpdateStrategy
+from board.rules import CONWAY
+from board.rules import Rule
+from screen.gldrawstate import LIVE_CELL_INTENSITY
 import numpy
 import unittest
 
 class CudaUpdateStrategy(UpdateStrategy):
   """Strategy to update the board state using a GPU via the CUDA toolkit."""
 
-  def __init__(self, opengl_draw_state=None):
+  def __init__(self, opengl_draw_state=None, rule=None):
     self.opengl_draw_state = opengl_draw_state
+    self.rule = rule if rule else CONWAY
+
+    # The rule's table is copied to the device on the first update.
+    self.transition_table_gpu = None
 
     # CUDA seems to want us to pass in something for the colors array
     # even if we aren't using a display that has them.
@@ -21,64 +31,82 @@ class CudaUpdateStrategy(UpdateStrategy):
     if self.opengl_draw_state:
       self.opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
 
-    blocks_per_grid = 1024
-    cells_per_thread = 8
-
-    # Need enough threads to operate on the whole board
-    threads_needed = 1 + int(board_state.rows * board_state.cols / cells_per_thread)
-
-    # Round up thread count to a multiple of block count
-    if (threads_needed % blocks_per_grid) :
-        threads_needed += blocks_per_grid - threads_needed % blocks_per_grid
-
-    threads_per_block = threads_needed // blocks_per_grid
+    threads_per_block, blocks_per_grid, cells_per_thread = self.launch_configuration(board_state)
 
     # Allocate and set device memory (this is considerably faster than passing
     # the BoardState arrays directly).
     # Allocate a CUDA stream to serialize this (not really necessary but could improve
     # efficiency if multiple boards were being udpated at the smae time)
     cuda_stream = cuda.stream()
-    new_cells_gpu = cuda.to_device(board_state.new_cells, copy=False, stream=cuda_stream)
-    cells_gpu = cuda.to_device(board_state.cells, stream=cuda_stream)
+    instrumentation = board_state.instrumentation
 
     # This strategy can also leverage CUDA to update color arrays when drawing
     # the cells in OpenGL. If the array was given, provide an array for CUDA to
     # set.
     if self.opengl_draw_state:
-      cell_colors = self.opengl_draw_state.get_opengl_cell_vertex_colors()
+      cell_colors = self.opengl_draw_state.get_cell_intensities()
     else:
       # Pass an empty array. We must pass something to our update_cell
       # function, but it knows to ignore an empty array.
       cell_colors = self.empty_cell_color_array
 
-    # Copy current cell colors to the device array (the default behavior but
-    # explicitly stated here) even though the kernel doesn't use them.  For some
-    # reason, if they aren't copied, writes to new_cells also write to this array
-    # and incorrect coloring(red and green) appears periodically.
-    cell_colors_gpu = cuda.to_device(cell_colors, copy=True,
-        stream=cuda_stream)
+    with instrumentation.phase("copy to device"):
+      if self.transition_table_gpu is None:
+        self.transition_table_gpu = cuda.to_device(self.rule.transition_table)
+
+      new_cells_gpu = cuda.to_device(board_state.new_cells, copy=False, stream=cuda_stream)
+      cells_gpu = cuda.to_device(board_state.cells, stream=cuda_stream)
 
-    self.update_cell[threads_per_block, blocks_per_grid, cuda_stream](
-      new_cells_gpu, cells_gpu, 
-      cell_colors_gpu, board_state.rows, 
-      board_state.cols, cells_per_thread)
+      # Copy current cell colors to the device array (the default behavior but
+      # explicitly stated here) even though the kernel doesn't use them.  For some
+      # reason, if they aren't copied, writes to new_cells also write to this array
+      # and incorrect coloring(red and green) appears periodically.
+      cell_colors_gpu = cuda.to_device(cell_colors, copy=True,
+          stream=cuda_stream)
+      cuda_stream.synchronize()
+    instrumentation.count("bytes to device", board_state.cells.nbytes + cell_colors.nbytes)
+
+    with instrumentation.phase("kernel"):
+      self.update_cell[threads_per_block, blocks_per_grid, cuda_stream](
+        new_cells_gpu, cells_gpu, 
+        cell_colors_gpu, self.transition_table_gpu, board_state.rows, 
+        board_state.cols, cells_per_thread)
+      cuda_stream.synchronize()
 
     # Wait for update_cell to update the passed-in arrays.
-    new_cells_gpu.copy_to_host(board_state.new_cells, stream=cuda_stream)
-    cell_colors_gpu.copy_to_host(cell_colors, stream=cuda_stream)
-    cuda_stream.synchronize()
+    with instrumentation.phase("copy to host"):
+      new_cells_gpu.copy_to_host(board_state.new_cells, stream=cuda_stream)
+      cell_colors_gpu.copy_to_host(cell_colors, stream=cuda_stream)
+      cuda_stream.synchronize()
+    instrumentation.count("bytes to host", board_state.new_cells.nbytes + cell_colors.nbytes)
 
-  @cuda.jit
-  def update_cell(new_cells, cells, cell_colors, num_rows, num_cols, loops_per_thread):
+  def launch_configuration(self, board_state):
     """
-      Update the specified number of cells starting from the given location.
+      Returns the numbers of threads and blocks to launch update_cell with,
+      and the number of cells each thread updates.
     """
 
-    # Keep any live cell with 2 or 3 neighbors.
-    keep_cell_on_neighbor_counts = (0, 0, 1, 1, 0, 0, 0, 0, 0)
+    blocks_per_grid = 1024
+    cells_per_thread = 8
+
+    # Need enough threads to operate on the whole board
+    threads_needed = 1 + int(board_state.rows * board_state.cols / cells_per_thread)
+
+    # Round up thread count to a multiple of block count
+    if (threads_needed % blocks_per_grid) :
+        threads_needed += blocks_per_grid - threads_needed % blocks_per_grid
+
+    threads_per_block = threads_needed // blocks_per_grid
+
+    return threads_per_block, blocks_per_grid, cells_per_thread
 
-    # Add a ell on any space with three live neighbors.
-    add_cell_on_neighbor_counts =  (0, 0, 0, 1, 0, 0, 0, 0, 0)
+  @cuda.jit
+  def update_cell(new_cells, cells, cell_colors, transition_table, num_rows, num_cols,
+      loops_per_thread):
+    """
+      Update the specified number of cells starting from the given location.
+      The transition table is a rule's Rule.transition_table.
+    """
 
     # The cells reprsent a two-dimensional board, but are passed in as
     # a one-dimensional array. Determine which cells this thread
@@ -114,23 +142,249 @@ class CudaUpdateStrategy(UpdateStrategy):
 
       # Set whether the cell is alive or dead based on
       # neighbor count and current state.
-      new_cells[cell_array_index] = cells[cell_array_index]
-      new_cells[cell_array_index] &= keep_cell_on_neighbor_counts[cell_neighbor_count]
-      new_cells[cell_array_index] |= add_cell_on_neighbor_counts[cell_neighbor_count]
+      new_cells[cell_array_index] = transition_table[
+        (cells[cell_array_index] << 4) | cell_neighbor_count]
 
       if len(cell_colors) > 0:
         # Likewise set what color the cell should now be.
-        # Each cell gets three color values (red, green, blue), for four vertices.
-        cell_color_index = 3 * 4 * x
-        for corner in range(0, 4):
-          cell_colors[cell_color_index + corner * 3 + 2] = 127 * new_cells[cell_array_index] 
+        cell_colors[x] = LIVE_CELL_INTENSITY * new_cells[cell_array_index]
+
+class ResidentCells(DeviceCells):
+  """
+    A board's cells, its previous generation and its cell colors, kept on
+    the device by a DeviceResidentCudaUpdateStrategy.
+  """
+
+  def __init__(self, strategy, board_state, cell_colors):
+
+    self.strategy = strategy
+    self.board_state = board_state
+    self.stream = cuda.stream()
+
+    self.cells_gpu = cuda.device_array_like(board_state.cells, stream=self.stream)
+    self.new_cells_gpu = cuda.device_array_like(board_state.new_cells, stream=self.stream)
+    self.cell_colors = cell_colors
+    self.cell_colors_gpu = cuda.device_array_like(cell_colors, stream=self.stream)
+
+    # Whether the board state's arrays match the device's.
+    self.host_is_current = True
+
+  def copy_to_device(self, board_state):
+    """Copy the board state's arrays to the device."""
+
+    instrumentation = board_state.instrumentation
+    with instrumentation.phase("copy to device"):
+      self.cells_gpu.copy_to_device(board_state.cells, stream=self.stream)
+      self.new_cells_gpu.copy_to_device(board_state.new_cells, stream=self.stream)
+      self.cell_colors_gpu.copy_to_device(self.cell_colors, stream=self.stream)
+      self.stream.synchronize()
+    instrumentation.count("bytes to device",
+      board_state.cells.nbytes + board_state.new_cells.nbytes + self.cell_colors.nbytes)
+
+    self.host_is_current = True
+
+  def copy_to_host(self, board_state):
+
+    if self.host_is_current:
+      return
+
+    instrumentation = board_state.instrumentation
+    with instrumentation.phase("copy to host"):
+      self.cells_gpu.copy_to_host(board_state.cells, stream=self.stream)
+      self.new_cells_gpu.copy_to_host(board_state.new_cells, stream=self.stream)
+      self.cell_colors_gpu.copy_to_host(self.cell_colors, stream=self.stream)
+      self.stream.synchronize()
+    instrumentation.count("bytes to host",
+      board_state.cells.nbytes + board_state.new_cells.nbytes + self.cell_colors.nbytes)
+
+    self.host_is_current = True
+
+  def swap_cells(self):
+    """Swap the device cell arrays, making the new cells the current ones."""
+
+    self.new_cells_gpu, self.cells_gpu = self.cells_gpu, self.new_cells_gpu
+
+class DeviceResidentCudaUpdateStrategy(CudaUpdateStrategy):
+  """
+    Strategy to update the board state using a GPU, keeping the cells on the
+    device between updates rather than copying them there and back each
+    generation.
+
+    advance() runs all of its updates on the device, swapping the arrays
+    there, and sets the board state's device_cells, so that the cells (and
+    colors) are only copied back when the board is read or its observers are
+    notified. Changing the board's cells from the host releases them, and
+    they are copied to the device again on the next advance.
+
+    update() keeps to the usual contract of setting the board state's
+    new_cells, so that strategies wrapping this one still work, but that
+    costs a copy back each generation.
+  """
+
+  def __init__(self, opengl_draw_state=None, rule=None):
+
+    super().__init__(opengl_draw_state=opengl_draw_state, rule=rule)
+
+    # Cells most recently kept on the device, whose arrays are reused when
+    # the same board is copied to the device again.
+    self.resident_cells = None
+    self.empty_cell_color_array_gpu = None
+
+  def update(self, board_state):
+    """Update the board state's new_cells, via the device."""
+
+    board_state.release_device_cells()
+    resident_cells = self.resident_cells_for(board_state)
+    self.run_updates(board_state, resident_cells, 1)
+
+    with board_state.instrumentation.phase("copy to host"):
+      resident_cells.cells_gpu.copy_to_host(board_state.new_cells, stream=resident_cells.stream)
+      resident_cells.cell_colors_gpu.copy_to_host(resident_cells.cell_colors,
+        stream=resident_cells.stream)
+      resident_cells.stream.synchronize()
+    board_state.instrumentation.count("bytes to host",
+      board_state.new_cells.nbytes + resident_cells.cell_colors.nbytes)
+
+  def advance(self, board_state, updates):
+    """Perform the given number of updates on the device, without copying back."""
+
+    resident_cells = board_state.device_cells
+    if resident_cells is None or resident_cells.strategy is not self:
+      board_state.release_device_cells()
+      resident_cells = self.resident_cells_for(board_state)
+      board_state.device_cells = resident_cells
+
+    self.run_updates(board_state, resident_cells, updates)
+    resident_cells.host_is_current = False
+
+  def resident_cells_for(self, board_state):
+    """Returns device arrays holding a copy of the board state's arrays."""
+
+    if self.opengl_draw_state:
+      self.opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
+      cell_colors = self.opengl_draw_state.get_cell_intensities()
+    else:
+      cell_colors = self.empty_cell_color_array
+
+    resident_cells = self.resident_cells
+    if (resident_cells is None or resident_cells.board_state is not board_state
+        or resident_cells.cell_colors is not cell_colors):
+      resident_cells = self.resident_cells = ResidentCells(self, board_state, cell_colors)
+
+    resident_cells.copy_to_device(board_state)
+    return resident_cells
+
+  def run_updates(self, board_state, resident_cells, updates):
+    """
+      Run the given number of updates on the device arrays, swapping them
+      after each, so that the device cells are the latest generation.
+    """
+
+    threads_per_block, blocks_per_grid, cells_per_thread = self.launch_configuration(board_state)
+
+    if self.transition_table_gpu is None:
+      self.transition_table_gpu = cuda.to_device(self.rule.transition_table)
+    if self.empty_cell_color_array_gpu is None:
+      self.empty_cell_color_array_gpu = cuda.to_device(self.empty_cell_color_array)
+
+    with board_state.instrumentation.phase("kernel"):
+      for update in range(0, updates):
+
+        # Only the colors of the final generation are ever displayed.
+        if update == updates - 1:
+          cell_colors_gpu = resident_cells.cell_colors_gpu
+        else:
+          cell_colors_gpu = self.empty_cell_color_array_gpu
+
+        self.update_cell[threads_per_block, blocks_per_grid, resident_cells.stream](
+          resident_cells.new_cells_gpu, resident_cells.cells_gpu, cell_colors_gpu,
+          self.transition_table_gpu, board_state.rows, board_state.cols, cells_per_thread)
+        resident_cells.swap_cells()
+
+      resident_cells.stream.synchronize()
 
 class CudaStrategyUpdateTests(BoardStateTests, unittest.TestCase):
   """Run BoardStateTests for the CUDA update strategy."""
 
   def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
     self.opengl_draw_state = OpenGLDrawState()
     self.strategy=CudaUpdateStrategy(opengl_draw_state=self.opengl_draw_state)
 
+  def test_transfers_are_profiled(self):
+
+    board_state = BoardState(rows=10, cols=20)
+    board_state.instrumentation = Profiler()
+    board_state.update(self.strategy)
+
+    summary = board_state.instrumentation.summary()
+    self.assertEqual(summary["counters"]["bytes to device"]["total"], 12 * 22 + 10 * 20)
+    self.assertEqual(summary["counters"]["bytes to host"]["total"], 12 * 22 + 10 * 20)
+    self.assertEqual(summary["phases"]["kernel"]["count"], 1)
+
+  def test_update_matches_straight_python_strategy_for_other_rules(self):
+
+    for rule in (Rule("B36/S23"), Rule("B3678/S34678")):
+      board_state = BoardState(rows=23, cols=17)
+      board_state.randomize_state(seed=6)
+      expected_board_state = BoardState.from_string(board_state.to_string())
+
+      strategy = CudaUpdateStrategy(rule=rule)
+      for generation in range(0, 3):
+        board_state.update(strategy=strategy)
+        expected_board_state.update(strategy=StraightPythonUpdateStrategy(rule=rule))
+
+      self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+class DeviceResidentCudaStrategyUpdateTests(BoardStateTests, unittest.TestCase):
+  """Run BoardStateTests for the device-resident CUDA update strategy."""
+
+  def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
+    self.opengl_draw_state = OpenGLDrawState()
+    self.strategy=DeviceResidentCudaUpdateStrategy(opengl_draw_state=self.opengl_draw_state)
+
+  def test_cells_are_only_copied_back_when_read(self):
+
+    board_state = BoardState(rows=10, cols=20)
+    board_state.randomize_state(seed=2)
+    expected_board_state = BoardState.from_string(board_state.to_string())
+    board_state.instrumentation = Profiler()
+
+    board_state.advance(self.strategy, 4)
+    board_state.advance(self.strategy, 3)
+    self.assertNotIn("bytes to host", board_state.instrumentation.summary()["counters"])
+
+    expected_board_state.advance(StraightPythonUpdateStrategy(), 7)
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+    board_state.to_string()
+
+    summary = board_state.instrumentation.summary()
+    self.assertEqual(summary["counters"]["bytes to device"]["count"], 1)
+    self.assertEqual(summary["counters"]["bytes to host"]["count"], 1)
+    self.assertEqual(summary["phases"]["kernel"]["count"], 2)
+
+    # Changing to another strategy brings the cells back before it runs.
+    board_state.advance(self.strategy, 1)
+    board_state.advance(StraightPythonUpdateStrategy(), 1)
+    expected_board_state.advance(StraightPythonUpdateStrategy(), 2)
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_changes_on_host_are_copied_to_device(self):
+
+    board_state = BoardState(rows=12, cols=9)
+    board_state.randomize_state(seed=4)
+    expected_board_state = BoardState.from_string(board_state.to_string())
+
+    for board in (board_state, expected_board_state):
+      board.advance(self.strategy if board is board_state else StraightPythonUpdateStrategy(), 2)
+      board.set_cell(5, 5)
+      board.clear_cell(0, 0)
+      board.advance(self.strategy if board is board_state else StraightPythonUpdateStrategy(), 2)
+
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,237 @@
+from board.boardstate import BoardObserver
+from board.boardstate import BoardState
+from board.boardstate import UpdateStrategy
+from board.history import pack_cells
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.packedboardstate import PackedBoardState
+from board.packedboardstate import unpack_rows
+from board.packedboardstrategy import PackedUpdateStrategy
+import collections
+import hashlib
+import numpy
+import unittest
+
+def board_hash(board_state):
+  """Returns a 64-bit hash of a board state's cells."""
+
+  return int.from_bytes(hashlib.blake2b(
+    memoryview(numpy.ascontiguousarray(board_state.cells)).cast("B"), digest_size=8).digest(),
+    "little")
+
+def rows_of(board_state, cells):
+  """
+    Returns the rows of one of a board state's cell arrays (e.g. new_cells),
+    as read_rows() would return them from its current cells.
+  """
+
+  if isinstance(board_state, PackedBoardState):
+    return unpack_rows(cells[1:-1, 1:-1], board_state.cols)
+  return cells.reshape(board_state.rows + 2, board_state.cols + 2)[1:-1, 1:-1]
+
+class CycleDetector(BoardObserver):
+  """
+    Observer that notices when the board settles into a still life or an
+    oscillator, i.e. when it repeats a state it was in before.
+
+    A hash of each generation the observer is notified of is kept, for up to
+    history_size of the latest ones, so cycles whose period spans no more than
+    that many notifications are found. The cells of those generations are
+    kept too, packed eight to a byte, so that a matching hash is only taken
+    as a repeat once the cells are found to be the same. The period is measured in generations
+    between notifications, so if the observer is not notified of every
+    generation it may be a multiple of the true period.
+
+    Once settled, settled_generation is the first generation of the cycle and
+    period its length; both are None until then. The on_settle function, if
+    given, is called with the detector and board state when that happens.
+  """
+
+  def __init__(self, history_size=1024, on_settle=None):
+
+    self.history_size = history_size
+    self.on_settle = on_settle
+
+    # Hashes of recent generations, oldest first, the latest generation each
+    # hash was seen at, and the packed cells of that generation.
+    self.history = collections.deque()
+    self.generations_by_hash = {}
+    self.cells_by_hash = {}
+
+    self.settled_generation = None
+    self.period = None
+
+  def is_settled(self):
+    """Returns True once the board has repeated a state."""
+
+    return self.period is not None
+
+  def on_update(self, board_state):
+    """Hash the board, and check whether it has been in this state before."""
+
+    if self.is_settled():
+      return
+
+    current_hash = board_hash(board_state)
+    current_cells = pack_cells(board_state)
+    previous_generation = self.generations_by_hash.get(current_hash)
+
+    # A hash collision between different boards just replaces the older one.
+    if (previous_generation is not None and previous_generation < board_state.generation
+        and numpy.array_equal(self.cells_by_hash[current_hash], current_cells)):
+      self.settled_generation = previous_generation
+      self.period = board_state.generation - previous_generation
+      if self.on_settle:
+        self.on_settle(self, board_state)
+      return
+
+    self.history.append((board_state.generation, current_hash))
+    self.generations_by_hash[current_hash] = board_state.generation
+    self.cells_by_hash[current_hash] = current_cells
+
+    if len(self.history) > self.history_size:
+      oldest_generation, oldest_hash = self.history.popleft()
+      if self.generations_by_hash.get(oldest_hash) == oldest_generation:
+        del self.generations_by_hash[oldest_hash]
+        del self.cells_by_hash[oldest_hash]
+
+class CycleExtrapolationStrategy(UpdateStrategy):
+  """
+    Strategy to continue a board that has settled into a cycle without
+    computing it any further.
+
+    For the first period's worth of updates the given strategy is used, and
+    each resulting generation is kept. After that, updates just replay the
+    kept generations in turn. The period is in generations, as found by
+    CycleDetector, and must be a multiple of the strategy's generations per
+    update (which it always is when found by observing that strategy).
+  """
+
+  def __init__(self, update_strategy, period):
+
+    self.update_strategy = update_strategy
+    self.generations_per_update = update_strategy.generations_per_update
+    self.updates_per_cycle = period // update_strategy.generations_per_update
+    if self.updates_per_cycle * update_strategy.generations_per_update != period:
+      raise Exception("Period must be a multiple of the strategy's generations per update")
+
+    self.cycle = []
+    self.cycle_index = 0
+
+  def update(self, board_state):
+    """Update the board state."""
+
+    if len(self.cycle) < self.updates_per_cycle:
+      self.update_strategy.update(board_state)
+      self.cycle.append(numpy.array(board_state.new_cells))
+      return
+
+    cells = self.cycle[self.cycle_index]
+    numpy.copyto(board_state.new_cells, cells)
+    self.cycle_index = (self.cycle_index + 1) % self.updates_per_cycle
+
+    opengl_draw_state = getattr(self.update_strategy, "opengl_draw_state", None)
+    if opengl_draw_state:
+      opengl_draw_state.refresh_cell_colors(rows_of(board_state, cells))
+
+
+class CycleDetectorTests(unittest.TestCase):
+  """Tests for detecting and extrapolating cycles."""
+
+  def test_still_life_and_oscillator_are_detected(self):
+
+    board_state = BoardState.from_string(
+      "-------\n" +
+      "-XX----\n" +
+      "-XX----\n" +
+      "-------\n" +
+      "----XXX\n" +
+      "-------")
+    settled = []
+    cycle_detector = CycleDetector(on_settle=lambda detector, board: settled.append(
+      board.generation))
+    board_state.add_observer(cycle_detector)
+
+    for update in range(0, 5):
+      board_state.update(NumpyUpdateStrategy())
+
+    self.assertEqual((cycle_detector.settled_generation, cycle_detector.period), (1, 2))
+    self.assertEqual(settled, [3])
+
+  def test_hash_collisions_are_not_taken_as_repeats(self):
+
+    board_state = BoardState.from_string(
+      "-----\n" +
+      "-XXX-\n" +
+      "-----")
+    next_board_state = BoardState.from_string(board_state.to_string())
+    next_board_state.update(NumpyUpdateStrategy())
+
+    # Pretend the first generation hashed the same as the next one.
+    cycle_detector = CycleDetector()
+    cycle_detector.on_update(board_state)
+    collision_hash = board_hash(next_board_state)
+    cycle_detector.generations_by_hash[collision_hash] = 0
+    cycle_detector.cells_by_hash[collision_hash] = pack_cells(board_state)
+
+    board_state.add_observer(cycle_detector)
+    board_state.update(NumpyUpdateStrategy())
+    self.assertFalse(cycle_detector.is_settled())
+
+    # The blinker does repeat a generation later.
+    board_state.update(NumpyUpdateStrategy())
+    self.assertEqual((cycle_detector.settled_generation, cycle_detector.period), (0, 2))
+
+  def test_cycles_longer_than_history_are_missed(self):
+
+    board_state = BoardState.from_string(
+      "-----\n" +
+      "-XXX-\n" +
+      "-----")
+    cycle_detector = CycleDetector(history_size=1)
+    board_state.add_observer(cycle_detector)
+
+    for update in range(0, 5):
+      board_state.update(NumpyUpdateStrategy())
+
+    self.assertFalse(cycle_detector.is_settled())
+
+  def test_extrapolation_matches_simulation(self):
+
+    board_state = PackedBoardState(rows=30, cols=30)
+    board_state.randomize_state(seed=11)
+    cycle_detector = CycleDetector()
+    board_state.add_observer(cycle_detector)
+
+    strategy = PackedUpdateStrategy()
+    while not cycle_detector.is_settled():
+      board_state.update(strategy)
+
+    expected_board_state = PackedBoardState.from_string(board_state.to_string())
+    extrapolation_strategy = CycleExtrapolationStrategy(strategy, cycle_detector.period)
+    for update in range(0, 3 * cycle_detector.period + 1):
+      board_state.update(extrapolation_strategy)
+      expected_board_state.update(strategy)
+
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_extrapolation_updates_draw_state(self):
+
+    from screen.gldrawstate import LIVE_CELL_INTENSITY, OpenGLDrawState
+
+    for board_state_class, strategy_class in ((BoardState, NumpyUpdateStrategy),
+        (PackedBoardState, PackedUpdateStrategy)):
+      board_state = board_state_class.from_string(
+        "-----\n" +
+        "-XXX-\n" +
+        "-----")
+      opengl_draw_state = OpenGLDrawState()
+      strategy = CycleExtrapolationStrategy(
+        strategy_class(opengl_draw_state=opengl_draw_state), 2)
+
+      for update in range(0, 5):
+        board_state.update(strategy)
+        self.assertEqual(opengl_draw_state.get_cell_intensities().reshape(3, 5).tolist(),
+          (board_state.read_rows() * LIVE_CELL_INTENSITY).tolist())
+
+if __name__ == '__main__':
+  unittest.main()
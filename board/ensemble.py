@@ -0,0 +1,224 @@
+from board.boardstate import BoardState
+from board.boardstate import UpdateStrategy
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.rules import CONWAY
+from board.rules import Rule
+import numpy
+import unittest
+
+class BoardEnsemble():
+  """
+    Stores the states of many independent boards of the same size, as
+    single (boards, rows+2, cols+2) arrays, so that strategies can update
+    every board at once instead of paying Python's overhead for each one.
+
+    As with BoardState, each board is surrounded by a border of empty cells,
+    and updates write the next generation into new_cells before the arrays
+    are swapped. Use board() for a BoardState view of any one board.
+  """
+
+  def __init__(self, count, rows, cols):
+
+    self.count = count
+    self.rows = rows
+    self.cols = cols
+
+    # Number of generations every board has advanced.
+    self.generation = 0
+
+    self.cells = numpy.zeros((count, rows+2, cols+2), dtype=numpy.uint8)
+    self.new_cells = numpy.zeros((count, rows+2, cols+2), dtype=numpy.uint8)
+
+  def __len__(self):
+    return self.count
+
+  def update(self, strategy):
+    """Advance every board by one generation."""
+
+    self.advance(strategy, 1)
+
+  def advance(self, strategy, updates):
+    """Advance every board by the given number of updates."""
+
+    strategy.advance(self, updates)
+    self.generation += updates * strategy.generations_per_update
+
+  def swap_cells(self):
+    """Swap the cell arrays, making the new cells the current ones."""
+
+    self.new_cells, self.cells = self.cells, self.new_cells
+
+  def as_3d_view(self):
+    """
+      Returns the cells of every board, without their borders, as a
+      (boards, rows, cols) numpy view of the current cell array.
+    """
+
+    return self.cells[:, 1:-1, 1:-1]
+
+  def randomize_state(self, densities=0.5, seeds=None):
+    """
+      Set each board to a random set of live/dead cells. The densities (the
+      probability of each cell being alive) and seeds can be given for all
+      boards at once or as a sequence with one for each board.
+
+      A board given a seed gets the same cells as a BoardState randomized with
+      that seed and density.
+    """
+
+    densities = numpy.broadcast_to(numpy.asarray(densities, dtype=numpy.float32), (self.count,))
+
+    if seeds is None:
+      generator = numpy.random.default_rng()
+      for start_board in range(0, self.count, self.boards_per_band()):
+        end_board = min(start_board + self.boards_per_band(), self.count)
+        self.as_3d_view()[start_board:end_board] = (
+          generator.random((end_board - start_board, self.rows, self.cols), dtype=numpy.float32)
+          < densities[start_board:end_board, numpy.newaxis, numpy.newaxis])
+      return
+
+    if numpy.ndim(seeds) == 0:
+      seeds = numpy.random.SeedSequence(seeds).spawn(self.count)
+    for index, (density, seed) in enumerate(zip(densities.tolist(), seeds)):
+      self.board(index).randomize_state(density, seed)
+
+  def boards_per_band(self):
+    """Returns how many boards to randomize at once, to bound the memory used."""
+
+    return max(1, (1 << 20) // max(1, self.rows * self.cols))
+
+  def populations(self):
+    """Returns the number of live cells on each board."""
+
+    return self.as_3d_view().sum(axis=(1, 2), dtype=numpy.int64)
+
+  def board(self, index):
+    """Returns a BoardState view of the board with the given index."""
+
+    return EnsembleBoard(self, index)
+
+class EnsembleBoard(BoardState):
+  """
+    A BoardState view of one board of an ensemble. It reads and writes the
+    ensemble's arrays, so it always shows the board's current state, but the
+    board can only be updated through the ensemble.
+  """
+
+  def __init__(self, ensemble, index):
+
+    self.ensemble = ensemble
+    self.index = index
+    super().__init__(ensemble.rows, ensemble.cols)
+
+  def allocate_cells(self):
+    """The cells are the ensemble's, so there are none to allocate."""
+
+  @property
+  def cells(self):
+    return self.ensemble.cells[self.index].reshape(-1)
+
+  @property
+  def new_cells(self):
+    return self.ensemble.new_cells[self.index].reshape(-1)
+
+  @property
+  def generation(self):
+    return self.ensemble.generation
+
+  def advance(self, strategy, updates):
+    raise Exception("Boards in an ensemble can only be updated through the ensemble")
+
+class NumpyEnsembleUpdateStrategy(UpdateStrategy):
+  """
+    Strategy to update every board of a BoardEnsemble using vectorized numpy
+    operations, in the same way as NumpyUpdateStrategy does a single board.
+  """
+
+  def __init__(self, rule=None):
+
+    self.rule = rule if rule else CONWAY
+
+    # Scratch array for neighbor counts, reallocated if the ensemble changes.
+    self.neighbor_counts = numpy.zeros((0, 0, 0), dtype=numpy.uint8)
+
+  def update(self, ensemble):
+    """Update every board of the ensemble."""
+
+    cells = ensemble.cells
+    new_cells = ensemble.new_cells
+
+    if self.neighbor_counts.shape != (ensemble.count, ensemble.rows, ensemble.cols):
+      self.neighbor_counts = numpy.zeros((ensemble.count, ensemble.rows, ensemble.cols),
+        dtype=numpy.uint8)
+
+    # Count neighbors by adding the boards shifted by one cell in each of the
+    # eight directions; the borders mean no bounds checks are needed.
+    above = cells[:, :-2]
+    row = cells[:, 1:-1]
+    below = cells[:, 2:]
+
+    counts = self.neighbor_counts
+    numpy.add(above[:, :, :-2], above[:, :, 1:-1], out=counts)
+    counts += above[:, :, 2:]
+    counts += row[:, :, :-2]
+    counts += row[:, :, 2:]
+    counts += below[:, :, :-2]
+    counts += below[:, :, 1:-1]
+    counts += below[:, :, 2:]
+
+    # Look up each cell's current state and neighbor count in the rule's
+    # table, using the new cells as scratch space for the states.
+    region = new_cells[:, 1:-1, 1:-1]
+    numpy.left_shift(row[:, :, 1:-1], 4, out=region)
+    counts |= region
+    numpy.take(self.rule.transition_table, counts, out=region)
+
+class BoardEnsembleTests(unittest.TestCase):
+  """Tests for ensembles of boards and their strategies."""
+
+  def random_ensemble(self):
+    """Returns an ensemble of boards with a range of densities."""
+
+    ensemble = BoardEnsemble(count=6, rows=13, cols=11)
+    ensemble.randomize_state(densities=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6], seeds=range(0, 6))
+    return ensemble
+
+  def test_seeded_boards_match_board_states(self):
+
+    ensemble = self.random_ensemble()
+
+    for index in range(0, 6):
+      board_state = BoardState(rows=13, cols=11)
+      board_state.randomize_state(density=0.1 * (index + 1), seed=index)
+      self.assertEqual(ensemble.board(index).to_string(), board_state.to_string())
+
+    self.assertEqual(ensemble.populations()[2], ensemble.board(2).as_2d_view().sum())
+
+  def test_strategies_match_single_board_updates(self):
+
+    ensemble = self.random_ensemble()
+    board_states = [BoardState.from_string(ensemble.board(index).to_string())
+      for index in range(0, 6)]
+
+    strategy = NumpyEnsembleUpdateStrategy(rule=Rule("B36/S23"))
+    for update in range(0, 5):
+      ensemble.update(strategy)
+    for board_state in board_states:
+      board_state.advance(NumpyUpdateStrategy(rule=Rule("B36/S23")), 5)
+
+    self.assertEqual(ensemble.generation, 5)
+    self.assertEqual(ensemble.board(3).generation, 5)
+    for index, board_state in enumerate(board_states):
+      self.assertEqual(ensemble.board(index).to_string(), board_state.to_string())
+
+  def test_boards_are_only_updated_through_the_ensemble(self):
+
+    ensemble = BoardEnsemble(count=2, rows=3, cols=3)
+    ensemble.board(1).set_cell(1, 1)
+
+    self.assertEqual(ensemble.populations().tolist(), [0, 1])
+    with self.assertRaises(Exception):
+      ensemble.board(1).update(NumpyUpdateStrategy())
+
+if __name__ == '__main__':
+  unittest.main()
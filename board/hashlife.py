@@ -0,0 +1,468 @@
+from board.boardstate import BoardObserver
+from board.boardstate import BoardState
+from board.boardstate import UpdateStrategy
+from board.boardstate import BoardStateTests
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.rules import CONWAY
+from board.rules import Rule
+import numpy
+import unittest
+
+class HashLifeNode():
+  """
+    A square block of 2^level by 2^level cells, made of four blocks one level
+    down. Nodes are canonical (there is only ever one node for a given set of
+    quadrants in a HashLife engine's table), so identical regions of the board
+    share a node and nodes can be compared and hashed by identity.
+  """
+
+  __slots__ = ("level", "nw", "ne", "sw", "se", "population")
+
+  def __init__(self, level, nw, ne, sw, se, population):
+    self.level = level
+    self.nw = nw
+    self.ne = ne
+    self.sw = sw
+    self.se = se
+    self.population = population
+
+# The two level zero nodes, i.e. single cells.
+DEAD_CELL = HashLifeNode(0, None, None, None, None, 0)
+LIVE_CELL = HashLifeNode(0, None, None, None, None, 1)
+
+class HashLife():
+  """
+    Advances a board by large powers of two of generations using Gosper's
+    HashLife algorithm, which memoizes the future of every distinct block of
+    the board so that repeated structure (in space or in time) is only ever
+    computed once.
+
+    HashLife works on an unbounded plane, rather than a board with a border
+    of dead cells, so results match repeated BoardState.update calls only
+    while the pattern stays clear of the board edges. Anything that grows past
+    the edges is discarded when the result is written back.
+
+    Between advances, once the node table and memoized results hold more
+    than max_cache_size entries, they are cut back to the nodes making up
+    the latest board and the results among those nodes. This keeps memory
+    use bounded over long runs without ever flushing the caches partway
+    through an advance, when every result would have to be recomputed.
+    Advances of more than max_step generations are made as successive steps
+    of max_step, with the caches collected between them if need be, so a
+    single large advance is bounded too.
+
+    The smallest step, of a 4x4 block, is a lookup in the rule's block table.
+  """
+
+  def __init__(self, max_cache_size=1000000, rule=None, max_step=1 << 10):
+
+    if max_step < 1 or max_step & (max_step - 1):
+      raise Exception("Maximum step must be a power of two")
+
+    self.max_cache_size = max_cache_size
+    self.max_step = max_step
+    self.rule = rule if rule else CONWAY
+    self.block_table = self.rule.block_table()
+
+    # Number of times the caches have been collected.
+    self.collections = 0
+
+    # The node of the latest board advanced to, whose nodes are kept when
+    # the caches are collected.
+    self.root = None
+
+    self.nodes = {}
+    self.results = {}
+    self.empty_nodes = [DEAD_CELL]
+
+  def collect(self):
+    """
+      Discard the cached nodes and results, except the nodes reachable from
+      the latest board's node and the results that take one of those nodes
+      to another.
+    """
+
+    self.collections += 1
+
+    reachable = set()
+    unvisited = [self.root] if self.root is not None else []
+    while unvisited:
+      node = unvisited.pop()
+      if node.level == 0 or node in reachable:
+        continue
+      reachable.add(node)
+      unvisited.extend((node.nw, node.ne, node.sw, node.se))
+
+    self.nodes = {key: node for key, node in self.nodes.items() if node in reachable}
+    self.results = {key: result for key, result in self.results.items()
+      if key[0] in reachable and result in reachable}
+    self.empty_nodes = [DEAD_CELL]
+
+  def cache_size(self):
+    """Returns the number of nodes and memoized results currently held."""
+
+    return len(self.nodes) + len(self.results)
+
+  def join(self, nw, ne, sw, se):
+    """Returns the canonical node made of the given quadrants."""
+
+    key = (nw, ne, sw, se)
+    node = self.nodes.get(key)
+
+    if node is None:
+      node = HashLifeNode(nw.level + 1, nw, ne, sw, se,
+        nw.population + ne.population + sw.population + se.population)
+      self.nodes[key] = node
+
+    return node
+
+  def empty(self, level):
+    """Returns a node of the given level with no live cells."""
+
+    while len(self.empty_nodes) <= level:
+      smaller = self.empty_nodes[-1]
+      self.empty_nodes.append(self.join(smaller, smaller, smaller, smaller))
+
+    return self.empty_nodes[level]
+
+  def expand(self, node):
+    """Returns a node one level up, with the given node at its center."""
+
+    empty = self.empty(node.level - 1)
+    return self.join(
+      self.join(empty, empty, empty, node.nw),
+      self.join(empty, empty, node.ne, empty),
+      self.join(empty, node.sw, empty, empty),
+      self.join(node.se, empty, empty, empty))
+
+  def center(self, node):
+    """Returns the node one level down at the center of the given node."""
+
+    return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+  def horizontal_center(self, west, east):
+    """Returns the node straddling the boundary between two side-by-side nodes."""
+
+    return self.join(west.ne, east.nw, west.se, east.sw)
+
+  def vertical_center(self, north, south):
+    """Returns the node straddling the boundary between two stacked nodes."""
+
+    return self.join(north.sw, north.se, south.nw, south.ne)
+
+  def successor(self, node, step_log2):
+    """
+      Returns the node one level down at the center of the given node, after
+      2^step_log2 generations. The step must be at most 2^(level - 2), so that
+      the result depends only on cells inside the node.
+    """
+
+    key = (node, step_log2)
+    result = self.results.get(key)
+    if result is not None:
+      return result
+
+    if node.population == 0:
+      result = self.empty(node.level - 1)
+
+    elif node.level == 2:
+      result = self.next_generation_4x4(node)
+
+    else:
+      # Split the node into nine overlapping nodes one level down.
+      n00 = node.nw
+      n01 = self.horizontal_center(node.nw, node.ne)
+      n02 = node.ne
+      n10 = self.vertical_center(node.nw, node.sw)
+      n11 = self.center(node)
+      n12 = self.vertical_center(node.ne, node.se)
+      n20 = node.sw
+      n21 = self.horizontal_center(node.sw, node.se)
+      n22 = node.se
+
+      if step_log2 == node.level - 2:
+        # Full speed: advance half the steps getting from the nine nodes to
+        # four, and the other half getting from four to the result.
+        advance = lambda part: self.successor(part, step_log2 - 1)
+      else:
+        # Slower: take the centers of the nine nodes, and only advance
+        # getting from four to the result.
+        advance = self.center
+
+      c00, c01, c02 = advance(n00), advance(n01), advance(n02)
+      c10, c11, c12 = advance(n10), advance(n11), advance(n12)
+      c20, c21, c22 = advance(n20), advance(n21), advance(n22)
+
+      step_for_quadrants = min(step_log2, node.level - 3)
+
+      result = self.join(
+        self.successor(self.join(c00, c01, c10, c11), step_for_quadrants),
+        self.successor(self.join(c01, c02, c11, c12), step_for_quadrants),
+        self.successor(self.join(c10, c11, c20, c21), step_for_quadrants),
+        self.successor(self.join(c11, c12, c21, c22), step_for_quadrants))
+
+    self.results[key] = result
+
+    return result
+
+  def next_generation_4x4(self, node):
+    """Returns the center 2x2 cells of a level two node after one generation."""
+
+    # Look up the 16 cells, as bit row * 4 + col, in the rule's block table.
+    block = (
+      node.nw.nw.population | node.nw.ne.population << 1
+      | node.ne.nw.population << 2 | node.ne.ne.population << 3
+      | node.nw.sw.population << 4 | node.nw.se.population << 5
+      | node.ne.sw.population << 6 | node.ne.se.population << 7
+      | node.sw.nw.population << 8 | node.sw.ne.population << 9
+      | node.se.nw.population << 10 | node.se.ne.population << 11
+      | node.sw.sw.population << 12 | node.sw.se.population << 13
+      | node.se.sw.population << 14 | node.se.se.population << 15)
+    center = int(self.block_table[block])
+
+    return self.join(*(LIVE_CELL if center & (1 << bit) else DEAD_CELL for bit in range(0, 4)))
+
+  def from_array(self, cells, row, col, level):
+    """
+      Returns a node for the 2^level square of a two-dimensional array of
+      cells starting at (row, col). Locations past the array are dead.
+    """
+
+    size = 1 << level
+
+    if level == 1:
+      block = numpy.zeros((2, 2), dtype=numpy.uint8)
+      region = cells[row:row+2, col:col+2]
+      block[:region.shape[0], :region.shape[1]] = region
+      return self.join(*(LIVE_CELL if cell else DEAD_CELL for cell in block.flat))
+
+    if not cells[row:row+size, col:col+size].any():
+      return self.empty(level)
+
+    half = size // 2
+    return self.join(
+      self.from_array(cells, row, col, level - 1),
+      self.from_array(cells, row, col + half, level - 1),
+      self.from_array(cells, row + half, col, level - 1),
+      self.from_array(cells, row + half, col + half, level - 1))
+
+  def to_array(self, node, cells, row, col):
+    """
+      Set the live cells of a node in a two-dimensional array of cells, with
+      the node's top-left corner at (row, col). Parts of the node that fall
+      outside the array are ignored, and dead cells are left untouched.
+    """
+
+    size = 1 << node.level
+
+    if (node.population == 0 or row >= cells.shape[0] or col >= cells.shape[1]
+        or row + size <= 0 or col + size <= 0):
+      return
+
+    if node.level == 0:
+      cells[row, col] = 1
+      return
+
+    half = size // 2
+    self.to_array(node.nw, cells, row, col)
+    self.to_array(node.ne, cells, row, col + half)
+    self.to_array(node.sw, cells, row + half, col)
+    self.to_array(node.se, cells, row + half, col + half)
+
+  def advance_cells(self, new_cells, cells, num_rows, num_cols, generations):
+    """
+      Set new_cells to the given cells after the given number of generations,
+      which must be a power of two. Both are bordered one-dimensional arrays,
+      as held by BoardState.
+    """
+
+    if generations < 1 or generations & (generations - 1):
+      raise Exception("Generations must be a power of two")
+    step = min(generations, self.max_step)
+    step_log2 = step.bit_length() - 1
+
+    if self.cache_size() > self.max_cache_size:
+      self.collect()
+
+    cells = cells.reshape(num_rows + 2, num_cols + 2)[1:-1, 1:-1]
+    new_cells = new_cells.reshape(num_rows + 2, num_cols + 2)[1:-1, 1:-1]
+    new_cells[:] = 0
+
+    live_rows = numpy.flatnonzero(cells.any(axis=1))
+    if len(live_rows) == 0:
+      return
+    live_cols = numpy.flatnonzero(cells.any(axis=0))
+
+    # Bounds of where cells may be alive, which spread by a cell each
+    # generation, and of the node holding the cells (a square with its
+    # top-left corner at (origin, origin)).
+    first_row, last_row = live_rows[0], live_rows[-1]
+    first_col, last_col = live_cols[0], live_cols[-1]
+    level = max(1, (max(num_rows, num_cols) - 1).bit_length())
+    node = self.from_array(cells, 0, 0, level)
+    origin = 0
+
+    for advance in range(0, generations // step):
+      if advance > 0 and self.cache_size() > self.max_cache_size:
+        self.collect()
+
+      # The successor of a node is its center half, so grow the node until
+      # that center can hold everything the live cells could spread to.
+      while True:
+        size = 1 << node.level
+        result_start = origin + size // 4
+        result_end = origin + 3 * size // 4
+        if (step_log2 <= node.level - 2
+            and first_row - step >= result_start
+            and first_col - step >= result_start
+            and last_row + step < result_end
+            and last_col + step < result_end):
+          break
+
+        node = self.expand(node)
+        origin -= size // 2
+
+      self.root = node = self.successor(node, step_log2)
+      origin = result_start
+      first_row, last_row = first_row - step, last_row + step
+      first_col, last_col = first_col - step, last_col + step
+
+    self.to_array(self.root, new_cells, origin, origin)
+
+  def advance(self, board_state, generations):
+    """
+      Advance the board state by the given number of generations, which must
+      be a power of two, and notify its observers.
+    """
+
+    board_state.advance(HashLifeUpdateStrategy(generations=generations, hashlife=self), 1)
+
+class HashLifeUpdateStrategy(UpdateStrategy):
+  """
+    Strategy to update the board state using HashLife, advancing it by a
+    (power of two) number of generations each update.
+  """
+
+  def __init__(self, opengl_draw_state=None, generations=1, hashlife=None, rule=None):
+    self.opengl_draw_state = opengl_draw_state
+    self.generations = generations
+    self.generations_per_update = generations
+    self.hashlife = hashlife if hashlife else HashLife(rule=rule)
+
+  def update(self, board_state):
+    """Update the board state."""
+
+    self.hashlife.advance_cells(board_state.new_cells, board_state.cells,
+      board_state.rows, board_state.cols, self.generations)
+
+    if self.opengl_draw_state:
+      self.opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
+      self.opengl_draw_state.refresh_cell_colors(board_state.new_cells.reshape(
+        board_state.rows + 2, board_state.cols + 2)[1:-1, 1:-1])
+
+
+class HashLifeStrategyUpdateTests(BoardStateTests, unittest.TestCase):
+  """Run BoardStateTests for the HashLife update strategy."""
+
+  def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
+    self.opengl_draw_state = OpenGLDrawState()
+    self.strategy=HashLifeUpdateStrategy(opengl_draw_state=self.opengl_draw_state)
+
+  def glider_board_state(self):
+    """Returns a board with a glider and a blinker, clear of the edges."""
+
+    board_state = BoardState(rows=48, cols=40)
+    for row, col in ((1, 2), (2, 3), (3, 1), (3, 2), (3, 3), (30, 20), (30, 21), (30, 22)):
+      board_state.set_cell(row, col)
+    return board_state
+
+  def test_advance_matches_repeated_updates(self):
+
+    for generations in (1, 2, 8, 32):
+      board_state = self.glider_board_state()
+      expected_board_state = self.glider_board_state()
+
+      HashLife().advance(board_state, generations)
+      for generation in range(0, generations):
+        expected_board_state.update(strategy=NumpyUpdateStrategy())
+
+      self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_advance_is_unchanged_by_cache_collections(self):
+
+    board_state = self.glider_board_state()
+    expected_board_state = self.glider_board_state()
+    hashlife = HashLife(max_cache_size=20)
+
+    for advance in range(0, 3):
+      hashlife.advance(board_state, 16)
+      HashLife().advance(expected_board_state, 16)
+      self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+    self.assertEqual(hashlife.collections, 2)
+
+  def test_large_advances_are_made_in_steps(self):
+
+    board_state = self.glider_board_state()
+    expected_board_state = self.glider_board_state()
+    hashlife = HashLife(max_cache_size=20, max_step=4)
+
+    hashlife.advance(board_state, 32)
+    HashLife().advance(expected_board_state, 32)
+
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+    self.assertEqual(hashlife.collections, 7)
+
+  def test_collection_keeps_the_latest_board(self):
+
+    hashlife = HashLife()
+    hashlife.advance(self.glider_board_state(), 8)
+    root = hashlife.root
+    cache_size = hashlife.cache_size()
+
+    hashlife.collect()
+
+    self.assertLess(hashlife.cache_size(), cache_size)
+    self.assertIs(hashlife.join(root.nw, root.ne, root.sw, root.se), root)
+    self.assertIs(hashlife.join(root.nw.nw, root.nw.ne, root.nw.sw, root.nw.se), root.nw)
+
+  def test_advance_goes_through_board_state(self):
+
+    from board.instrumentation import Profiler
+
+    board_state = self.glider_board_state()
+    board_state.instrumentation = Profiler()
+    notified_generations = []
+    board_state.add_observer(type("Observer", (BoardObserver,),
+      {"on_update": lambda self, board: notified_generations.append(board.generation)})())
+
+    HashLife().advance(board_state, 4)
+
+    self.assertEqual(notified_generations, [4])
+    self.assertIn("strategy", board_state.instrumentation.format_summary())
+
+  def test_advance_follows_rule(self):
+
+    # HighLife's replicator copies itself along a diagonal.
+    for generations in (4, 16):
+      board_state = BoardState(rows=40, cols=40)
+      for row, col in ((18, 20), (18, 21), (18, 22), (19, 19), (19, 22), (20, 18),
+          (20, 22), (21, 18), (21, 21), (22, 18), (22, 19), (22, 20)):
+        board_state.set_cell(row, col)
+      expected_board_state = BoardState.from_string(board_state.to_string())
+
+      HashLife(rule=Rule("B36/S23")).advance(board_state, generations)
+      for generation in range(0, generations):
+        expected_board_state.update(strategy=NumpyUpdateStrategy(rule=Rule("B36/S23")))
+
+      self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_advance_rejects_other_generation_counts(self):
+
+    with self.assertRaises(Exception):
+      HashLife().advance(self.glider_board_state(), 3)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,356 @@
+from board.boardstate import BoardObserver
+from board.boardstate import BoardState
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.packedboardstate import PackedBoardState
+from board.packedboardstrategy import PackedUpdateStrategy
+import bisect
+import numpy
+import os
+import struct
+import tempfile
+import unittest
+
+# History files hold a header followed by each recorded frame, oldest first.
+#
+# The header holds, in little-endian order: the magic bytes, the format
+# version, rows, columns and the number of frames. Each frame is its
+# generation, its kind and the length of its data, followed by the data.
+
+HISTORY_MAGIC = b"CONWAYHS"
+HISTORY_VERSION = 1
+HISTORY_HEADER_FORMAT = "<8sIQQQ"
+HISTORY_FRAME_FORMAT = "<QBQ"
+
+# Kinds of frame. A keyframe holds the whole board, with its cells packed
+# eight to a byte. The others hold the XOR of the packed bytes with the
+# previous frame's, for just the bytes that changed: a sparse delta gives a
+# uint32 index for each, followed by their XORs, and a masked delta (smaller
+# once more than about a quarter of the bytes change) gives a bit for every
+# byte, set for those that changed, followed by their XORs.
+KEYFRAME = 0
+SPARSE_DELTA = 1
+MASKED_DELTA = 2
+
+# Bytes taken by each changed byte in a sparse delta.
+SPARSE_DELTA_BYTES_PER_CHANGE = 5
+
+def pack_cells(board_state):
+  """Returns the board's cells packed eight to a byte, row after row."""
+
+  return numpy.packbits(board_state.read_rows(), axis=None)
+
+def encode_delta(previous_packed_cells, packed_cells):
+  """
+    Returns the kind and data of the smaller delta frame between two sets of
+    packed cells.
+  """
+
+  differences = previous_packed_cells ^ packed_cells
+  changed = numpy.flatnonzero(differences)
+
+  mask_bytes = (differences.size + 7) // 8
+  if len(changed) * SPARSE_DELTA_BYTES_PER_CHANGE <= mask_bytes + len(changed):
+    return SPARSE_DELTA, changed.astype('<u4').tobytes() + differences[changed].tobytes()
+
+  return MASKED_DELTA, numpy.packbits(differences != 0).tobytes() + differences[changed].tobytes()
+
+def apply_delta(packed_cells, kind, data):
+  """Apply the data of a delta frame of the given kind to packed cells, in place."""
+
+  if kind == SPARSE_DELTA:
+    changes = len(data) // SPARSE_DELTA_BYTES_PER_CHANGE
+    changed = numpy.frombuffer(data, dtype='<u4', count=changes)
+    packed_cells[changed] ^= numpy.frombuffer(data, dtype=numpy.uint8, offset=4 * changes)
+  else:
+    mask_bytes = (packed_cells.size + 7) // 8
+    changed = numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8, count=mask_bytes),
+      count=packed_cells.size).view(bool)
+    packed_cells[changed] ^= numpy.frombuffer(data, dtype=numpy.uint8, offset=mask_bytes)
+
+class HistoryRecorder(BoardObserver):
+  """
+    Observer that records the generations it is notified of, so that any of
+    them can be looked at again later (with state_at) or replayed.
+
+    Every keyframe_interval frames the whole board is recorded, packed one
+    bit per cell; in between, only the bytes that changed since the frame
+    before are. Frames are kept in order in a ring buffer: once they take
+    more than memory_budget bytes, the oldest keyframe and the deltas that
+    depend on it are dropped. The newest keyframe and its deltas are always
+    kept, so the budget can be exceeded if they alone take more than it.
+  """
+
+  def __init__(self, keyframe_interval=100, memory_budget=256 << 20, rows=None, cols=None):
+
+    self.keyframe_interval = keyframe_interval
+    self.memory_budget = memory_budget
+    self.rows = rows
+    self.cols = cols
+
+    # Generation, kind and data of each frame, oldest first.
+    self.generations = []
+    self.kinds = []
+    self.frames = []
+    self.memory_used = 0
+
+    # Packed cells of the last frame recorded, and the number of frames
+    # since the last keyframe.
+    self.last_packed_cells = None
+    self.frames_since_keyframe = 0
+
+  def __len__(self):
+    return len(self.generations)
+
+  def on_update(self, board_state):
+    """Record the board's current generation."""
+
+    if self.generations and board_state.generation <= self.generations[-1]:
+      raise Exception("History can only record generations in order")
+
+    if self.rows is None:
+      self.rows = board_state.rows
+      self.cols = board_state.cols
+    elif (self.rows, self.cols) != (board_state.rows, board_state.cols):
+      raise Exception("History can only record boards of one size")
+
+    self.record(board_state.generation, pack_cells(board_state))
+
+  def record(self, generation, packed_cells):
+    """Record a generation's packed cells, as a keyframe or a delta."""
+
+    kind = KEYFRAME
+    if self.last_packed_cells is not None and self.frames_since_keyframe < self.keyframe_interval:
+      kind, data = encode_delta(self.last_packed_cells, packed_cells)
+      # A delta that changes nearly all of the board is no smaller than a
+      # keyframe.
+      if len(data) >= packed_cells.nbytes:
+        kind = KEYFRAME
+
+    if kind == KEYFRAME:
+      data = packed_cells.tobytes()
+      self.frames_since_keyframe = 0
+    self.frames_since_keyframe += 1
+
+    self.generations.append(generation)
+    self.kinds.append(kind)
+    self.frames.append(data)
+    self.memory_used += len(data)
+    self.last_packed_cells = packed_cells
+
+    self.evict()
+
+  def evict(self):
+    """Drop the oldest frames, a keyframe and its deltas at a time, while over budget."""
+
+    while self.memory_used > self.memory_budget:
+      next_keyframe = self.kinds.index(KEYFRAME, 1) if KEYFRAME in self.kinds[1:] else None
+      if next_keyframe is None:
+        return
+
+      self.memory_used -= sum(len(data) for data in self.frames[:next_keyframe])
+      del self.generations[:next_keyframe]
+      del self.kinds[:next_keyframe]
+      del self.frames[:next_keyframe]
+
+  def first_generation(self):
+    """Returns the oldest generation still recorded, or None if there are none."""
+
+    return self.generations[0] if self.generations else None
+
+  def last_generation(self):
+    """Returns the newest generation recorded, or None if there are none."""
+
+    return self.generations[-1] if self.generations else None
+
+  def state_at(self, generation):
+    """
+      Returns a BoardState of the given generation, decoded from the nearest
+      keyframe before it. Raises an exception if the generation wasn't
+      recorded, or has been dropped.
+    """
+
+    index = bisect.bisect_left(self.generations, generation)
+    if index == len(self.generations) or self.generations[index] != generation:
+      raise Exception("Generation " + str(generation) + " is not in the history")
+
+    keyframe = index
+    while self.kinds[keyframe] != KEYFRAME:
+      keyframe -= 1
+
+    packed_cells = numpy.frombuffer(self.frames[keyframe], dtype=numpy.uint8).copy()
+    for frame in range(keyframe + 1, index + 1):
+      apply_delta(packed_cells, self.kinds[frame], self.frames[frame])
+
+    return self.unpack_board_state(generation, packed_cells)
+
+  def replay(self, start_generation=None):
+    """
+      Yields a BoardState of each recorded generation in turn, from the
+      given one (or the oldest) on, decoding each frame only once.
+    """
+
+    index = 0
+    if start_generation is not None:
+      index = bisect.bisect_left(self.generations, start_generation)
+      if index == len(self.generations):
+        return
+
+    board_state = self.state_at(self.generations[index])
+    packed_cells = numpy.packbits(board_state.read_rows(), axis=None)
+    yield board_state
+
+    for frame in range(index + 1, len(self.generations)):
+      if self.kinds[frame] == KEYFRAME:
+        packed_cells = numpy.frombuffer(self.frames[frame], dtype=numpy.uint8).copy()
+      else:
+        apply_delta(packed_cells, self.kinds[frame], self.frames[frame])
+      yield self.unpack_board_state(self.generations[frame], packed_cells)
+
+  def unpack_board_state(self, generation, packed_cells):
+    """Returns a BoardState of a generation from its packed cells."""
+
+    board_state = BoardState(self.rows, self.cols)
+    board_state.load_rows(numpy.unpackbits(packed_cells, count=self.rows * self.cols).reshape(
+      self.rows, self.cols))
+    board_state.generation = generation
+    return board_state
+
+  def save(self, path):
+    """Write the recorded frames to a history file."""
+
+    with open(path, "wb") as file:
+      file.write(struct.pack(HISTORY_HEADER_FORMAT, HISTORY_MAGIC, HISTORY_VERSION,
+        self.rows or 0, self.cols or 0, len(self.generations)))
+      for generation, kind, data in zip(self.generations, self.kinds, self.frames):
+        file.write(struct.pack(HISTORY_FRAME_FORMAT, generation, kind, len(data)))
+        file.write(data)
+
+  @classmethod
+  def load(cls, path, keyframe_interval=100, memory_budget=256 << 20):
+    """
+      Read a history file. Any generations recorded after it is loaded are
+      added to those read.
+    """
+
+    with open(path, "rb") as file:
+      header = file.read(struct.calcsize(HISTORY_HEADER_FORMAT))
+      if len(header) < struct.calcsize(HISTORY_HEADER_FORMAT):
+        raise Exception("History file is too short")
+
+      magic, version, rows, cols, frame_count = struct.unpack(HISTORY_HEADER_FORMAT, header)
+      if magic != HISTORY_MAGIC:
+        raise Exception("Not a history file")
+      if version != HISTORY_VERSION:
+        raise Exception("Unsupported history version")
+
+      history = cls(keyframe_interval, memory_budget, rows, cols)
+      for frame in range(0, frame_count):
+        frame_header = file.read(struct.calcsize(HISTORY_FRAME_FORMAT))
+        if len(frame_header) < struct.calcsize(HISTORY_FRAME_FORMAT):
+          raise Exception("History file is truncated")
+        generation, kind, length = struct.unpack(HISTORY_FRAME_FORMAT, frame_header)
+        data = file.read(length)
+        if len(data) < length:
+          raise Exception("History file is truncated")
+
+        history.generations.append(generation)
+        history.kinds.append(kind)
+        history.frames.append(data)
+        history.memory_used += length
+
+    if history.generations:
+      history.last_packed_cells = numpy.packbits(
+        history.state_at(history.generations[-1]).read_rows(), axis=None)
+      history.frames_since_keyframe = history.kinds[::-1].index(KEYFRAME) + 1
+
+    return history
+
+
+class HistoryTests(unittest.TestCase):
+  """Tests for recording, looking up and replaying generations."""
+
+  def recorded_history(self, board_state, strategy, updates, **arguments):
+    """Returns a history of the board over the given updates, and each board string."""
+
+    history = HistoryRecorder(**arguments)
+    board_state.add_observer(history)
+    boards = {}
+    for update in range(0, updates):
+      board_state.update(strategy)
+      boards[board_state.generation] = board_state.to_string()
+    return history, boards
+
+  def glider_board_state(self):
+    """Returns a 64x64 board with a glider in the top left."""
+
+    board_state = BoardState(rows=64, cols=64)
+    board_state.as_2d_view()[0:3, 0:3] = [[0, 1, 0], [0, 0, 1], [1, 1, 1]]
+    return board_state
+
+  def test_state_at_matches_every_generation(self):
+
+    for board_state_class, strategy in ((BoardState, NumpyUpdateStrategy()),
+        (PackedBoardState, PackedUpdateStrategy())):
+      board_state = board_state_class(rows=23, cols=70)
+      board_state.randomize_state(density=0.3, seed=8)
+      history, boards = self.recorded_history(board_state, strategy, 30, keyframe_interval=7)
+
+      self.assertIn(MASKED_DELTA, history.kinds)
+      for generation in range(1, 31):
+        self.assertEqual(history.state_at(generation).to_string(), boards[generation])
+      self.assertEqual([board.to_string() for board in history.replay(12)],
+        [boards[generation] for generation in range(12, 31)])
+
+    with self.assertRaises(Exception):
+      history.state_at(31)
+
+  def test_small_changes_are_recorded_as_sparse_deltas(self):
+
+    history, boards = self.recorded_history(self.glider_board_state(), NumpyUpdateStrategy(),
+      30, keyframe_interval=7)
+
+    self.assertEqual([generation for generation, kind in zip(history.generations, history.kinds)
+      if kind == KEYFRAME], [1, 8, 15, 22, 29])
+    self.assertEqual(set(history.kinds), {KEYFRAME, SPARSE_DELTA})
+    self.assertLess(history.memory_used, 5 * 512 + 25 * 10 * SPARSE_DELTA_BYTES_PER_CHANGE)
+
+  def test_memory_budget_drops_oldest_frames(self):
+
+    history, boards = self.recorded_history(self.glider_board_state(), NumpyUpdateStrategy(),
+      40, keyframe_interval=10, memory_budget=1500)
+
+    # Each keyframe is 512 bytes, so only the newest two keyframes (and
+    # their deltas) fit.
+    self.assertLessEqual(history.memory_used, 1500)
+    self.assertEqual((history.first_generation(), history.last_generation()), (21, 40))
+    self.assertEqual(history.state_at(21).to_string(), boards[21])
+
+  def test_history_round_trips_through_file(self):
+
+    board_state = self.glider_board_state()
+    history, boards = self.recorded_history(board_state, NumpyUpdateStrategy(), 12,
+      keyframe_interval=5)
+
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "board.history")
+      history.save(path)
+      loaded_history = HistoryRecorder.load(path, keyframe_interval=5)
+
+      # Recording carries on from where the file left off.
+      board_state.observers = [loaded_history]
+      board_state.notification_policies = [None]
+      for update in range(0, 4):
+        board_state.update(NumpyUpdateStrategy())
+        boards[board_state.generation] = board_state.to_string()
+
+    self.assertEqual(loaded_history.generations, list(range(1, 17)))
+    self.assertEqual(loaded_history.kinds[12:],
+      [SPARSE_DELTA, SPARSE_DELTA, SPARSE_DELTA, KEYFRAME])
+    for generation in (3, 12, 16):
+      self.assertEqual(loaded_history.state_at(generation).to_string(), boards[generation])
+
+    with self.assertRaises(Exception):
+      HistoryRecorder.load(__file__)
+
+if __name__ == '__main__':
+  unittest.main()
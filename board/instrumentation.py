@@ -0,0 +1,270 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import unittest
+
+# Instrumentation of where the time goes when updating a board: each phase of
+# an update (running the strategy, swapping cells, notifying observers, and
+# any phases a strategy adds, such as CUDA copies) is timed, and counters
+# (such as bytes copied) are added up. Both are kept as rolling histograms.
+#
+# A board state's instrumentation defaults to NULL_INSTRUMENTATION, which
+# records nothing, so that uninstrumented runs pay little more than a method
+# call per phase.
+
+# Number of log2 buckets in a histogram, enough for any 64-bit value.
+HISTOGRAM_BUCKETS = 65
+
+class RollingHistogram():
+  """
+    Histogram of recent values, in buckets by powers of two: bucket n holds
+    values from 2^(n-1) up to (but not including) 2^n, with bucket 0 holding
+    zero. Values are integers, e.g. nanoseconds or bytes.
+
+    Values are recorded in a current window; once it holds window_size
+    values it replaces the previous window, which is forgotten. Statistics
+    cover both windows, so they always reflect at least the last window_size
+    values. Totals since the histogram was created are also kept.
+  """
+
+  def __init__(self, window_size=10000):
+
+    self.window_size = window_size
+    self.buckets = [0] * HISTOGRAM_BUCKETS
+    self.previous_buckets = [0] * HISTOGRAM_BUCKETS
+    self.window_count = 0
+
+    self.count = 0
+    self.total = 0
+    self.maximum = 0
+
+  def record(self, value):
+    """Add a value to the histogram."""
+
+    self.buckets[value.bit_length()] += 1
+    self.window_count += 1
+    self.count += 1
+    self.total += value
+    if value > self.maximum:
+      self.maximum = value
+
+    if self.window_count >= self.window_size:
+      self.previous_buckets = self.buckets
+      self.buckets = [0] * HISTOGRAM_BUCKETS
+      self.window_count = 0
+
+  def percentile(self, percent):
+    """
+      Returns an upper bound on the given percentile of recent values: the
+      top of the bucket the percentile falls in.
+    """
+
+    recent_buckets = [current + previous
+      for current, previous in zip(self.buckets, self.previous_buckets)]
+    remaining = sum(recent_buckets) * percent / 100
+    for bucket, bucket_count in enumerate(recent_buckets):
+      remaining -= bucket_count
+      if remaining <= 0 and bucket_count:
+        return (1 << bucket) - 1
+    return 0
+
+  def summary(self):
+    """Returns a dictionary of the histogram's statistics."""
+
+    return {
+      "count": self.count,
+      "total": self.total,
+      "mean": self.total / self.count if self.count else 0,
+      "p50": self.percentile(50),
+      "p90": self.percentile(90),
+      "p99": self.percentile(99),
+      "max": self.maximum,
+    }
+
+class Instrumentation():
+  """
+    Records nothing. Base class for ways to record the phases and counters
+    of board updates.
+  """
+
+  def phase(self, name):
+    """
+      Returns a context manager to time a phase of an update with, e.g.
+
+        with board_state.instrumentation.phase("kernel"):
+          ...
+    """
+
+    return NULL_PHASE
+
+  def count(self, name, value):
+    """Add a value (e.g. bytes copied) to the named counter."""
+    pass
+
+  def summary(self):
+    """Returns a dictionary of statistics for each phase and counter."""
+
+    return {"phases": {}, "counters": {}}
+
+# Context manager for phases that aren't timed.
+NULL_PHASE = contextlib.nullcontext()
+
+# Default instrumentation for board states, which records nothing.
+NULL_INSTRUMENTATION = Instrumentation()
+
+class PhaseTimer():
+  """Context manager that times a phase for a Profiler."""
+
+  __slots__ = ("profiler", "name", "start_time")
+
+  def __init__(self, profiler, name):
+    self.profiler = profiler
+    self.name = name
+
+  def __enter__(self):
+    self.start_time = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, *exception_info):
+    self.profiler.record_phase(self.name, self.start_time, time.perf_counter_ns())
+
+class Profiler(Instrumentation):
+  """
+    Records the duration of each phase in nanoseconds, and each counter's
+    values, in rolling histograms by name.
+
+    If tracing, the start and duration of each phase, and counter values,
+    are also kept as events (up to max_trace_events of the latest ones) to be
+    written as a Chrome trace, viewable in chrome://tracing or Perfetto.
+  """
+
+  def __init__(self, window_size=10000, trace=False, max_trace_events=1000000):
+
+    self.window_size = window_size
+    self.phases = {}
+    self.counters = {}
+
+    self.trace = trace
+    self.trace_events = collections.deque(maxlen=max_trace_events)
+    self.start_time = time.perf_counter_ns()
+    self.lock = threading.Lock()
+
+  def phase(self, name):
+    return PhaseTimer(self, name)
+
+  def histogram(self, histograms, name):
+    """Returns the named histogram, creating it if needed."""
+
+    histogram = histograms.get(name)
+    if histogram is None:
+      histogram = histograms[name] = RollingHistogram(self.window_size)
+    return histogram
+
+  def record_phase(self, name, start_time, end_time):
+    """Record a phase that ran from the given start to end times (in nanoseconds)."""
+
+    with self.lock:
+      self.histogram(self.phases, name).record(end_time - start_time)
+      if self.trace:
+        self.trace_events.append({"name": name, "ph": "X",
+          "ts": (start_time - self.start_time) / 1000, "dur": (end_time - start_time) / 1000,
+          "pid": os.getpid(), "tid": threading.get_ident()})
+
+  def count(self, name, value):
+
+    with self.lock:
+      histogram = self.histogram(self.counters, name)
+      histogram.record(value)
+      if self.trace:
+        self.trace_events.append({"name": name, "ph": "C",
+          "ts": (time.perf_counter_ns() - self.start_time) / 1000,
+          "pid": os.getpid(), "args": {name: histogram.total}})
+
+  def summary(self):
+
+    with self.lock:
+      return {
+        "phases": {name: histogram.summary() for name, histogram in self.phases.items()},
+        "counters": {name: histogram.summary() for name, histogram in self.counters.items()},
+      }
+
+  def format_summary(self):
+    """Returns the summary as lines of text, with phase times in milliseconds."""
+
+    summary = self.summary()
+    lines = []
+    for name, phase in summary["phases"].items():
+      lines.append(name + ": " + str(phase["count"]) + " times, "
+        + str(round(phase["total"] / 1e6, 3)) + " ms total, "
+        + "mean " + str(round(phase["mean"] / 1e6, 3)) + " ms, "
+        + "p50 < " + str(round(phase["p50"] / 1e6, 3)) + " ms, "
+        + "p99 < " + str(round(phase["p99"] / 1e6, 3)) + " ms, "
+        + "max " + str(round(phase["max"] / 1e6, 3)) + " ms")
+    for name, counter in summary["counters"].items():
+      lines.append(name + ": " + str(counter["total"]) + " total over "
+        + str(counter["count"]) + " counts, max " + str(counter["max"]))
+    return "\n".join(lines)
+
+  def write_chrome_trace(self, path):
+    """Write the trace events to a Chrome trace (JSON) file."""
+
+    with self.lock:
+      trace_events = list(self.trace_events)
+
+    with open(path, "w") as file:
+      json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, file)
+
+
+class InstrumentationTests(unittest.TestCase):
+  """Tests for recording phases and counters."""
+
+  def test_histogram_percentiles_bound_recent_values(self):
+
+    histogram = RollingHistogram(window_size=4)
+    for value in [1000, 1000, 1000, 5]:
+      histogram.record(value)
+    for value in [5, 5, 5, 5]:
+      histogram.record(value)
+
+    # The window with the 1000s has been forgotten, but not from the totals.
+    self.assertEqual(histogram.percentile(99), 7)
+    self.assertEqual(histogram.summary()["max"], 1000)
+    self.assertEqual(histogram.summary()["total"], 3 * 1000 + 5 * 5)
+
+  def test_board_updates_are_profiled(self):
+
+    from board.boardstate import BoardState
+    from board.numpyboardstrategy import NumpyUpdateStrategy
+    import tempfile
+
+    board_state = BoardState(rows=10, cols=10)
+    board_state.instrumentation = Profiler(trace=True)
+    board_state.advance(NumpyUpdateStrategy(), 3)
+
+    summary = board_state.instrumentation.summary()
+    self.assertEqual(summary["phases"]["strategy"]["count"], 1)
+    self.assertEqual(summary["phases"]["swap"]["count"], 3)
+    self.assertEqual(summary["phases"]["notify"]["count"], 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "trace.json")
+      board_state.instrumentation.write_chrome_trace(path)
+      with open(path) as file:
+        self.assertEqual(len(json.load(file)["traceEvents"]), 5)
+
+  def test_uninstrumented_boards_record_nothing(self):
+
+    from board.boardstate import BoardState
+    from board.numpyboardstrategy import NumpyUpdateStrategy
+
+    board_state = BoardState(rows=10, cols=10)
+    board_state.update(NumpyUpdateStrategy())
+
+    self.assertIs(board_state.instrumentation, BoardState.instrumentation)
+    self.assertEqual(board_state.instrumentation.summary(), {"phases": {}, "counters": {}})
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,235 @@
+from numba import njit, prange
+from board.boardstate import BoardState
+from board.boardstate import UpdateStrategy
+from board.boardstate import BoardStateTests
+from board.ensemble import BoardEnsemble
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.pythonboardstrategy import StraightPythonUpdateStrategy
+from board.rules import CONWAY
+from board.rules import Rule
+from screen.gldrawstate import LIVE_CELL_INTENSITY
+import numba
+import numpy
+import unittest
+
+class NumbaParallelUpdateStrategy(UpdateStrategy):
+  """
+    Strategy to update the board state on all CPU cores, using Numba to
+    compile the same neighbor-counting kernel that CudaUpdateStrategy runs on
+    the GPU. Rows of the board are split across threads.
+  """
+
+  def __init__(self, opengl_draw_state=None, threads=None, rule=None):
+    self.opengl_draw_state = opengl_draw_state
+    self.rule = rule if rule else CONWAY
+
+    # Number of threads to update with, or None to use all cores.
+    if threads is not None and not 1 <= threads <= numba.config.NUMBA_NUM_THREADS:
+      raise Exception("Thread count must be between 1 and "
+        + str(numba.config.NUMBA_NUM_THREADS))
+    self.threads = threads
+
+    # Numba needs something passed in for the colors array even if we aren't
+    # using a display that has them.
+    self.empty_cell_color_array = numpy.zeros(0, dtype=numpy.uint8)
+
+  def update(self, board_state):
+    """Update the board state."""
+
+    self.advance_cells(board_state, 1)
+
+  def advance(self, board_state, updates):
+    """
+      Perform the given number of updates in a single compiled call, leaving
+      the result in the board state's cells.
+    """
+
+    self.advance_cells(board_state, updates)
+
+    # The update loop swaps its own references to the arrays, so after an odd
+    # number of updates the newest cells are in the new_cells array.
+    if updates % 2 == 1:
+      board_state.swap_cells()
+
+  def advance_cells(self, board_state, updates):
+    """Run the compiled update loop, which leaves the last update in new_cells."""
+
+    if self.opengl_draw_state:
+      self.opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
+      cell_colors = self.opengl_draw_state.get_cell_intensities()
+    else:
+      # Pass an empty array, which update_cells knows to ignore.
+      cell_colors = self.empty_cell_color_array
+
+    # The thread count is a per-thread setting in Numba, so apply it from
+    # whichever thread is doing the updating.
+    if self.threads is not None:
+      numba.set_num_threads(self.threads)
+
+    self.update_cells(board_state.new_cells, board_state.cells, cell_colors,
+      self.rule.transition_table, board_state.rows, board_state.cols, updates)
+
+  @staticmethod
+  @njit(parallel=True)
+  def update_cells(new_cells, cells, cell_colors, transition_table, num_rows, num_cols, updates):
+    """
+      Update the cells on the board the given number of times, one row per
+      parallel loop iteration, swapping the arrays between updates. Colors
+      are only set on the last update. The transition table is a rule's
+      Rule.transition_table.
+    """
+
+    # Each row also includes two border cells. Account for them
+    # when determining a given cell's index.
+    size_of_row = num_cols + 2
+
+    for update in range(updates):
+      if update > 0:
+        new_cells, cells = cells, new_cells
+
+      set_colors = len(cell_colors) > 0 and update == updates - 1
+
+      for row in prange(num_rows):
+        for col in range(num_cols):
+
+          # The board state is bordered by empty cells, so that we don't have
+          # to account for neighbor locations being out of bounds.
+          cell_array_index = (row + 1) * size_of_row + (col + 1)
+
+          # Count neighbors.
+          cell_neighbor_count  = cells[cell_array_index - size_of_row - 1]
+          cell_neighbor_count += cells[cell_array_index - size_of_row + 0]
+          cell_neighbor_count += cells[cell_array_index - size_of_row + 1]
+
+          cell_neighbor_count += cells[cell_array_index - 1]
+          cell_neighbor_count += cells[cell_array_index + 1]
+
+          cell_neighbor_count += cells[cell_array_index + size_of_row - 1]
+          cell_neighbor_count += cells[cell_array_index + size_of_row + 0]
+          cell_neighbor_count += cells[cell_array_index + size_of_row + 1]
+
+          # Set whether the cell is alive or dead based on
+          # neighbor count and current state.
+          new_cells[cell_array_index] = transition_table[
+            (cells[cell_array_index] << 4) | cell_neighbor_count]
+
+          if set_colors:
+            # Likewise set what color the cell should now be.
+            cell_colors[row * num_cols + col] = LIVE_CELL_INTENSITY * new_cells[cell_array_index]
+
+class NumbaEnsembleUpdateStrategy(UpdateStrategy):
+  """
+    Strategy to update every board of a BoardEnsemble on all CPU cores, with
+    the rows of all the boards split across threads. Several updates are run
+    in a single compiled call.
+  """
+
+  def __init__(self, rule=None):
+    self.rule = rule if rule else CONWAY
+
+  def update(self, ensemble):
+    """Update every board of the ensemble."""
+
+    self.update_boards(ensemble.new_cells, ensemble.cells, self.rule.transition_table, 1)
+
+  def advance(self, ensemble, updates):
+    """
+      Perform the given number of updates in a single compiled call, leaving
+      the result in the ensemble's cells.
+    """
+
+    self.update_boards(ensemble.new_cells, ensemble.cells, self.rule.transition_table, updates)
+
+    # As with NumbaParallelUpdateStrategy, after an odd number of updates the
+    # newest cells are in the new_cells array.
+    if updates % 2 == 1:
+      ensemble.swap_cells()
+
+  @staticmethod
+  @njit(parallel=True)
+  def update_boards(new_cells, cells, transition_table, updates):
+    """
+      Update the cells of every board the given number of times, one row of
+      one board per parallel loop iteration, swapping the arrays between
+      updates. Arrays are the (boards, rows+2, cols+2) arrays of an ensemble.
+    """
+
+    num_boards, bordered_rows, bordered_cols = cells.shape
+    num_rows = bordered_rows - 2
+
+    for update in range(updates):
+      if update > 0:
+        new_cells, cells = cells, new_cells
+
+      for board_row in prange(num_boards * num_rows):
+        board = board_row // num_rows
+        row = board_row % num_rows + 1
+
+        for col in range(1, bordered_cols - 1):
+          cell_neighbor_count  = cells[board, row - 1, col - 1]
+          cell_neighbor_count += cells[board, row - 1, col]
+          cell_neighbor_count += cells[board, row - 1, col + 1]
+
+          cell_neighbor_count += cells[board, row, col - 1]
+          cell_neighbor_count += cells[board, row, col + 1]
+
+          cell_neighbor_count += cells[board, row + 1, col - 1]
+          cell_neighbor_count += cells[board, row + 1, col]
+          cell_neighbor_count += cells[board, row + 1, col + 1]
+
+          new_cells[board, row, col] = transition_table[
+            (cells[board, row, col] << 4) | cell_neighbor_count]
+
+class NumbaParallelStrategyUpdateTests(BoardStateTests, unittest.TestCase):
+  """Run BoardStateTests for the Numba parallel update strategy."""
+
+  def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
+    self.opengl_draw_state = OpenGLDrawState()
+    self.strategy=NumbaParallelUpdateStrategy(opengl_draw_state=self.opengl_draw_state)
+
+  def test_update_matches_straight_python_strategy(self):
+
+    board_state = BoardState(rows=23, cols=17)
+    board_state.randomize_state()
+    expected_board_state = BoardState.from_string(board_state.to_string())
+
+    for generation in range(0, 5):
+      board_state.update(strategy=NumbaParallelUpdateStrategy(
+        threads=numba.config.NUMBA_NUM_THREADS))
+      expected_board_state.update(strategy=StraightPythonUpdateStrategy())
+
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_update_matches_straight_python_strategy_for_other_rules(self):
+
+    for rule in (Rule("B36/S23"), Rule("B3678/S34678")):
+      board_state = BoardState(rows=23, cols=17)
+      board_state.randomize_state(seed=6)
+      expected_board_state = BoardState.from_string(board_state.to_string())
+
+      board_state.advance(NumbaParallelUpdateStrategy(rule=rule), 5)
+      for generation in range(0, 5):
+        expected_board_state.update(strategy=StraightPythonUpdateStrategy(rule=rule))
+
+      self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_ensemble_update_matches_numpy_strategy(self):
+
+    ensemble = BoardEnsemble(count=6, rows=13, cols=11)
+    ensemble.randomize_state(densities=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6], seeds=range(0, 6))
+    board_states = [BoardState.from_string(ensemble.board(index).to_string())
+      for index in range(0, 6)]
+
+    strategy = NumbaEnsembleUpdateStrategy(rule=Rule("B36/S23"))
+    ensemble.update(strategy)
+    ensemble.advance(strategy, 4)
+    for board_state in board_states:
+      board_state.advance(NumpyUpdateStrategy(rule=Rule("B36/S23")), 5)
+
+    for index, board_state in enumerate(board_states):
+      self.assertEqual(ensemble.board(index).to_string(), board_state.to_string())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,131 @@
+from board.boardstate import BoardState
+from board.boardstate import UpdateStrategy
+from board.boardstate import BoardStateTests
+from board.pythonboardstrategy import StraightPythonUpdateStrategy
+from board.rules import CONWAY
+from board.rules import Rule
+import numpy
+import unittest
+
+class NumpyUpdateStrategy(UpdateStrategy):
+  """
+    Strategy to update the board state using vectorized numpy operations.
+
+    Rather than visiting each cell in turn, neighbor counts for the whole board
+    are computed by adding together eight shifted slices of the (bordered) cell
+    array, so the per-cell work happens inside numpy rather than the Python
+    interpreter.
+  """
+
+  def __init__(self, opengl_draw_state=None, rule=None):
+
+    self.opengl_draw_state = opengl_draw_state
+    self.rule = rule if rule else CONWAY
+
+    # Scratch array for neighbor counts, reallocated if the board size changes.
+    self.neighbor_counts = numpy.zeros((0, 0), dtype=numpy.uint8)
+
+  def update(self, board_state):
+    """Update the board state."""
+
+    if self.opengl_draw_state:
+      self.opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
+
+    self.update_cells(board_state.new_cells, board_state.cells, board_state.rows,
+      board_state.cols)
+
+  def update_cells(self, new_cells, cells, num_rows, num_cols):
+    """Update the cells on the board."""
+
+    # View the one-dimensional arrays as the two-dimensional board they
+    # represent, including the border of empty cells.
+    cells = cells.reshape(num_rows + 2, num_cols + 2)
+    new_cells = new_cells.reshape(num_rows + 2, num_cols + 2)
+
+    self.update_region(new_cells, cells, 1, num_rows + 1, 1, num_cols + 1)
+
+    if self.opengl_draw_state:
+      self.update_colors(new_cells, 1, num_rows + 1, 1, num_cols + 1)
+
+  def update_region(self, new_cells, cells, start_row, end_row, start_col, end_col):
+    """
+      Update a rectangle of cells, given as row and column ranges of the
+      two-dimensional bordered arrays.
+    """
+
+    num_rows = end_row - start_row
+    num_cols = end_col - start_col
+
+    if (self.neighbor_counts.shape[0] < num_rows
+        or self.neighbor_counts.shape[1] < num_cols):
+      self.neighbor_counts = numpy.zeros(cells.shape, dtype=numpy.uint8)
+
+    # Count neighbors. Each slice is the region shifted by one cell in one of
+    # the eight directions; the border means no bounds checks are needed.
+    above = cells[start_row-1:end_row-1]
+    row = cells[start_row:end_row]
+    below = cells[start_row+1:end_row+1]
+
+    counts = self.neighbor_counts[:num_rows, :num_cols]
+    numpy.add(above[:, start_col-1:end_col-1], above[:, start_col:end_col], out=counts)
+    counts += above[:, start_col+1:end_col+1]
+    counts += row[:, start_col-1:end_col-1]
+    counts += row[:, start_col+1:end_col+1]
+    counts += below[:, start_col-1:end_col-1]
+    counts += below[:, start_col:end_col]
+    counts += below[:, start_col+1:end_col+1]
+
+    # Set whether each cell is alive or dead by looking up its current state
+    # and neighbor count in the rule's table. The region is used as scratch
+    # space for the states, since it is about to be overwritten anyway.
+    region = new_cells[start_row:end_row, start_col:end_col]
+    numpy.left_shift(row[:, start_col:end_col], 4, out=region)
+    counts |= region
+    numpy.take(self.rule.transition_table, counts, out=region)
+
+  def update_colors(self, new_cells, start_row, end_row, start_col, end_col):
+    """
+      Set what color each cell in a rectangle of the board should now be,
+      given as row and column ranges of the two-dimensional bordered array.
+    """
+
+    self.opengl_draw_state.refresh_cell_colors(
+      new_cells[start_row:end_row, start_col:end_col], start_row - 1, start_col - 1)
+
+
+class NumpyStrategyUpdateTests(BoardStateTests, unittest.TestCase):
+  """Run BoardStateTests for the numpy update strategy."""
+
+  def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
+    self.opengl_draw_state = OpenGLDrawState()
+    self.strategy=NumpyUpdateStrategy(opengl_draw_state=self.opengl_draw_state)
+
+  def test_update_matches_straight_python_strategy(self):
+
+    board_state = BoardState(rows=23, cols=17)
+    board_state.randomize_state()
+    expected_board_state = BoardState.from_string(board_state.to_string())
+
+    for generation in range(0, 5):
+      board_state.update(strategy=self.strategy)
+      expected_board_state.update(strategy=StraightPythonUpdateStrategy())
+
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_update_matches_straight_python_strategy_for_other_rules(self):
+
+    for rule in (Rule("B36/S23"), Rule("B3678/S34678"), Rule("B1/S")):
+      board_state = BoardState(rows=23, cols=17)
+      board_state.randomize_state(seed=6)
+      expected_board_state = BoardState.from_string(board_state.to_string())
+
+      for generation in range(0, 5):
+        board_state.update(strategy=NumpyUpdateStrategy(rule=rule))
+        expected_board_state.update(strategy=StraightPythonUpdateStrategy(rule=rule))
+
+      self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+if __name__ == '__main__':
+  unittest.main()
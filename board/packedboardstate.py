@@ -0,0 +1,99 @@
+from board.boardstate import BoardState
+import numpy
+
+# Number of cells stored in each word of a packed row.
+CELLS_PER_WORD = 64
+
+class PackedBoardState(BoardState):
+  """
+    Stores the state of the cells with one bit per cell, 64 cells to a
+    64-bit word, instead of one byte per cell.
+
+    Cells are held in two-dimensional (rows+2, words+2) arrays of uint64,
+    where cell (row, col) is bit col % 64 of word col // 64 in its row. As
+    with BoardState, a border of empty rows and words surrounds the board so
+    that neighbors never need to be bounds-checked. Bits past the last column
+    in a row's final word are always kept clear.
+
+    Use with PackedUpdateStrategy, which updates 64 cells at a time.
+  """
+
+  def __init__(self, rows, cols):
+
+    self.words_per_row = (cols + CELLS_PER_WORD - 1) // CELLS_PER_WORD
+    super().__init__(rows, cols)
+
+  def allocate_cells(self):
+    """Allocate empty arrays of cell words for the board's dimensions."""
+
+    self.cells = numpy.zeros((self.rows+2, self.words_per_row+2), dtype=numpy.uint64)
+    self.new_cells = numpy.zeros((self.rows+2, self.words_per_row+2), dtype=numpy.uint64)
+
+  def last_word_mask(self):
+    """Returns a mask of the bits in a row's final word that hold cells."""
+
+    used_bits = self.cols - (self.words_per_row - 1) * CELLS_PER_WORD
+    return numpy.uint64((1 << used_bits) - 1)
+
+  def as_2d_view(self):
+    """Packed cells can't be viewed as one byte per cell; use read_rows instead."""
+
+    raise Exception("Packed boards have no one byte per cell view; use read_rows or load_rows")
+
+  def read_rows(self, start_row=0, end_row=None):
+    """
+      Returns the given rows of the board as a two-dimensional array with
+      one uint8 (0 or 1) per cell, unpacked from the cell words.
+    """
+
+    start_row, end_row, _ = slice(start_row, end_row).indices(self.rows)
+    return unpack_rows(self.cells[start_row+1:end_row+1, 1:-1], self.cols)
+
+  def load_rows(self, cells, start_row=0):
+    """
+      Set the state of whole rows of the board, starting at the given row,
+      from a two-dimensional array of cells (any non-zero value is alive).
+    """
+
+    self.cells[start_row+1:start_row+1+len(cells), 1:-1] = pack_rows(
+      cells != 0, self.words_per_row)
+
+  def cell_state(self, row, col):
+    """ Returns True if the cell at the given location is alive, False otherwise."""
+
+    word = self.cells[row+1, col // CELLS_PER_WORD + 1]
+    return bool((word >> numpy.uint64(col % CELLS_PER_WORD)) & numpy.uint64(1))
+
+  def set_cell(self, row, col):
+    """Set a cell as alive."""
+
+    self.cells[row+1, col // CELLS_PER_WORD + 1] |= (
+      numpy.uint64(1) << numpy.uint64(col % CELLS_PER_WORD))
+
+  def clear_cell(self, row, col):
+    """Set a cell as dead."""
+
+    self.cells[row+1, col // CELLS_PER_WORD + 1] &= ~(
+      numpy.uint64(1) << numpy.uint64(col % CELLS_PER_WORD))
+
+def unpack_rows(words, cols):
+  """
+    Expand rows of packed words (without their border words) into an array
+    with one uint8 (0 or 1) per cell, trimmed to the given number of columns.
+  """
+
+  # Words are stored little-endian, so their bytes are in column order and
+  # the least significant bit of each byte is its lowest column.
+  word_bytes = numpy.ascontiguousarray(words, dtype='<u8').view(numpy.uint8)
+  return numpy.unpackbits(word_bytes, axis=1, count=cols, bitorder='little')
+
+def pack_rows(cells, words_per_row):
+  """
+    Pack rows of cells (one bool or 0/1 value per cell) into rows of words,
+    as stored by PackedBoardState without its border words.
+  """
+
+  padded_cells = numpy.zeros((len(cells), words_per_row * CELLS_PER_WORD), dtype=numpy.uint8)
+  padded_cells[:, :cells.shape[1]] = cells
+  word_bytes = numpy.packbits(padded_cells, axis=1, bitorder='little')
+  return word_bytes.view('<u8').astype(numpy.uint64, copy=False)
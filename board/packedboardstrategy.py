@@ -0,0 +1,219 @@
+from board.boardstate import BoardState
+from board.boardstate import UpdateStrategy
+from board.boardstate import BoardStateTests
+from board.packedboardstate import PackedBoardState
+from board.packedboardstate import unpack_rows
+from board.pythonboardstrategy import StraightPythonUpdateStrategy
+from board.rules import CONWAY
+from board.rules import Rule
+import numpy
+import unittest
+
+ONE = numpy.uint64(1)
+HIGH_BIT = numpy.uint64(63)
+
+class PackedUpdateStrategy(UpdateStrategy):
+  """
+    Strategy to update a PackedBoardState, 64 cells at a time.
+
+    Each neighbor direction is formed as a whole word of bits by shifting the
+    packed rows (carrying bits in from adjacent words), and the eight neighbor
+    words are summed with bitwise adders, so every bit position gets its own
+    neighbor count without ever unpacking the cells.
+
+    The rule is applied as a bitwise expression of the count bits, built
+    from the rule's table. Counts are taken in pairs that differ only in
+    their lowest bit (0 and 1, 2 and 3, ...): for each pair the rule needs,
+    the higher count bits select the pair, and the lowest count bit and the
+    cell's own state select the new state, as a function of those two bits
+    taken from the table. For Conway's rule, this is the single pair 2 and
+    3, with the cell alive next if the count is odd or it is already alive.
+  """
+
+  def __init__(self, opengl_draw_state=None, rows_per_band=256, rule=None):
+    self.opengl_draw_state = opengl_draw_state
+    self.rule = rule if rule else CONWAY
+
+    # Rows are updated in bands to keep the temporary arrays small, no matter
+    # how large the board is.
+    self.rows_per_band = rows_per_band
+
+    # For each pair of counts whose cells can be alive next: the pair's count
+    # divided by two, and the next states of dead and live cells as functions
+    # of the lowest count bit (see low_bit_function).
+    self.count_pairs = []
+    for pair in range(0, 5):
+      dead_function = low_bit_function(self.rule.transition_table[2 * pair:2 * pair + 2])
+      live_function = low_bit_function(self.rule.transition_table[16 | 2 * pair:16 | 2 * pair + 2])
+      if dead_function != "0" or live_function != "0":
+        self.count_pairs.append((pair, dead_function, live_function))
+
+    # Three count bits can't tell a count of eight from zero, so only count
+    # in four bits if the rule needs to.
+    self.count_bits = 4 if any(pair in (0, 4) for pair, _, _ in self.count_pairs) else 3
+
+  def update(self, board_state):
+    """Update the board state."""
+
+    if self.opengl_draw_state:
+      self.opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
+
+    for start_row in range(1, board_state.rows + 1, self.rows_per_band):
+      end_row = min(start_row + self.rows_per_band, board_state.rows + 1)
+
+      self.update_rows(board_state.new_cells, board_state.cells, start_row, end_row)
+
+      # Keep the unused bits past the last column clear.
+      board_state.new_cells[start_row:end_row, -2] &= board_state.last_word_mask()
+
+      if self.opengl_draw_state:
+        self.update_colors(board_state, start_row, end_row)
+
+  def update_rows(self, new_cells, cells, start_row, end_row):
+    """Update the given range of rows (as indexes into the bordered arrays)."""
+
+    above = cells[start_row-1:end_row-1]
+    row = cells[start_row:end_row]
+    below = cells[start_row+1:end_row+1]
+
+    # Add the eight neighbor bits at each position into a three- or four-bit
+    # count. Without the fourth bit, a count of eight wraps around to zero.
+    count_bit0 = numpy.zeros_like(row[:, 1:-1])
+    count_bit1 = numpy.zeros_like(count_bit0)
+    count_bit2 = numpy.zeros_like(count_bit0)
+    count_bit3 = numpy.zeros_like(count_bit0) if self.count_bits == 4 else None
+
+    words, west, east = self.shifted_rows(row)
+
+    for neighbors in (*self.shifted_rows(above), west, east, *self.shifted_rows(below)):
+      carry_bit0 = count_bit0 & neighbors
+      count_bit0 ^= neighbors
+      carry_bit1 = count_bit1 & carry_bit0
+      count_bit1 ^= carry_bit0
+      if count_bit3 is not None:
+        count_bit3 |= count_bit2 & carry_bit1
+      count_bit2 ^= carry_bit1
+
+    high_count_bits = (count_bit1, count_bit2, count_bit3)[:self.count_bits - 1]
+
+    result = numpy.zeros_like(count_bit0)
+    for pair, dead_function, live_function in self.count_pairs:
+      # Select the positions whose count is in this pair.
+      in_pair = cell_function(dead_function, live_function, words, count_bit0)
+      for bit, count_bit in enumerate(high_count_bits):
+        # (The cell function may return the count bit itself, so don't
+        # change it in place.)
+        in_pair = in_pair & (count_bit if (pair >> bit) & 1 else ~count_bit)
+
+      result |= in_pair
+
+    new_cells[start_row:end_row, 1:-1] = result
+
+  def shifted_rows(self, rows):
+    """
+      Returns the words of the given bordered rows as-is, shifted so that each
+      bit holds its western neighbor, and shifted to hold its eastern neighbor.
+    """
+
+    words = rows[:, 1:-1]
+    west = (words << ONE) | (rows[:, :-2] >> HIGH_BIT)
+    east = (words >> ONE) | (rows[:, 2:] << HIGH_BIT)
+    return words, west, east
+
+  def update_colors(self, board_state, start_row, end_row):
+    """Set the color of each cell in the given range of rows."""
+
+    self.opengl_draw_state.refresh_cell_colors(
+      unpack_rows(board_state.new_cells[start_row:end_row, 1:-1], board_state.cols),
+      start_row - 1)
+
+def low_bit_function(next_states):
+  """
+    Returns the next state of a cell, for the two counts of a pair given
+    their next states, as a function of the lowest count bit: "0", "1",
+    "bit" (alive on the odd count) or "~bit" (alive on the even count).
+  """
+
+  return {(0, 0): "0", (1, 1): "1", (0, 1): "bit", (1, 0): "~bit"}[tuple(next_states.tolist())]
+
+def cell_function(dead_function, live_function, words, count_bit0):
+  """
+    Returns the words of next cell states, given the functions of the lowest
+    count bit (see low_bit_function) for dead and for live cells.
+  """
+
+  def value(function):
+    return {"0": numpy.zeros_like(words), "1": ~numpy.zeros_like(words),
+      "bit": count_bit0, "~bit": ~count_bit0}[function]
+
+  if dead_function == live_function:
+    return value(dead_function)
+  if live_function == "1":
+    # Alive if already alive, or if a dead cell would be born.
+    return words | value(dead_function)
+  if live_function == "0":
+    return ~words & value(dead_function)
+  if dead_function == "1":
+    return ~words | value(live_function)
+  if dead_function == "0":
+    return words & value(live_function)
+
+  # One function is the lowest bit and the other its inverse.
+  if dead_function == "bit":
+    return words ^ count_bit0
+  return ~(words ^ count_bit0)
+
+
+class PackedStrategyUpdateTests(BoardStateTests, unittest.TestCase):
+  """Run BoardStateTests for the packed update strategy."""
+
+  board_state_class = PackedBoardState
+
+  def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
+    self.opengl_draw_state = OpenGLDrawState()
+    self.strategy=PackedUpdateStrategy(opengl_draw_state=self.opengl_draw_state)
+
+  def test_update_matches_straight_python_strategy(self):
+
+    # Use a width that spans several words, with a partly used final word,
+    # and bands that don't divide the rows evenly.
+    board_state = BoardState(rows=23, cols=150)
+    board_state.randomize_state()
+    packed_board_state = PackedBoardState.from_string(board_state.to_string())
+    strategy = PackedUpdateStrategy(rows_per_band=5)
+
+    for generation in range(0, 5):
+      board_state.update(strategy=StraightPythonUpdateStrategy())
+      packed_board_state.update(strategy=strategy)
+
+    self.assertEqual(packed_board_state.to_string(), board_state.to_string())
+
+  def test_update_matches_straight_python_strategy_for_other_rules(self):
+
+    # Include rules that need counts of zero and eight told apart.
+    for rule in (Rule("B36/S23"), Rule("B3678/S34678"), Rule("B1/S0"), Rule("B2/S8"),
+        Rule("B12345678/S1357")):
+      board_state = BoardState(rows=23, cols=150)
+      board_state.randomize_state(seed=6, density=0.7)
+      packed_board_state = PackedBoardState.from_string(board_state.to_string())
+      strategy = PackedUpdateStrategy(rows_per_band=5, rule=rule)
+
+      for generation in range(0, 5):
+        board_state.update(strategy=StraightPythonUpdateStrategy(rule=rule))
+        packed_board_state.update(strategy=strategy)
+
+      self.assertEqual(packed_board_state.to_string(), board_state.to_string())
+
+  def test_cells_are_only_read_and_loaded_by_rows(self):
+
+    board_state = PackedBoardState(rows=3, cols=70)
+    board_state.load_rows(numpy.array([[0, 1] * 35]), start_row=1)
+
+    self.assertEqual(board_state.read_rows()[1].tolist(), [0, 1] * 35)
+    with self.assertRaises(Exception):
+      board_state.as_2d_view()
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,374 @@
+from board.boardstate import BoardState
+import io
+import numpy
+import os
+import re
+import tempfile
+import unittest
+
+# Reading and writing of the pattern file formats used by other Life
+# programs (such as Golly):
+#
+# - RLE (.rle): a header line "x = <cols>, y = <rows>, rule = <rule>" followed
+#   by runs of cells, e.g. "3o2b$bo!", where 'b' is a dead cell, 'o' a live
+#   one, '$' the end of a row and '!' the end of the pattern.
+# - Plaintext (.cells): one line per row, '.' for a dead cell and 'O' for a
+#   live one. Lines starting with '!' are comments.
+
+# Size of the chunks RLE files are read in.
+READ_CHUNK_SIZE = 1 << 16
+
+# A run of cells (or rows) in RLE data: an optional count, then a tag.
+RLE_TOKEN = re.compile(r"(\d*)(\D)")
+
+# Longest line written to RLE files, as recommended by the format.
+MAX_RLE_LINE_LENGTH = 70
+
+def read_rle_header(file):
+  """
+    Read up to and including the header line of an RLE file, returning the
+    number of rows and columns it gives, and its rule (None if it gives none).
+  """
+
+  for line in iter(file.readline, ""):
+    line = line.strip()
+    if not line or line.startswith("#"):
+      continue
+
+    fields = {}
+    for field in line.split(","):
+      name, _, value = field.partition("=")
+      fields[name.strip()] = value.strip()
+
+    if "x" not in fields or "y" not in fields:
+      raise Exception("Missing RLE header")
+    return int(fields["y"]), int(fields["x"]), fields.get("rule") or None
+
+  raise Exception("Missing RLE header")
+
+def read_rle(file, board_state=None, row=0, col=0, board_state_class=BoardState):
+  """
+    Read an RLE pattern from a text file object, with its top-left corner
+    at the given location of the given board state. If no board state is
+    given, one just big enough for the pattern is created. Returns the board
+    state.
+
+    The pattern is decoded a row at a time, straight from the file, so the
+    whole pattern never has to be held in memory. Cells the pattern covers
+    (according to its header) are replaced with the pattern's cells.
+  """
+
+  rows, cols, _ = read_rle_header(file)
+  if board_state is None:
+    board_state = board_state_class(rows, cols)
+
+  if row + rows > board_state.rows or col + cols > board_state.cols:
+    raise Exception("Pattern does not fit on the board")
+
+  pattern_row = 0
+  pattern_col = 0
+  row_cells = numpy.zeros(board_state.cols, dtype=numpy.uint8)
+
+  def store_rows(count):
+    # Store the decoded row, followed by empty rows to make up the count.
+    # Keep the rest of each board row, but take the pattern's cells from what
+    # was decoded.
+    nonlocal pattern_row
+    for _ in range(0, min(count, rows - pattern_row)):
+      board_row = numpy.array(board_state.read_rows(row + pattern_row, row + pattern_row + 1))
+      board_row[0, col:col + cols] = row_cells[:cols]
+      board_state.load_rows(board_row, row + pattern_row)
+      row_cells[:] = 0
+      pattern_row += 1
+
+  # Digits at the end of one chunk are the start of a count in the next.
+  unfinished_count = ""
+
+  while True:
+    chunk = file.read(READ_CHUNK_SIZE)
+    if not chunk:
+      raise Exception("RLE pattern is missing its final '!'")
+
+    chunk = unfinished_count + "".join(chunk.split())
+    unfinished_chunk = chunk.rstrip("0123456789")
+    unfinished_count = chunk[len(unfinished_chunk):]
+
+    for run_count, character in RLE_TOKEN.findall(unfinished_chunk):
+      run_length = int(run_count) if run_count else 1
+
+      if character == "$":
+        # A count before a '$' ends that many rows, the rest of them empty.
+        store_rows(run_length)
+        pattern_col = 0
+
+      elif character == "!":
+        store_rows(rows - pattern_row)
+        return board_state
+
+      elif character == "b":
+        pattern_col += run_length
+
+      else:
+        # 'o', or any other state of a multi-state pattern, is a live cell.
+        if pattern_row >= rows or pattern_col + run_length > cols:
+          raise Exception("RLE pattern is bigger than its header says")
+        row_cells[pattern_col:pattern_col + run_length] = 1
+        pattern_col += run_length
+
+def write_rle(board_state, file, rule="B3/S23", rows_per_band=1024):
+  """
+    Write a board state to a text file object as an RLE pattern. Rows are
+    encoded straight from the cells, a band of rows at a time, so the whole
+    pattern never has to be held in memory.
+  """
+
+  file.write("x = " + str(board_state.cols) + ", y = " + str(board_state.rows)
+    + ", rule = " + rule + "\n")
+
+  line = ""
+  pending_row_ends = 0
+
+  def write_token(token):
+    nonlocal line
+    if len(line) + len(token) > MAX_RLE_LINE_LENGTH:
+      file.write(line + "\n")
+      line = ""
+    line += token
+
+  def run_token(run_length, character):
+    return (str(run_length) if run_length > 1 else "") + character
+
+  for start_row in range(0, board_state.rows, rows_per_band):
+    for row_cells in board_state.read_rows(start_row, start_row + rows_per_band):
+
+      # Rows of a board with no columns have no runs at all.
+      if not len(row_cells):
+        pending_row_ends += 1
+        continue
+
+      # Find where each run of equal cells starts and ends.
+      run_starts = numpy.flatnonzero(row_cells[1:] != row_cells[:-1]) + 1
+      run_starts = numpy.concatenate(([0], run_starts))
+      run_ends = numpy.concatenate((run_starts[1:], [len(row_cells)]))
+
+      # A row's trailing dead cells are left out.
+      if not row_cells[run_starts[-1]]:
+        run_starts = run_starts[:-1]
+        run_ends = run_ends[:-1]
+
+      if len(run_starts):
+        # Empty rows are written as a count on the next '$'.
+        if pending_row_ends:
+          write_token(run_token(pending_row_ends, "$"))
+          pending_row_ends = 0
+
+        for run_start, run_end in zip(run_starts.tolist(), run_ends.tolist()):
+          write_token(run_token(run_end - run_start, "o" if row_cells[run_start] else "b"))
+
+      pending_row_ends += 1
+
+  write_token("!")
+  file.write(line + "\n")
+
+def read_plaintext_lines(file):
+  """Returns the rows of a plaintext pattern, without comments."""
+
+  return [line.rstrip("\r\n") for line in file if not line.startswith("!")]
+
+def read_plaintext(file, board_state=None, row=0, col=0, board_state_class=BoardState):
+  """
+    Read a plaintext (.cells) pattern from a text file object, with its
+    top-left corner at the given location of the given board state. If no
+    board state is given, one just big enough for the pattern is created.
+    Returns the board state.
+  """
+
+  lines = read_plaintext_lines(file)
+  rows = len(lines)
+  cols = max((len(line) for line in lines), default=0)
+
+  if board_state is None:
+    board_state = board_state_class(rows, cols)
+
+  if row + rows > board_state.rows or col + cols > board_state.cols:
+    raise Exception("Pattern does not fit on the board")
+
+  for pattern_row, line in enumerate(lines):
+    text = numpy.frombuffer(line.encode("ascii"), dtype=numpy.uint8)
+    board_row = numpy.array(board_state.read_rows(row + pattern_row, row + pattern_row + 1))
+    board_row[0, col:col + cols] = 0
+    board_row[0, col:col + len(text)] = (text == ord("O")) | (text == ord("*"))
+    board_state.load_rows(board_row, row + pattern_row)
+
+  return board_state
+
+def write_plaintext(board_state, file, rows_per_band=1024):
+  """Write a board state to a text file object as a plaintext pattern."""
+
+  cell_characters = numpy.array([ord("."), ord("O")], dtype=numpy.uint8)
+
+  for start_row in range(0, board_state.rows, rows_per_band):
+    for row_cells in board_state.read_rows(start_row, start_row + rows_per_band):
+      file.write(cell_characters[row_cells].tobytes().decode("ascii") + "\n")
+
+def is_plaintext_path(path):
+  """Returns True if a pattern path is for a plaintext file, rather than RLE."""
+
+  return path.lower().endswith(".cells")
+
+def read_pattern_header(path):
+  """
+    Returns the number of rows and columns of the pattern in a file, and the
+    rule it was recorded with (None if it has none, as plaintext files never
+    do).
+  """
+
+  with open(path) as file:
+    if is_plaintext_path(path):
+      lines = read_plaintext_lines(file)
+      return len(lines), max((len(line) for line in lines), default=0), None
+
+    return read_rle_header(file)
+
+def pattern_dimensions(path):
+  """Returns the number of rows and columns of the pattern in a file."""
+
+  rows, cols, _ = read_pattern_header(path)
+  return rows, cols
+
+def load_pattern(path, board_state=None, board_state_class=BoardState):
+  """
+    Load the pattern in an RLE or plaintext (.cells) file. If a board state
+    is given the pattern is placed at its center, otherwise a board state
+    just big enough for the pattern is created. Returns the board state and
+    the rule the pattern was recorded with, or None if it has none.
+  """
+
+  rows, cols, rule = read_pattern_header(path)
+
+  row = col = 0
+  if board_state is not None:
+    row = (board_state.rows - rows) // 2
+    col = (board_state.cols - cols) // 2
+
+  read = read_plaintext if is_plaintext_path(path) else read_rle
+  with open(path) as file:
+    return read(file, board_state, row, col, board_state_class), rule
+
+def save_pattern(board_state, path, rule="B3/S23"):
+  """
+    Save a board state as an RLE or plaintext (.cells) file. The rule is
+    only recorded in RLE files.
+  """
+
+  with open(path, "w") as file:
+    if is_plaintext_path(path):
+      write_plaintext(board_state, file)
+    else:
+      write_rle(board_state, file, rule)
+
+
+class PatternIOTests(unittest.TestCase):
+  """Tests for reading and writing pattern files."""
+
+  def test_read_rle(self):
+
+    board_state = read_rle(io.StringIO(
+      "#N Glider\n" +
+      "x = 3, y = 4, rule = B3/S23\n" +
+      "bo$2bo$3o2$!\n"))
+
+    self.assertEqual(board_state.to_string(),
+      "-X-\n" +
+      "--X\n" +
+      "XXX\n" +
+      "---")
+
+  def test_read_rle_into_board_keeps_other_cells(self):
+
+    board_state = BoardState.from_string(
+      "X----\n" +
+      "-----\n" +
+      "----X")
+    read_rle(io.StringIO("x = 2, y = 2\n2o$\nbo!"), board_state, row=1, col=2)
+
+    self.assertEqual(board_state.to_string(),
+      "X----\n" +
+      "--XX-\n" +
+      "---XX")
+
+  def test_read_rle_clears_cells_the_pattern_covers(self):
+
+    board_state = BoardState.from_string(
+      "XXX\n" +
+      "XXX\n" +
+      "XXX")
+    read_rle(io.StringIO("x = 2, y = 3\no2$!"), board_state)
+
+    self.assertEqual(board_state.to_string(),
+      "X-X\n" +
+      "--X\n" +
+      "--X")
+
+  def test_write_rle_round_trips(self):
+
+    board_state = BoardState(rows=30, cols=90)
+    board_state.randomize_state(seed=3)
+    board_state.as_2d_view()[10:14] = 0
+
+    rle_file = io.StringIO()
+    write_rle(board_state, rle_file, rows_per_band=7)
+
+    for line in rle_file.getvalue().splitlines():
+      self.assertLessEqual(len(line), MAX_RLE_LINE_LENGTH)
+
+    rle_file.seek(0)
+    self.assertEqual(read_rle(rle_file).to_string(), board_state.to_string())
+
+  def test_write_rle_of_board_without_columns(self):
+
+    rle_file = io.StringIO()
+    write_rle(BoardState(rows=3, cols=0), rle_file)
+
+    self.assertEqual(rle_file.getvalue(), "x = 0, y = 3, rule = B3/S23\n!\n")
+
+  def test_load_pattern_returns_rule(self):
+
+    with tempfile.TemporaryDirectory() as directory:
+      rle_path = os.path.join(directory, "replicator.rle")
+      with open(rle_path, "w") as file:
+        file.write("x = 3, y = 1, rule = B36/S23\n3o!\n")
+      plaintext_path = os.path.join(directory, "blinker.cells")
+      with open(plaintext_path, "w") as file:
+        file.write("OOO\n")
+
+      board_state, rule = load_pattern(rle_path, BoardState(rows=3, cols=5))
+      self.assertEqual(rule, "B36/S23")
+      self.assertEqual(board_state.to_string(),
+        "-----\n" +
+        "-XXX-\n" +
+        "-----")
+
+      self.assertEqual(load_pattern(plaintext_path)[1], None)
+
+  def test_plaintext_round_trips(self):
+
+    board_state = read_plaintext(io.StringIO(
+      "!Name: Glider\n" +
+      ".O\n" +
+      "..O\n" +
+      "OOO\n"))
+
+    self.assertEqual(board_state.to_string(),
+      "-X-\n" +
+      "--X\n" +
+      "XXX")
+
+    plaintext_file = io.StringIO()
+    write_plaintext(board_state, plaintext_file)
+    plaintext_file.seek(0)
+
+    self.assertEqual(read_plaintext(plaintext_file).to_string(), board_state.to_string())
+
+if __name__ == '__main__':
+  unittest.main()
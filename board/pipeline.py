@@ -0,0 +1,170 @@
+from board.boardstate import BoardObserver
+from board.boardstate import BoardState
+from board.numpyboardstrategy import NumpyUpdateStrategy
+import numpy
+import threading
+import time
+import unittest
+
+class TripleBuffer():
+  """
+    Passes the latest of a series of values from one thread to another,
+    without either thread waiting for the other or sharing a value that is
+    being changed.
+
+    Holds three buffers: one the writer is filling, one the reader is using,
+    and the latest one published by the writer. Publishing swaps the writer's
+    buffer with the latest one, and reading swaps the reader's buffer with the
+    latest one if anything new has been published since, so buffers the
+    reader never got to are simply overwritten.
+  """
+
+  def __init__(self, make_buffer):
+
+    self.write_buffer = make_buffer()
+    self.latest_buffer = make_buffer()
+    self.read_buffer = make_buffer()
+
+    self.lock = threading.Lock()
+    self.has_new_buffer = False
+    self.published_count = 0
+
+  def get_write_buffer(self):
+    """Returns the buffer the writer should fill before calling publish()."""
+
+    return self.write_buffer
+
+  def publish(self):
+    """Make the write buffer the latest one, and give the writer another."""
+
+    with self.lock:
+      self.write_buffer, self.latest_buffer = self.latest_buffer, self.write_buffer
+      self.has_new_buffer = True
+      self.published_count += 1
+
+  def read_latest(self):
+    """
+      Returns the reader's buffer, updated to the latest published one, and
+      whether anything was published since the last call.
+    """
+
+    with self.lock:
+      has_new_buffer = self.has_new_buffer
+      if has_new_buffer:
+        self.read_buffer, self.latest_buffer = self.latest_buffer, self.read_buffer
+        self.has_new_buffer = False
+
+    return self.read_buffer, has_new_buffer
+
+class FramePublisher(BoardObserver):
+  """
+    Observer that copies each generation it is notified of into a triple
+    buffer of board states, for another thread to display.
+
+    The frames are board states of the same class and dimensions as the
+    observed one, but have no observers, so any screen can be updated with
+    them.
+  """
+
+  def __init__(self, board_state):
+
+    board_state_class = type(board_state)
+    self.frames = TripleBuffer(
+      lambda: board_state_class(board_state.rows, board_state.cols))
+
+  def on_update(self, board_state):
+    """Publish a copy of the board state."""
+
+    frame = self.frames.get_write_buffer()
+    numpy.copyto(frame.cells, board_state.cells)
+    frame.generation = board_state.generation
+    self.frames.publish()
+
+  def read_latest(self):
+    """Returns the latest frame, and whether it is new since the last call."""
+
+    return self.frames.read_latest()
+
+class SimulationThread(threading.Thread):
+  """
+    Thread that keeps advancing a board state, so that it is not held up by
+    whatever displays it.
+
+    Any exception raised by the update strategy stops the thread, and is kept
+    in its error attribute.
+  """
+
+  def __init__(self, board_state, update_strategy, updates_per_step=1):
+    threading.Thread.__init__(self, daemon=True)
+
+    self.board_state = board_state
+    self.update_strategy = update_strategy
+    self.updates_per_step = updates_per_step
+
+    self.stopping = threading.Event()
+    self.error = None
+
+  def run(self):
+
+    try:
+      while not self.stopping.is_set():
+        self.board_state.advance(self.update_strategy, self.updates_per_step)
+    except Exception as error:
+      self.error = error
+
+  def stop(self):
+    """Stop advancing the board state, and wait for the thread to finish."""
+
+    self.stopping.set()
+    self.join()
+
+
+class PipelineTests(unittest.TestCase):
+  """Tests for passing frames between the simulation and display."""
+
+  def test_reader_gets_latest_published_buffer(self):
+
+    buffers = iter(range(0, 3))
+    triple_buffer = TripleBuffer(lambda: [next(buffers)])
+
+    self.assertEqual(triple_buffer.read_latest()[1], False)
+
+    triple_buffer.get_write_buffer()[0] = "first"
+    triple_buffer.publish()
+    triple_buffer.get_write_buffer()[0] = "second"
+    triple_buffer.publish()
+
+    self.assertEqual(triple_buffer.read_latest(), (["second"], True))
+    self.assertEqual(triple_buffer.read_latest(), (["second"], False))
+
+    # The writer never gets the reader's buffer.
+    for publish in range(0, 3):
+      self.assertIsNot(triple_buffer.get_write_buffer(), triple_buffer.read_latest()[0])
+      triple_buffer.publish()
+
+  def test_frames_are_copies_of_the_simulated_board(self):
+
+    board_state = BoardState(rows=20, cols=20)
+    board_state.randomize_state(seed=4)
+    publisher = FramePublisher(board_state)
+    board_state.add_observer(publisher)
+
+    simulation = SimulationThread(board_state, NumpyUpdateStrategy())
+    simulation.start()
+    while publisher.frames.published_count < 5:
+      time.sleep(0.001)
+    simulation.stop()
+
+    # Frames published after the read don't change it.
+    frame, is_new = publisher.read_latest()
+    frame_text = frame.to_string()
+    board_state.update(NumpyUpdateStrategy())
+
+    self.assertTrue(is_new)
+    self.assertIsNone(simulation.error)
+    self.assertEqual(frame.generation, board_state.generation - 1)
+    self.assertEqual(frame.to_string(), frame_text)
+    self.assertIsNot(frame.cells, board_state.cells)
+
+if __name__ == '__main__':
+  unittest.main()
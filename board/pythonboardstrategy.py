@@ -1,15 +1,17 @@
 from board.boardstate import BoardState
 from board.boardstate import UpdateStrategy
 from board.boardstate import BoardStateTests
-from screen.gldrawstate import OpenGLDrawState
+from board.rules import CONWAY
+from board.rules import Rule
 import unittest
 
 class StraightPythonUpdateStrategy(UpdateStrategy):
   """Strategy to update the board state using standard Python code."""
 
-  def __init__(self, opengl_draw_state=None):
+  def __init__(self, opengl_draw_state=None, rule=None):
 
     self.opengl_draw_state = opengl_draw_state
+    self.rule = rule if rule else CONWAY
 
   def update(self, board_state):
     """Update the board state."""
@@ -22,11 +24,9 @@ class StraightPythonUpdateStrategy(UpdateStrategy):
   def update_cells(self, new_cells, cells, num_rows, num_cols):
     """Update the cells on the board."""
 
-    # Keep any live cell with 2 or 3 neighbors.
-    keep_cell_on_neighbor_counts = (0, 0, 1, 1, 0, 0, 0, 0, 0)
-
-    # Add a ell on any space with three live neighbors.
-    add_cell_on_neighbor_counts =  (0, 0, 0, 1, 0, 0, 0, 0, 0)
+    # Next state of a cell, indexed by its current state and neighbor count
+    # (see Rule.transition_table).
+    transition_table = tuple(self.rule.transition_table.tolist())
 
     size_of_row = num_cols + 2
 
@@ -52,24 +52,38 @@ class StraightPythonUpdateStrategy(UpdateStrategy):
 
       # Set whether the cell is alive or dead based on
       # neighbor count and current state.
-      new_cells[cell_array_index] = cells[cell_array_index]
-      new_cells[cell_array_index] &= keep_cell_on_neighbor_counts[cell_neighbor_count]
-      new_cells[cell_array_index] |= add_cell_on_neighbor_counts[cell_neighbor_count]
+      new_cells[cell_array_index] = transition_table[
+        (cells[cell_array_index] << 4) | cell_neighbor_count]
 
-      if self.opengl_draw_state:
-        # Likewise set what color the cell should now be.
-        cell_color_index = 3 * 4 * x
-        for corner in range(0, 4):
-          self.opengl_draw_state.get_opengl_cell_vertex_colors()[
-            cell_color_index + corner * 3 + 2] = 127 * new_cells[cell_array_index]
+    if self.opengl_draw_state:
+      # Likewise set what color the cells should now be.
+      self.opengl_draw_state.refresh_cell_colors(
+        new_cells.reshape(num_rows + 2, num_cols + 2)[1:-1, 1:-1])
 
 
 class StraightPythonStrategyUpdateTests(BoardStateTests, unittest.TestCase):
   """Run BoardStateTests for the straight Python update strategy."""
 
   def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
     self.opengl_draw_state = OpenGLDrawState()
     self.strategy=StraightPythonUpdateStrategy(opengl_draw_state=self.opengl_draw_state)
 
+  def test_update_follows_rule(self):
+
+    # Under HighLife (B36/S23), a dead cell with six neighbors is born, and
+    # live cells with five die.
+    board_state = BoardState.from_string(
+      "XXX\n" +
+      "---\n" +
+      "XXX")
+    board_state.update(StraightPythonUpdateStrategy(rule=Rule("B36/S23")))
+
+    self.assertEqual(board_state.to_string(),
+      "-X-\n" +
+      "-X-\n" +
+      "-X-")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,285 @@
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import tempfile
+import time
+import unittest
+
+# The update strategies that can be chosen by name. Each strategy's module,
+# and the dependencies it needs (numba, CUDA), are only imported once it is
+# chosen or calibrated, so that listing strategies, or using one, doesn't
+# pay for the others, and strategies whose dependencies are missing are
+# reported as unavailable rather than failing to import.
+
+def cuda_is_available():
+  """Returns True if there is a CUDA device (or simulator) to run kernels on."""
+
+  from numba import cuda
+  return cuda.is_available()
+
+class StrategyBackend():
+  """
+    Describes an update strategy: where its class and the class of board
+    state it updates are found, the modules it requires, and which of the
+    options create() accepts it takes. The availability check, if given, is
+    for requirements beyond being able to import modules, e.g. a GPU.
+  """
+
+  def __init__(self, name, description, strategy_module, strategy_class,
+      board_state_module="board.boardstate", board_state_class="BoardState",
+      requirements=("numpy",), options=("opengl_draw_state", "rule"), availability_check=None):
+
+    self.name = name
+    self.description = description
+    self.strategy_module = strategy_module
+    self.strategy_class = strategy_class
+    self.board_state_module = board_state_module
+    self.board_state_class = board_state_class
+    self.requirements = requirements
+    self.options = options
+    self.availability_check = availability_check
+
+  def unavailable_reason(self):
+    """Returns why the strategy can't be used on this machine, or None if it can."""
+
+    missing = [module for module in self.requirements
+      if importlib.util.find_spec(module) is None]
+    if missing:
+      return "requires " + ", ".join(missing)
+
+    if self.availability_check is not None and not self.availability_check():
+      return "no device to run on"
+
+    return None
+
+  def is_available(self):
+    return self.unavailable_reason() is None
+
+  def load_board_state_class(self):
+    """Returns the class of board state the strategy updates."""
+
+    return getattr(importlib.import_module(self.board_state_module), self.board_state_class)
+
+  def create(self, **options):
+    """
+      Returns a new strategy, given whichever of the options it takes. Options
+      that are None are left to the strategy's defaults.
+    """
+
+    strategy_class = getattr(importlib.import_module(self.strategy_module), self.strategy_class)
+    return strategy_class(**{name: value for name, value in options.items()
+      if name in self.options and value is not None})
+
+STRATEGIES = {backend.name: backend for backend in [
+  StrategyBackend("numpy", "Vectorized numpy operations",
+    "board.numpyboardstrategy", "NumpyUpdateStrategy"),
+  StrategyBackend("numba", "Compiled with Numba, on all CPU cores",
+    "board.numbaboardstrategy", "NumbaParallelUpdateStrategy",
+    requirements=("numpy", "numba"), options=("opengl_draw_state", "rule", "threads")),
+  StrategyBackend("cuda", "On a GPU, with CUDA via Numba",
+    "board.cudaboardstrategy", "CudaUpdateStrategy",
+    requirements=("numpy", "numba"), availability_check=cuda_is_available),
+  StrategyBackend("cuda-resident", "On a GPU, with the cells kept there",
+    "board.cudaboardstrategy", "DeviceResidentCudaUpdateStrategy",
+    requirements=("numpy", "numba"), availability_check=cuda_is_available),
+  StrategyBackend("packed", "One bit per cell, 64 cells at a time",
+    "board.packedboardstrategy", "PackedUpdateStrategy",
+    board_state_module="board.packedboardstate", board_state_class="PackedBoardState"),
+  StrategyBackend("tiled", "Only tiles that are still changing",
+    "board.tiledboardstrategy", "ActiveTileUpdateStrategy",
+    options=("opengl_draw_state", "rule", "tile_size")),
+  StrategyBackend("hashlife", "HashLife, many generations per update",
+    "board.hashlife", "HashLifeUpdateStrategy",
+    options=("opengl_draw_state", "rule", "generations")),
+  StrategyBackend("shared-memory", "Bands of rows in worker processes",
+    "board.sharedmemoryboardstrategy", "SharedMemoryUpdateStrategy",
+    options=("opengl_draw_state", "rule", "workers")),
+  StrategyBackend("python", "Straight Python",
+    "board.pythonboardstrategy", "StraightPythonUpdateStrategy"),
+]}
+
+# Strategies only benchmarked, calibrated or chosen automatically when asked
+# for by name: those too slow to be worth it, and those that don't advance a
+# board as the others do. HashLife jumps many generations per update, skips
+# observer notifications in between, and can't report per-generation state,
+# so its rate isn't comparable and it can't stand in for the others.
+SLOW_STRATEGIES = {"python"}
+NAMED_ONLY_STRATEGIES = SLOW_STRATEGIES | {"hashlife"}
+
+def strategy_availability():
+  """Returns (name, description, reason unavailable or None) for each strategy."""
+
+  return [(backend.name, backend.description, backend.unavailable_reason())
+    for backend in STRATEGIES.values()]
+
+def create_strategy(name, **options):
+  """
+    Returns a new update strategy, given whichever of the options it takes,
+    and the class of board state it updates. Raises ImportError if the
+    strategy's dependencies are not installed or it has nothing to run on.
+  """
+
+  backend = STRATEGIES.get(name)
+  if backend is None:
+    raise Exception("Unrecognized strategy " + name)
+
+  reason = backend.unavailable_reason()
+  if reason is not None:
+    raise ImportError(name + " strategy is not available on this machine: " + reason)
+
+  return backend.create(**options), backend.load_board_state_class()
+
+def default_calibration_path():
+  """Returns the file calibration results are cached in."""
+
+  cache_directory = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+    os.path.expanduser("~"), ".cache")
+  return os.path.join(cache_directory, "conway", "calibration.json")
+
+def machine_key():
+  """Returns what identifies this machine and its software, for cached calibrations."""
+
+  import numpy
+  return "/".join([platform.node(), platform.machine(), platform.processor(),
+    str(os.cpu_count()), platform.python_version(), numpy.__version__])
+
+def measure_strategy(name, rows, cols, seconds, density=0.5, seed=0):
+  """
+    Returns how many generations per second the strategy advances a random
+    board of the given size, timing updates for about the given number of
+    seconds (and at least one) after a first, untimed one.
+  """
+
+  strategy, board_state_class = create_strategy(name)
+  try:
+    board_state = board_state_class(rows, cols)
+    board_state.randomize_state(density=density, seed=seed)
+
+    # The first update may compile kernels or start workers.
+    board_state.update(strategy)
+
+    updates = 0
+    start_time = time.perf_counter()
+    while True:
+      board_state.update(strategy)
+      updates += 1
+      elapsed_seconds = time.perf_counter() - start_time
+      if elapsed_seconds >= seconds:
+        break
+  finally:
+    if hasattr(strategy, "close"):
+      strategy.close()
+
+  return updates * strategy.generations_per_update / elapsed_seconds
+
+def calibration_candidates(names=None):
+  """
+    Returns the names of the available strategies among those given (by
+    default, all but those only used when named).
+  """
+
+  if names is None:
+    names = [name for name in STRATEGIES if name not in NAMED_ONLY_STRATEGIES]
+
+  return [name for name in names if STRATEGIES[name].is_available()]
+
+def calibrate(rows, cols, names=None, seconds_per_strategy=0.25):
+  """
+    Measure the generations per second of each available strategy among
+    those given (see calibration_candidates) on a board of the given size.
+    Returns a dictionary of the rates by strategy name.
+  """
+
+  return {name: measure_strategy(name, rows, cols, seconds_per_strategy)
+    for name in calibration_candidates(names)}
+
+def choose_strategy(rows, cols, names=None, calibration_path=None, recalibrate=False,
+    report=None):
+  """
+    Returns the name of the fastest available strategy, among those given,
+    for a board of the given size on this machine.
+
+    The rates measured by calibrate() are cached by machine and board size,
+    so later calls only calibrate again if asked to, or if the strategies
+    available have changed. The report function, if given, is passed a
+    message when calibration starts.
+  """
+
+  if calibration_path is None:
+    calibration_path = default_calibration_path()
+
+  try:
+    with open(calibration_path) as file:
+      calibrations = json.load(file)
+  except (OSError, ValueError):
+    calibrations = {}
+
+  key = machine_key() + "/" + str(rows) + "x" + str(cols)
+  rates = calibrations.get(key)
+  if recalibrate or not rates or set(rates) != set(calibration_candidates(names)):
+    if report:
+      report("Calibrating strategies for a " + str(rows) + "x" + str(cols) + " board")
+    rates = calibrations[key] = calibrate(rows, cols, names)
+
+    os.makedirs(os.path.dirname(os.path.abspath(calibration_path)), exist_ok=True)
+    with open(calibration_path, "w") as file:
+      json.dump(calibrations, file, indent=2)
+
+  return max(rates, key=rates.get)
+
+
+class RegistryTests(unittest.TestCase):
+  """Tests for finding, creating and choosing strategies."""
+
+  def test_strategies_are_created_with_their_options(self):
+
+    from board.packedboardstate import PackedBoardState
+    from board.rules import Rule
+
+    strategy, board_state_class = create_strategy("tiled", tile_size=8, workers=4,
+      rule=Rule("B36/S23"))
+    self.assertEqual(strategy.tile_size, 8)
+    self.assertEqual(strategy.rule, Rule("B36/S23"))
+
+    self.assertEqual(create_strategy("packed")[1], PackedBoardState)
+
+    with self.assertRaises(Exception):
+      create_strategy("abacus")
+
+  def test_missing_requirements_are_reported(self):
+
+    backend = StrategyBackend("missing", "Not installed", "board.missing", "MissingStrategy",
+      requirements=("numpy", "no_such_module_anywhere"))
+
+    self.assertEqual(backend.unavailable_reason(), "requires no_such_module_anywhere")
+    self.assertIsNone(STRATEGIES["numpy"].unavailable_reason())
+
+  def test_choice_is_calibrated_once_and_cached(self):
+
+    reports = []
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "calibration.json")
+
+      for attempt in range(0, 2):
+        choice = choose_strategy(16, 16, names=["numpy", "packed", "python"],
+          calibration_path=path, report=reports.append)
+
+      with open(path) as file:
+        rates = list(json.load(file).values())[0]
+
+    self.assertEqual(sorted(rates), ["numpy", "packed", "python"])
+    self.assertEqual(choice, max(rates, key=rates.get))
+    self.assertEqual(len(reports), 1)
+
+  def test_named_only_strategies_are_not_calibrated_by_default(self):
+
+    candidates = calibration_candidates()
+    self.assertIn("numpy", candidates)
+    self.assertNotIn("python", candidates)
+    self.assertNotIn("hashlife", candidates)
+    self.assertEqual(calibration_candidates(["hashlife"]), ["hashlife"])
+
+if __name__ == '__main__':
+  unittest.main()
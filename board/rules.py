@@ -0,0 +1,132 @@
+import numpy
+import re
+import unittest
+
+# Rulestrings for Life-like rules, in the usual B/S notation (e.g. "B36/S23":
+# a cell is born with 3 or 6 live neighbors and survives with 2 or 3), in
+# S/B order, or in the older "23/36" survival/birth notation.
+BIRTH_SURVIVAL_RULESTRING = re.compile(r"^B([0-8]*)/S([0-8]*)$", re.IGNORECASE)
+SURVIVAL_BIRTH_RULESTRING = re.compile(r"^S([0-8]*)/B([0-8]*)$", re.IGNORECASE)
+LEGACY_RULESTRING = re.compile(r"^([0-8]*)/([0-8]*)$")
+
+class Rule():
+  """
+    A Life-like rule: the neighbor counts on which a dead cell is born, and
+    those on which a live cell survives.
+
+    Strategies update cells by looking up their next state in tables
+    precomputed from the rule, rather than testing neighbor counts:
+
+    - transition_table gives the next state of a cell from its current
+      state and neighbor count, at index (state << 4) | count. For these
+      rules this holds everything a table over the 3x3 neighborhood would,
+      in 32 bytes.
+    - block_table gives the next state of the center 2x2 cells of a 4x4
+      block, indexed by the block's 16 cells (bit row * 4 + col), as 4 bits
+      (bit row * 2 + col of the center). It is built the first time it is
+      used, for HashLife.
+  """
+
+  def __init__(self, rulestring="B3/S23"):
+
+    rulestring = rulestring.strip()
+    if match := BIRTH_SURVIVAL_RULESTRING.match(rulestring):
+      birth, survival = match.groups()
+    elif match := SURVIVAL_BIRTH_RULESTRING.match(rulestring):
+      survival, birth = match.groups()
+    elif match := LEGACY_RULESTRING.match(rulestring):
+      survival, birth = match.groups()
+    else:
+      raise Exception("Unrecognized rule " + rulestring)
+
+    self.birth = frozenset(int(count) for count in birth)
+    self.survival = frozenset(int(count) for count in survival)
+
+    # Cells past the edges of the board are always dead, which a rule that
+    # brings empty space to life would not respect.
+    if 0 in self.birth:
+      raise Exception("Rules where cells are born with no neighbors (B0) are not supported")
+
+    self.transition_table = numpy.zeros(32, dtype=numpy.uint8)
+    for count in self.birth:
+      self.transition_table[count] = 1
+    for count in self.survival:
+      self.transition_table[16 | count] = 1
+
+    self.cached_block_table = None
+
+  def __str__(self):
+    return ("B" + "".join(str(count) for count in sorted(self.birth))
+      + "/S" + "".join(str(count) for count in sorted(self.survival)))
+
+  def __repr__(self):
+    return "Rule(\"" + str(self) + "\")"
+
+  def __eq__(self, other):
+    return (isinstance(other, Rule) and self.birth == other.birth
+      and self.survival == other.survival)
+
+  def __hash__(self):
+    return hash((self.birth, self.survival))
+
+  def next_state(self, alive, neighbor_count):
+    """Returns 1 if a cell in the given state, with the given neighbors, is alive next."""
+
+    return self.transition_table[(alive << 4) | neighbor_count]
+
+  def block_table(self):
+    """Returns the table of 4x4 blocks' next center 2x2 cells."""
+
+    if self.cached_block_table is None:
+      blocks = numpy.arange(1 << 16, dtype=numpy.uint32)
+      cells = ((blocks[:, numpy.newaxis] >> numpy.arange(16, dtype=numpy.uint32)) & 1).astype(
+        numpy.uint8).reshape(-1, 4, 4)
+
+      table = numpy.zeros(1 << 16, dtype=numpy.uint8)
+      for row in (1, 2):
+        for col in (1, 2):
+          neighbor_counts = (cells[:, row-1:row+2, col-1:col+2].sum(axis=(1, 2), dtype=numpy.uint8)
+            - cells[:, row, col])
+          alive = self.transition_table[(cells[:, row, col] << 4) | neighbor_counts]
+          table |= alive << ((row - 1) * 2 + (col - 1))
+
+      self.cached_block_table = table
+
+    return self.cached_block_table
+
+# The rule of Conway's Game of Life.
+CONWAY = Rule("B3/S23")
+
+
+class RuleTests(unittest.TestCase):
+  """Tests for parsing rules and building their tables."""
+
+  def test_rulestrings_are_parsed(self):
+
+    self.assertEqual(str(Rule("b36/s23")), "B36/S23")
+    self.assertEqual(Rule("S23/B36"), Rule("B36/S23"))
+    self.assertEqual(Rule("23/36"), Rule("B36/S23"))
+    self.assertEqual(str(Rule("B2/S")), "B2/S")
+
+    for rulestring in ("B9/S23", "B3S23", "life", "B0/S8"):
+      with self.assertRaises(Exception):
+        Rule(rulestring)
+
+  def test_transition_table_follows_rule(self):
+
+    rule = Rule("B36/S23")
+    born = [count for count in range(0, 9) if rule.next_state(0, count)]
+    survives = [count for count in range(0, 9) if rule.next_state(1, count)]
+
+    self.assertEqual(born, [3, 6])
+    self.assertEqual(survives, [2, 3])
+
+  def test_block_table_steps_center_cells(self):
+
+    # A horizontal blinker along row 1 of the block turns vertical, around
+    # column 1, leaving the left column of the center 2x2 alive.
+    block = (1 << 4) | (1 << 5) | (1 << 6)
+    self.assertEqual(CONWAY.block_table()[block], (1 << 0) | (1 << 2))
+
+if __name__ == '__main__':
+  unittest.main()
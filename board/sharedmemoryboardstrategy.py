@@ -0,0 +1,257 @@
+from board.boardstate import BoardState
+from board.boardstate import BoardStateTests
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.pythonboardstrategy import StraightPythonUpdateStrategy
+from multiprocessing import shared_memory
+import multiprocessing
+import numpy
+import os
+import time
+import unittest
+
+# Seconds between checks that the workers are still alive, while waiting
+# for them.
+WORKER_POLL_SECONDS = 0.1
+
+class SharedMemoryUpdateStrategy(NumpyUpdateStrategy):
+  """
+    Strategy to update the board state using a pool of worker processes.
+
+    The board is split into horizontal bands, one per worker, and each worker
+    updates its band with numpy. The board state's cell arrays are moved into
+    shared memory so that workers read and write them directly, without any
+    board data being copied between processes. Workers read the rows on
+    either side of their band straight from the shared cells (the board's
+    border supplies the rows past the edges). Each generation, every worker
+    waits for its own signal to start, and signals when its band is done,
+    so no band is read while it is written.
+
+    Workers are started on the first update of a board, and stay running
+    until close() is called or another board is updated. They are spawned
+    rather than forked, since forking a process that has already started
+    threads (e.g. Numba's) can leave the workers deadlocked.
+
+    If a worker dies, or the workers don't all finish a generation within
+    timeout seconds, the workers are stopped and an exception is raised
+    rather than waiting forever. (A multiprocessing barrier can't be used
+    for this, since breaking it waits on every process that was waiting at
+    it, including one that died there.)
+  """
+
+  def __init__(self, opengl_draw_state=None, workers=None, rule=None, timeout=60):
+    NumpyUpdateStrategy.__init__(self, opengl_draw_state=opengl_draw_state, rule=rule)
+
+    self.worker_count = workers if workers else os.cpu_count()
+    self.timeout = timeout
+
+    self.context = multiprocessing.get_context("spawn")
+    self.board_state = None
+    self.shared_memory = []
+    self.shared_cells = []
+    self.workers = []
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception_info):
+    self.close()
+
+  def update(self, board_state):
+    """Update the board state."""
+
+    if (self.board_state is not board_state
+        or not any(board_state.cells is cells for cells in self.shared_cells)):
+      self.start(board_state)
+
+    if self.opengl_draw_state:
+      self.opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
+
+    # Tell workers which of the shared arrays holds the current cells (the
+    # board state swaps them after each update), then let them run.
+    self.source_index.value = 0 if board_state.cells is self.shared_cells[0] else 1
+    for start_signal in self.start_signals:
+      start_signal.release()
+    self.wait_for_workers()
+
+    if self.opengl_draw_state:
+      self.update_colors(board_state.new_cells.reshape(board_state.rows + 2,
+        board_state.cols + 2), 1, board_state.rows + 1, 1, board_state.cols + 1)
+
+  def start(self, board_state):
+    """Move a board's cells into shared memory and start workers for it."""
+
+    self.close()
+
+    for cells in (board_state.cells, board_state.new_cells):
+      memory = shared_memory.SharedMemory(create=True, size=cells.nbytes)
+      shared_cells = numpy.ndarray(cells.shape, dtype=cells.dtype, buffer=memory.buf)
+      shared_cells[:] = cells
+      self.shared_memory.append(memory)
+      self.shared_cells.append(shared_cells)
+
+    board_state.cells, board_state.new_cells = self.shared_cells
+    self.board_state = board_state
+
+    worker_count = min(self.worker_count, board_state.rows)
+    self.start_signals = [self.context.Semaphore(0) for worker in range(0, worker_count)]
+    self.done_signal = self.context.Semaphore(0)
+    self.source_index = self.context.Value("i", 0, lock=False)
+    self.stopping = self.context.Value("b", 0, lock=False)
+
+    for worker in range(0, worker_count):
+      # Rows are indexes into the bordered array, so the first row is 1.
+      start_row = 1 + worker * board_state.rows // worker_count
+      end_row = 1 + (worker + 1) * board_state.rows // worker_count
+
+      process = self.context.Process(target=update_band, daemon=True,
+        args=([memory.name for memory in self.shared_memory],
+          board_state.rows, board_state.cols, start_row, end_row,
+          self.rule, self.start_signals[worker], self.done_signal, self.source_index,
+          self.stopping))
+      process.start()
+      self.workers.append(process)
+
+  def wait_for_workers(self):
+    """
+      Wait for every worker to finish its band. Raises an exception, after
+      stopping the workers, if one dies or they don't all finish in time.
+    """
+
+    deadline = time.monotonic() + self.timeout
+    for worker in range(0, len(self.workers)):
+      while not self.done_signal.acquire(timeout=WORKER_POLL_SECONDS):
+        exit_codes = [process.exitcode for process in self.workers if not process.is_alive()]
+        if exit_codes:
+          self.close()
+          raise Exception("A shared memory worker exited unexpectedly, with exit code "
+            + str(exit_codes[0]))
+        if time.monotonic() >= deadline:
+          self.close()
+          raise Exception("Shared memory workers did not finish within "
+            + str(self.timeout) + " seconds")
+
+  def close(self):
+    """Stop the workers and release the shared memory."""
+
+    if self.workers:
+      self.stopping.value = 1
+      for start_signal in self.start_signals:
+        start_signal.release()
+      for process in self.workers:
+        process.join(self.timeout)
+        if process.is_alive():
+          process.terminate()
+          process.join()
+
+    if self.board_state is not None:
+      # Give the board state its own copies of the cells, since the shared
+      # ones are about to go away.
+      self.board_state.cells = numpy.array(self.board_state.cells)
+      self.board_state.new_cells = numpy.array(self.board_state.new_cells)
+
+    # Drop our own views of the shared memory before closing it.
+    self.shared_cells = []
+    for memory in self.shared_memory:
+      memory.close()
+      memory.unlink()
+
+    self.board_state = None
+    self.shared_memory = []
+    self.workers = []
+
+def update_band(shared_memory_names, num_rows, num_cols, start_row, end_row,
+    rule, start_signal, done_signal, source_index, stopping):
+  """Worker process loop, updating one band of rows each generation."""
+
+  shared_memories = [shared_memory.SharedMemory(name=name) for name in shared_memory_names]
+  shared_cells = [
+    numpy.ndarray((num_rows + 2, num_cols + 2), dtype=numpy.uint8, buffer=memory.buf)
+    for memory in shared_memories]
+  strategy = NumpyUpdateStrategy(rule=rule)
+  cells = new_cells = None
+
+  while True:
+    start_signal.acquire()
+    if stopping.value:
+      break
+
+    cells = shared_cells[source_index.value]
+    new_cells = shared_cells[1 - source_index.value]
+    strategy.update_region(new_cells, cells, start_row, end_row, 1, num_cols + 1)
+
+    done_signal.release()
+
+  del cells, new_cells, shared_cells
+  for memory in shared_memories:
+    memory.close()
+
+def benchmark_scaling(rows, cols, generations, max_workers):
+  """
+    Time updates of a random board with 1 to max_workers workers. Returns a
+    list of (workers, cells updated per second) pairs.
+  """
+
+  results = []
+  for workers in range(1, max_workers + 1):
+    board_state = BoardState(rows, cols)
+    board_state.randomize_state()
+
+    with SharedMemoryUpdateStrategy(workers=workers) as strategy:
+      # The first update starts the workers, so leave it out of the timing.
+      board_state.update(strategy)
+
+      start_time = time.perf_counter()
+      for generation in range(0, generations):
+        board_state.update(strategy)
+      elapsed_time = time.perf_counter() - start_time
+
+    results.append((workers, rows * cols * generations / elapsed_time))
+
+  return results
+
+
+class SharedMemoryStrategyUpdateTests(BoardStateTests, unittest.TestCase):
+  """Run BoardStateTests for the shared memory update strategy."""
+
+  def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
+    self.opengl_draw_state = OpenGLDrawState()
+    self.strategy=SharedMemoryUpdateStrategy(opengl_draw_state=self.opengl_draw_state,
+      workers=2)
+
+  def tearDown(self):
+    self.strategy.close()
+
+  def test_update_matches_straight_python_strategy(self):
+
+    board_state = BoardState(rows=23, cols=17)
+    board_state.randomize_state()
+    expected_board_state = BoardState.from_string(board_state.to_string())
+
+    with SharedMemoryUpdateStrategy(workers=3) as strategy:
+      for generation in range(0, 5):
+        board_state.update(strategy=strategy)
+        expected_board_state.update(strategy=StraightPythonUpdateStrategy())
+
+    self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_dead_worker_raises_instead_of_hanging(self):
+
+    board_state = BoardState(rows=23, cols=17)
+    board_state.randomize_state(seed=2)
+
+    with SharedMemoryUpdateStrategy(workers=2, timeout=2) as strategy:
+      board_state.update(strategy=strategy)
+      strategy.workers[0].terminate()
+      strategy.workers[0].join()
+
+      with self.assertRaises(Exception):
+        board_state.update(strategy=strategy)
+      self.assertEqual(strategy.workers, [])
+
+    # The board keeps its cells, in memory of its own.
+    self.assertEqual(len(board_state.to_string()), 23 * 18 - 1)
+
+if __name__ == '__main__':
+  unittest.main()
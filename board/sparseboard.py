@@ -0,0 +1,441 @@
+from board.boardstate import BoardObserver
+from board.boardstate import BoardState
+from board.boardstate import UpdateStrategy
+from board.ensemble import BoardEnsemble
+from board.ensemble import NumpyEnsembleUpdateStrategy
+from board.instrumentation import NULL_INSTRUMENTATION
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.rules import CONWAY
+from board.rules import Rule
+import numpy
+import unittest
+
+# Default number of rows and columns of cells in a chunk.
+DEFAULT_CHUNK_SIZE = 64
+
+# For a neighboring chunk one chunk up/left (-1), level (0) or down/right (1),
+# the part of a chunk's halo it fills, and the part of it that fills it.
+HALO_SLICES = {
+  -1: (slice(0, 1), slice(-1, None)),
+  0: (slice(1, -1), slice(None)),
+  1: (slice(-1, None), slice(0, 1)),
+}
+
+class SparseBoard():
+  """
+    A board without edges: an infinite plane of cells, of which only the
+    parts with live cells are stored.
+
+    The plane is divided into square chunks of chunk_size cells, and each
+    chunk with any live cells is stored as a dense (chunk_size, chunk_size)
+    array in a dictionary keyed by its (chunk row, chunk column). Chunks are
+    added as live cells reach them and dropped once they are empty, so
+    memory and the work of updating follow the live area of the board rather
+    than its extent. Rows and columns can be negative.
+
+    Update with SparseUpdateStrategy, and use SparseBoardWindow to show part
+    of the board on a screen. Observers are notified of updates as with
+    BoardState.
+  """
+
+  # Records where the time goes when updating the board (see
+  # board.instrumentation).
+  instrumentation = NULL_INSTRUMENTATION
+
+  def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+
+    self.chunk_size = chunk_size
+    self.chunks = {}
+    self.generation = 0
+
+    self.observers = []
+    self.notification_policies = []
+
+  @classmethod
+  def from_string(cls, string, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+      Create a SparseBoard with the cells of a board string (see
+      BoardState.from_string), its top left cell at row and column 0.
+    """
+
+    sparse_board = cls(chunk_size)
+    sparse_board.load_rows(BoardState.from_string(string).read_rows())
+    return sparse_board
+
+  def update(self, strategy):
+    """Perform one iteration of the game."""
+
+    self.advance(strategy, 1)
+
+  def advance(self, strategy, updates):
+    """Perform the given number of iterations of the game, then notify observers."""
+
+    with self.instrumentation.phase("strategy"):
+      strategy.advance(self, updates)
+    self.generation += updates * strategy.generations_per_update
+
+    with self.instrumentation.phase("notify"):
+      self.notify_observers()
+
+  def add_observer(self, observer, policy=None):
+    """
+      Add an observer so that it receives notification of state updates,
+      optionally with a NotificationPolicy deciding which updates.
+    """
+
+    self.observers.append(observer)
+    self.notification_policies.append(policy)
+
+  def notify_observers(self, force=False):
+    """
+      Notify observers of the current state, subject to their notification
+      policies unless forced.
+    """
+
+    for observer, policy in zip(self.observers, self.notification_policies):
+      if force or policy is None or policy.should_notify(self):
+        observer.on_update(self)
+
+  def chunk_key(self, row, col):
+    """Returns the key of the chunk holding the given cell."""
+
+    return (row // self.chunk_size, col // self.chunk_size)
+
+  def cell_state(self, row, col):
+    """ Returns True if the cell at the given location is alive, False otherwise."""
+
+    chunk = self.chunks.get(self.chunk_key(row, col))
+    return chunk is not None and bool(chunk[row % self.chunk_size, col % self.chunk_size])
+
+  def set_cell(self, row, col):
+    """Set a cell as alive."""
+
+    key = self.chunk_key(row, col)
+    chunk = self.chunks.get(key)
+    if chunk is None:
+      chunk = self.chunks[key] = numpy.zeros((self.chunk_size, self.chunk_size),
+        dtype=numpy.uint8)
+    chunk[row % self.chunk_size, col % self.chunk_size] = 1
+
+  def clear_cell(self, row, col):
+    """Set a cell as dead."""
+
+    key = self.chunk_key(row, col)
+    chunk = self.chunks.get(key)
+    if chunk is not None:
+      chunk[row % self.chunk_size, col % self.chunk_size] = 0
+      if not chunk.any():
+        del self.chunks[key]
+
+  def chunk_ranges(self, top, left, rows, cols):
+    """
+      Yields each chunk key overlapping the given region, with the slices
+      of the region and of the chunk that overlap.
+    """
+
+    size = self.chunk_size
+    for chunk_row in range(top // size, (top + rows - 1) // size + 1):
+      start_row = max(top, chunk_row * size)
+      end_row = min(top + rows, (chunk_row + 1) * size)
+      for chunk_col in range(left // size, (left + cols - 1) // size + 1):
+        start_col = max(left, chunk_col * size)
+        end_col = min(left + cols, (chunk_col + 1) * size)
+        yield ((chunk_row, chunk_col),
+          (slice(start_row - top, end_row - top), slice(start_col - left, end_col - left)),
+          (slice(start_row - chunk_row * size, end_row - chunk_row * size),
+            slice(start_col - chunk_col * size, end_col - chunk_col * size)))
+
+  def read_window(self, top, left, rows, cols):
+    """
+      Returns the given region of the board as a two-dimensional (rows, cols)
+      array with one uint8 (0 or 1) per cell.
+    """
+
+    window = numpy.zeros((rows, cols), dtype=numpy.uint8)
+    for key, window_slices, chunk_slices in self.chunk_ranges(top, left, rows, cols):
+      chunk = self.chunks.get(key)
+      if chunk is not None:
+        window[window_slices] = chunk[chunk_slices]
+    return window
+
+  def load_rows(self, cells, top=0, left=0):
+    """
+      Set the state of a region of the board, with its top left cell at the
+      given row and column, from a two-dimensional array of cells (any
+      non-zero value is alive).
+    """
+
+    rows, cols = cells.shape
+    for key, window_slices, chunk_slices in self.chunk_ranges(top, left, rows, cols):
+      chunk = self.chunks.get(key)
+      if chunk is None:
+        chunk = numpy.zeros((self.chunk_size, self.chunk_size), dtype=numpy.uint8)
+      chunk[chunk_slices] = cells[window_slices] != 0
+
+      if chunk.any():
+        self.chunks[key] = chunk
+      else:
+        self.chunks.pop(key, None)
+
+  def randomize_state(self, rows, cols, density=0.5, seed=None, top=0, left=0):
+    """
+      Set a region of the board to a random set of live/dead cells, in the
+      same way as BoardState.randomize_state.
+    """
+
+    board_state = BoardState(rows, cols)
+    board_state.randomize_state(density=density, seed=seed)
+    self.load_rows(board_state.read_rows(), top, left)
+
+  def population(self):
+    """Returns the number of live cells."""
+
+    return sum(int(numpy.count_nonzero(chunk)) for chunk in self.chunks.values())
+
+  def bounding_box(self):
+    """
+      Returns the (top, left, rows, cols) of the smallest region holding
+      every live cell, or None if there are none.
+    """
+
+    if not self.chunks:
+      return None
+
+    size = self.chunk_size
+    top = left = bottom = right = None
+    for (chunk_row, chunk_col), chunk in self.chunks.items():
+      live_rows = numpy.flatnonzero(chunk.any(axis=1))
+      live_cols = numpy.flatnonzero(chunk.any(axis=0))
+      chunk_top = chunk_row * size + live_rows[0]
+      chunk_bottom = chunk_row * size + live_rows[-1]
+      chunk_left = chunk_col * size + live_cols[0]
+      chunk_right = chunk_col * size + live_cols[-1]
+
+      top = chunk_top if top is None else min(top, chunk_top)
+      bottom = chunk_bottom if bottom is None else max(bottom, chunk_bottom)
+      left = chunk_left if left is None else min(left, chunk_left)
+      right = chunk_right if right is None else max(right, chunk_right)
+
+    return int(top), int(left), int(bottom - top + 1), int(right - left + 1)
+
+class SparseUpdateStrategy(UpdateStrategy):
+  """
+    Strategy to update a SparseBoard.
+
+    Each update runs on the stored chunks, and on the empty chunks next to
+    any of their edges (or corners) with live cells, where cells might be
+    born. Each chunk is surrounded by a halo of its neighbors' edge cells,
+    and all of them are updated at once as a BoardEnsemble. Chunks left
+    empty are dropped.
+
+    Unlike strategies for a BoardState, update() replaces the board's chunks
+    rather than setting new cells to be swapped in.
+  """
+
+  def __init__(self, rule=None):
+
+    self.rule = rule if rule else CONWAY
+    self.ensemble_strategy = NumpyEnsembleUpdateStrategy(rule=self.rule)
+
+    # Number of chunks computed during the last update.
+    self.active_chunk_count = 0
+
+  def advance(self, sparse_board, updates):
+    """Perform the given number of updates."""
+
+    for update in range(0, updates):
+      self.update(sparse_board)
+
+  def active_chunk_keys(self, stored_keys, stored_chunks):
+    """
+      Returns the keys of the chunks whose cells might be alive next
+      generation, given the keys of the stored chunks and their cells stacked
+      into one array.
+    """
+
+    # Cells can only be born in an empty chunk next to a stored chunk's edge
+    # or corner with live cells.
+    live_edges = {
+      (-1, 0): stored_chunks[:, 0].any(axis=1),
+      (1, 0): stored_chunks[:, -1].any(axis=1),
+      (0, -1): stored_chunks[:, :, 0].any(axis=1),
+      (0, 1): stored_chunks[:, :, -1].any(axis=1),
+      (-1, -1): stored_chunks[:, 0, 0] != 0,
+      (-1, 1): stored_chunks[:, 0, -1] != 0,
+      (1, -1): stored_chunks[:, -1, 0] != 0,
+      (1, 1): stored_chunks[:, -1, -1] != 0,
+    }
+
+    keys = set(stored_keys)
+    for (row_offset, col_offset), live in live_edges.items():
+      for index in numpy.flatnonzero(live).tolist():
+        chunk_row, chunk_col = stored_keys[index]
+        keys.add((chunk_row + row_offset, chunk_col + col_offset))
+    return list(keys)
+
+  def update(self, sparse_board):
+    """Replace the board's chunks with their next generation."""
+
+    chunks = sparse_board.chunks
+    self.active_chunk_count = 0
+    if not chunks:
+      return
+
+    stored_keys = list(chunks)
+    stored_chunks = numpy.stack([chunks[key] for key in stored_keys])
+    stored_indices = {key: index for index, key in enumerate(stored_keys)}
+
+    keys = self.active_chunk_keys(stored_keys, stored_chunks)
+    self.active_chunk_count = len(keys)
+
+    # Fill each active chunk, and its halo, from the stored chunks, one
+    # neighbor direction at a time for all of the active chunks at once.
+    ensemble = BoardEnsemble(len(keys), sparse_board.chunk_size, sparse_board.chunk_size)
+    for row_offset, (halo_rows, neighbor_rows) in HALO_SLICES.items():
+      for col_offset, (halo_cols, neighbor_cols) in HALO_SLICES.items():
+        neighbors = numpy.array([stored_indices.get((chunk_row + row_offset,
+          chunk_col + col_offset), -1) for chunk_row, chunk_col in keys])
+        present = numpy.flatnonzero(neighbors >= 0)
+        ensemble.cells[present, halo_rows, halo_cols] = (
+          stored_chunks[neighbors[present], neighbor_rows, neighbor_cols])
+
+    self.ensemble_strategy.update(ensemble)
+
+    new_chunks = ensemble.new_cells[:, 1:-1, 1:-1]
+    live_chunks = new_chunks.reshape(len(keys), -1).any(axis=1)
+    sparse_board.chunks = {key: numpy.array(new_chunks[index])
+      for index, key in enumerate(keys) if live_chunks[index]}
+
+class SparseBoardWindow(BoardState, BoardObserver):
+  """
+    A BoardState showing a rows x cols window of a SparseBoard, with its top
+    left cell at the given row and column of the board, for the screens and
+    other observers of a BoardState to use.
+
+    Add the window as an observer of the sparse board. Each time it is
+    notified it copies the window's cells (keeping the last ones as
+    new_cells, as after an update), sets the OpenGL draw state's colors if it
+    has one, and notifies its own observers. The window itself can't be
+    updated; update the sparse board instead.
+  """
+
+  def __init__(self, sparse_board, top, left, rows, cols, opengl_draw_state=None):
+
+    BoardState.__init__(self, rows, cols)
+    self.sparse_board = sparse_board
+    self.top = top
+    self.left = left
+    self.opengl_draw_state = opengl_draw_state
+    self.refresh()
+
+  def move_to(self, top, left):
+    """Show the part of the board with its top left cell at the given row and column."""
+
+    self.top = top
+    self.left = left
+    self.refresh()
+
+  def refresh(self):
+    """Copy the window's cells from the sparse board."""
+
+    self.swap_cells()
+    self.load_rows(self.sparse_board.read_window(self.top, self.left, self.rows, self.cols))
+    self.generation = self.sparse_board.generation
+
+    if self.opengl_draw_state:
+      self.opengl_draw_state.set_cell_dimensions(self.rows, self.cols)
+      self.opengl_draw_state.refresh_cell_colors(self.read_rows())
+
+  def on_update(self, sparse_board):
+    """Refresh the window, and notify its observers."""
+
+    self.refresh()
+    self.notify_observers()
+
+  def advance(self, strategy, updates):
+    raise Exception("A window can only be updated through its sparse board")
+
+
+class SparseBoardTests(unittest.TestCase):
+  """Tests for sparse boards and their windows."""
+
+  def test_update_matches_dense_board(self):
+
+    # A dense board with room around a random region, for it to grow into
+    # without reaching the edges.
+    dense_board = BoardState(rows=100, cols=110)
+    dense_board.randomize_state(density=0.4, seed=5)
+    dense_board.as_2d_view()[:30] = 0
+    dense_board.as_2d_view()[-30:] = 0
+    dense_board.as_2d_view()[:, :30] = 0
+    dense_board.as_2d_view()[:, -30:] = 0
+
+    # Place it so that it spans chunks with negative coordinates too.
+    sparse_board = SparseBoard(chunk_size=16)
+    sparse_board.load_rows(dense_board.read_rows(), top=-50, left=-37)
+
+    rule = Rule("B36/S23")
+    sparse_board.advance(SparseUpdateStrategy(rule=rule), 20)
+    dense_board.advance(NumpyUpdateStrategy(rule=rule), 20)
+
+    self.assertEqual(sparse_board.read_window(-50, -37, 100, 110).tolist(),
+      dense_board.read_rows().tolist())
+    self.assertEqual(sparse_board.population(), int(dense_board.read_rows().sum()))
+
+  def test_glider_travels_without_edges(self):
+
+    sparse_board = SparseBoard.from_string(
+      "-X-\n" +
+      "--X\n" +
+      "XXX", chunk_size=8)
+
+    sparse_board.advance(SparseUpdateStrategy(), 4 * 50)
+
+    # A glider moves one cell down and right every four generations, and
+    # only the chunks it is in are kept.
+    self.assertEqual(sparse_board.bounding_box(), (50, 50, 3, 3))
+    self.assertEqual(sparse_board.read_window(50, 50, 3, 3).tolist(),
+      [[0, 1, 0], [0, 0, 1], [1, 1, 1]])
+    self.assertLessEqual(len(sparse_board.chunks), 4)
+
+  def test_empty_chunks_are_dropped(self):
+
+    sparse_board = SparseBoard(chunk_size=4)
+    sparse_board.set_cell(-10, 7)
+    sparse_board.set_cell(100, 100)
+    sparse_board.clear_cell(100, 100)
+    self.assertEqual(list(sparse_board.chunks), [(-3, 1)])
+
+    sparse_board.update(SparseUpdateStrategy())
+    self.assertEqual(sparse_board.chunks, {})
+    self.assertIsNone(sparse_board.bounding_box())
+
+  def test_window_shows_board_to_observers(self):
+
+    class RecordingObserver(BoardObserver):
+      def __init__(self):
+        self.boards = []
+      def on_update(self, board_state):
+        self.boards.append(board_state.to_string())
+
+    sparse_board = SparseBoard.from_string(
+      "---\n" +
+      "XXX\n" +
+      "---", chunk_size=2)
+    window = SparseBoardWindow(sparse_board, top=-1, left=0, rows=3, cols=4)
+    sparse_board.add_observer(window)
+    observer = RecordingObserver()
+    window.add_observer(observer)
+
+    sparse_board.update(SparseUpdateStrategy())
+    self.assertEqual(observer.boards, [
+      "----\n" +
+      "-X--\n" +
+      "-X--"])
+    self.assertEqual(window.generation, 1)
+
+    with self.assertRaises(Exception):
+      window.update(SparseUpdateStrategy())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,183 @@
+from board.boardstate import BoardState
+from board.boardstate import BoardStateTests
+from board.numpyboardstrategy import NumpyUpdateStrategy
+from board.pythonboardstrategy import StraightPythonUpdateStrategy
+import numpy
+import unittest
+
+class ActiveTileUpdateStrategy(NumpyUpdateStrategy):
+  """
+    Strategy to update the board state with numpy, skipping the parts of the
+    board that have stopped changing.
+
+    The board is divided into square tiles, and the strategy remembers which
+    tiles changed in the last generation. A cell can only change if something
+    within one cell of it changed, so only tiles that changed, or that border
+    one that did, are recomputed. Every other tile already holds the same
+    cells in both of the board state's arrays, so it can be left alone.
+
+    The strategy assumes it sees every change to the board. If cells are set
+    or cleared directly between updates, call invalidate() so that the whole
+    board is recomputed on the next update.
+  """
+
+  def __init__(self, opengl_draw_state=None, tile_size=64, rule=None):
+    NumpyUpdateStrategy.__init__(self, opengl_draw_state=opengl_draw_state, rule=rule)
+
+    self.tile_size = tile_size
+
+    # The board whose changes are being tracked, and which of its tiles
+    # changed during the last update.
+    self.board_state = None
+    self.changed_tiles = numpy.zeros((0, 0), dtype=bool)
+
+    # Number of tiles recomputed during the last update.
+    self.active_tile_count = 0
+
+  def invalidate(self):
+    """Recompute every tile on the next update."""
+
+    self.board_state = None
+
+  def tile_count(self):
+    """Returns the number of tiles the board is divided into."""
+
+    return self.changed_tiles.size
+
+  def update(self, board_state):
+    """Update the board state."""
+
+    tile_size = self.tile_size
+
+    # A draw state that is new, or has been resized, holds no colors yet.
+    is_draw_state_stale = bool(self.opengl_draw_state) and (
+      (self.opengl_draw_state.rows, self.opengl_draw_state.cols)
+      != (board_state.rows, board_state.cols))
+
+    # When every tile is treated as changed, every tile's colors are set too,
+    # including those of tiles that turn out not to change.
+    refresh_all_colors = self.board_state is not board_state or is_draw_state_stale
+    if refresh_all_colors:
+      # Treat every tile as changed, since we don't know what the other array
+      # holds yet.
+      self.board_state = board_state
+      self.changed_tiles = numpy.ones(
+        ((board_state.rows + tile_size - 1) // tile_size,
+         (board_state.cols + tile_size - 1) // tile_size), dtype=bool)
+
+    if self.opengl_draw_state:
+      self.opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
+
+    # Find tiles that changed or that border one that did.
+    changed = numpy.pad(self.changed_tiles, 1)
+    active_tiles = numpy.zeros_like(self.changed_tiles)
+    for row_offset in (0, 1, 2):
+      for col_offset in (0, 1, 2):
+        active_tiles |= changed[row_offset:row_offset + active_tiles.shape[0],
+                                col_offset:col_offset + active_tiles.shape[1]]
+
+    self.active_tile_count = int(numpy.count_nonzero(active_tiles))
+    changed_tiles = numpy.zeros_like(self.changed_tiles)
+
+    cells = board_state.cells.reshape(board_state.rows + 2, board_state.cols + 2)
+    new_cells = board_state.new_cells.reshape(board_state.rows + 2, board_state.cols + 2)
+
+    for tile_row in numpy.flatnonzero(active_tiles.any(axis=1)):
+      start_row = 1 + tile_row * tile_size
+      end_row = min(start_row + tile_size, board_state.rows + 1)
+
+      # Update each run of adjacent active tiles in this row of tiles at once.
+      is_active = numpy.concatenate(([False], active_tiles[tile_row], [False]))
+      run_edges = numpy.flatnonzero(is_active[1:] != is_active[:-1])
+
+      for first_tile, end_tile in zip(run_edges[0::2], run_edges[1::2]):
+        start_col = 1 + first_tile * tile_size
+        end_col = min(1 + end_tile * tile_size, board_state.cols + 1)
+
+        self.update_region(new_cells, cells, start_row, end_row, start_col, end_col)
+        if self.opengl_draw_state and refresh_all_colors:
+          self.update_colors(new_cells, start_row, end_row, start_col, end_col)
+
+        # Note which of the tiles in the run changed.
+        differences = (new_cells[start_row:end_row, start_col:end_col]
+          != cells[start_row:end_row, start_col:end_col]).any(axis=0)
+        for tile_col in range(first_tile, end_tile):
+          tile_start = (tile_col - first_tile) * tile_size
+          if differences[tile_start:tile_start + tile_size].any():
+            changed_tiles[tile_row, tile_col] = True
+
+            if self.opengl_draw_state and not refresh_all_colors:
+              self.update_colors(new_cells, start_row, end_row,
+                1 + tile_col * tile_size,
+                min(1 + (tile_col + 1) * tile_size, board_state.cols + 1))
+
+    self.changed_tiles = changed_tiles
+
+
+class ActiveTileStrategyUpdateTests(BoardStateTests, unittest.TestCase):
+  """Run BoardStateTests for the active tile update strategy."""
+
+  def setUp(self):
+    from screen.gldrawstate import OpenGLDrawState
+
+    self.opengl_draw_state = OpenGLDrawState()
+    self.strategy=ActiveTileUpdateStrategy(opengl_draw_state=self.opengl_draw_state)
+
+  def test_update_matches_straight_python_strategy(self):
+
+    board_state = BoardState(rows=37, cols=45)
+    board_state.randomize_state()
+    expected_board_state = BoardState.from_string(board_state.to_string())
+    strategy = ActiveTileUpdateStrategy(tile_size=8)
+
+    for generation in range(0, 10):
+      board_state.update(strategy=strategy)
+      expected_board_state.update(strategy=StraightPythonUpdateStrategy())
+
+      self.assertEqual(board_state.to_string(), expected_board_state.to_string())
+
+  def test_quiescent_tiles_are_skipped(self):
+
+    # A still life block in one corner and a blinker in the other.
+    board_state = BoardState.from_string("\n".join(
+      ["XX" + "-" * 30, "XX" + "-" * 30] + ["-" * 32] * 28 +
+      ["-" * 28 + "XXX-", "-" * 32]))
+    strategy = ActiveTileUpdateStrategy(tile_size=8)
+
+    board_state.update(strategy=strategy)
+    self.assertEqual(strategy.active_tile_count, strategy.tile_count())
+
+    board_state.update(strategy=strategy)
+    board_state.update(strategy=strategy)
+
+    # Only the blinker's tile and its neighbors are still being updated.
+    self.assertEqual(strategy.active_tile_count, 4)
+    self.assertEqual(board_state.cell_state(29, 29), True)
+    self.assertEqual(board_state.cell_state(30, 29), True)
+    self.assertEqual(board_state.cell_state(0, 0), True)
+
+  def test_still_lifes_are_drawn(self):
+
+    from screen.gldrawstate import LIVE_CELL_INTENSITY, OpenGLDrawState
+
+    board_state = BoardState.from_string(
+      "XX------\n" +
+      "XX------\n" +
+      "--------\n" +
+      "--------")
+    opengl_draw_state = OpenGLDrawState()
+    strategy = ActiveTileUpdateStrategy(opengl_draw_state=opengl_draw_state, tile_size=2)
+
+    board_state.update(strategy=strategy)
+    self.assertEqual(opengl_draw_state.get_cell_intensities().reshape(4, 8)[0:2, 0:2].tolist(),
+      [[LIVE_CELL_INTENSITY] * 2] * 2)
+
+    # Invalidating also redraws the whole board.
+    opengl_draw_state.get_cell_intensities()[:] = 0
+    strategy.invalidate()
+    board_state.update(strategy=strategy)
+    self.assertEqual(int(opengl_draw_state.get_cell_intensities().sum()),
+      4 * LIVE_CELL_INTENSITY)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,5 +1,6 @@
-from board.boardstate import BoardState
+from board.registry import STRATEGIES
 import argparse
+import atexit
 import sys
 import time
 
@@ -7,70 +8,451 @@ import time
 
 NANOS_PER_SECOND = 1000000000
 
-arg_parser = argparse.ArgumentParser("Conway's Game of Life")
+def main():
 
-arg_parser.add_argument("--cell-dimensions", dest="cell_dimensions", nargs=2, required=False, type=int, default=[100,100], help="Number of cell columns and rows")
-arg_parser.add_argument("--screen-dimensions", dest="screen_dimensions", nargs=2, required=False, type=int, default=[400,400], help="Screen width and height")
-arg_parser.add_argument("--cuda", action="store_true", dest="use_cuda_strategy", required=False, default=False, help="Use CUDA to update board state.")
-arg_parser.add_argument("--display-as-text", action="store_true", dest="use_text_display", required=False, default=False, help="Display board as text instead of using OpenGL.")
-arg_parser.add_argument("--display-as-ansi-text", action="store_true", dest="use_ansi_text_display", required=False, default=False, help="Display board as text, using ANSI control characters.")
-arg_parser.add_argument("--runtime", dest="run_time", nargs=1, required=False, type=int, default=None, help="Stop after the given number of seconds")
-args = arg_parser.parse_args()
+  arg_parser = argparse.ArgumentParser("Conway's Game of Life")
 
-print_stats = False
+  arg_parser.add_argument("--cell-dimensions", dest="cell_dimensions", nargs=2, required=False, type=int, default=[100,100], help="Number of cell columns and rows")
+  arg_parser.add_argument("--screen-dimensions", dest="screen_dimensions", nargs=2, required=False, type=int, default=[400,400], help="Screen width and height")
+  arg_parser.add_argument("--rule", dest="rule", required=False, default=None, help="Life-like rule to play, e.g. B36/S23 (defaults to Conway's B3/S23, or the rule of a resumed checkpoint or loaded RLE pattern).")
+  arg_parser.add_argument("--strategy", dest="strategy", required=False, default=None, choices=list(STRATEGIES) + ["auto"], help="Strategy to update the board with, or auto to use the fastest for the board size on this machine (measured on first use, then cached).")
+  arg_parser.add_argument("--recalibrate", action="store_true", dest="recalibrate", required=False, default=False, help="With --strategy auto, measure the strategies again rather than using cached results.")
+  arg_parser.add_argument("--list-strategies", action="store_true", dest="list_strategies", required=False, default=False, help="List the strategies, and whether each is available on this machine, then exit.")
+  arg_parser.add_argument("--cuda", action="store_true", dest="use_cuda_strategy", required=False, default=False, help="Use CUDA to update board state.")
+  arg_parser.add_argument("--numba", action="store_true", dest="use_numba_strategy", required=False, default=False, help="Use Numba to update board state on all CPU cores.")
+  arg_parser.add_argument("--threads", dest="threads", required=False, type=int, default=None, help="Number of threads for the Numba strategy (defaults to all cores).")
+  arg_parser.add_argument("--packed", action="store_true", dest="use_packed_strategy", required=False, default=False, help="Store the board with one bit per cell and update 64 cells at a time.")
+  arg_parser.add_argument("--jump", dest="jump", required=False, type=int, default=None, help="Use HashLife to advance the given (power of two) number of generations per update. Jumps of more than 1024 generations are made in steps of 1024, so that its caches can be cut back between them.")
+  arg_parser.add_argument("--tile-size", dest="tile_size", required=False, type=int, default=None, help="Only update tiles of this size that are still changing.")
+  arg_parser.add_argument("--workers", dest="workers", required=False, type=int, default=None, help="Update the board in bands using this many worker processes.")
+  arg_parser.add_argument("--straight-python", action="store_true", dest="use_python_strategy", required=False, default=False, help="Update board state using straight Python instead of numpy.")
+  arg_parser.add_argument("--infinite", action="store_true", dest="infinite", required=False, default=False, help="Play on a board without edges, storing only the parts with live cells; the cell dimensions are the window of it displayed.")
+  arg_parser.add_argument("--display-as-text", action="store_true", dest="use_text_display", required=False, default=False, help="Display board as text instead of using OpenGL.")
+  arg_parser.add_argument("--display-as-ansi-text", action="store_true", dest="use_ansi_text_display", required=False, default=False, help="Display board as text, using ANSI control characters.")
+  arg_parser.add_argument("--display-as-ansi-diff", action="store_true", dest="use_ansi_diff_display", required=False, default=False, help="Display board as text, using ANSI control characters to only redraw what changed.")
+  arg_parser.add_argument("--text-cell-style", dest="text_cell_style", required=False, default="cells", choices=["cells", "half-block", "braille"], help="Characters to draw cells with for --display-as-ansi-diff.")
+  arg_parser.add_argument("--headless", action="store_true", dest="headless", required=False, default=False, help="Don't display the board; use with --stats-out, --export, --serve, --save or --checkpoint-every.")
+  arg_parser.add_argument("--stats-out", dest="stats_path", required=False, default=None, help="After each step, write the population, births and deaths since the previous update, and bounding box of live cells to this file.")
+  arg_parser.add_argument("--stats-format", dest="stats_format", required=False, default=None, choices=["ndjson", "csv"], help="Format of --stats-out (defaults to CSV for .csv files, NDJSON otherwise).")
+  arg_parser.add_argument("--stats-every", dest="stats_every", required=False, type=int, default=None, help="Only write statistics every given number of generations.")
+  arg_parser.add_argument("--stats-writer-thread", action="store_true", dest="stats_writer_thread", required=False, default=False, help="Write statistics from a background thread.")
+  arg_parser.add_argument("--export", dest="export_path", required=False, default=None, help="Save each generation as an image: a PNG file per generation, if the path includes {generation} (e.g. frames/{generation:06d}.png), or a frame of an animated .apng file.")
+  arg_parser.add_argument("--export-every", dest="export_every", required=False, type=int, default=None, help="Only export every given number of generations.")
+  arg_parser.add_argument("--export-scale", dest="export_scale", required=False, type=int, default=1, help="Pixels across each exported cell.")
+  arg_parser.add_argument("--export-workers", dest="export_workers", required=False, type=int, default=None, help="Number of processes encoding exported images (defaults to the number of cores).")
+  arg_parser.add_argument("--export-frame-rate", dest="export_frame_rate", required=False, type=int, default=10, help="Frames per second of an exported animation.")
+  arg_parser.add_argument("--serve", dest="serve_port", required=False, type=int, default=None, help="Stream each generation to spectators connecting to this TCP port (0 picks a free one).")
+  arg_parser.add_argument("--serve-host", dest="serve_host", required=False, default="127.0.0.1", help="Address to listen for spectators on.")
+  arg_parser.add_argument("--serve-max-rate", dest="serve_max_rate", required=False, type=float, default=None, help="Stream at most this many generations per second.")
+  arg_parser.add_argument("--pipelined", action="store_true", dest="pipelined", required=False, default=False, help="Update the board in its own thread, displaying the latest generation at the display's own rate.")
+  arg_parser.add_argument("--updates-per-step", dest="updates_per_step", required=False, type=int, default=1, help="Number of updates to run between checks for display and stats.")
+  arg_parser.add_argument("--display-every", dest="display_every", required=False, type=int, default=None, help="Only display every given number of generations.")
+  arg_parser.add_argument("--max-display-rate", dest="max_display_rate", required=False, type=float, default=None, help="Display at most this many times per second.")
+  arg_parser.add_argument("--seed", dest="seed", required=False, type=int, default=None, help="Seed for the random starting board.")
+  arg_parser.add_argument("--density", dest="density", required=False, type=float, default=0.5, help="Fraction of cells alive on the random starting board.")
+  arg_parser.add_argument("--load", dest="load_path", required=False, default=None, help="Start from the pattern in an RLE or plaintext (.cells) file, centered on the board.")
+  arg_parser.add_argument("--save", dest="save_path", required=False, default=None, help="Save the board to an RLE or plaintext (.cells) file on exit.")
+  arg_parser.add_argument("--resume", dest="resume_path", required=False, default=None, help="Resume from a checkpoint file.")
+  arg_parser.add_argument("--checkpoint-every", dest="checkpoint_every", required=False, type=int, default=None, help="Write a checkpoint every given number of generations.")
+  arg_parser.add_argument("--checkpoint-path", dest="checkpoint_path", required=False, default="conway.checkpoint", help="File to write checkpoints to.")
+  arg_parser.add_argument("--record-history", dest="record_history_path", required=False, default=None, help="Record the generations displayed, compressed, and write them to this history file on exit.")
+  arg_parser.add_argument("--history-keyframe-every", dest="history_keyframe_every", required=False, type=int, default=100, help="Record the whole board every given number of recorded generations, and only the changes in between.")
+  arg_parser.add_argument("--history-budget", dest="history_budget", required=False, type=int, default=256, help="Megabytes of recorded history to keep, dropping the oldest generations beyond that.")
+  arg_parser.add_argument("--replay", dest="replay_path", required=False, default=None, help="Display the generations in a history file rather than computing them.")
+  arg_parser.add_argument("--replay-from", dest="replay_from", required=False, type=int, default=None, help="Generation to start the replay from (defaults to the first recorded).")
+  arg_parser.add_argument("--replay-rate", dest="replay_rate", required=False, type=float, default=None, help="Replay at most this many generations per second.")
+  arg_parser.add_argument("--on-settle", dest="on_settle", required=False, default=None, choices=["stop", "extrapolate"], help="Watch for the board settling into a still life or oscillator, then stop, or keep going by replaying the cycle instead of computing it.")
+  arg_parser.add_argument("--settle-history", dest="settle_history", required=False, type=int, default=1024, help="Number of recent generations to compare with when watching for the board to settle.")
+  arg_parser.add_argument("--profile", action="store_true", dest="profile", required=False, default=False, help="Time each phase of the board updates, and print a summary on exit.")
+  arg_parser.add_argument("--profile-trace", dest="profile_trace_path", required=False, default=None, help="Time each phase of the board updates, and write them to this Chrome trace (JSON) file on exit.")
+  arg_parser.add_argument("--runtime", dest="run_time", nargs=1, required=False, type=int, default=None, help="Stop after the given number of seconds")
+  args = arg_parser.parse_args()
 
-board_state = BoardState(*args.cell_dimensions)
-board_state.randomize_state()
+  if args.headless and args.pipelined:
+    arg_parser.error("--pipelined has nothing to display when --headless")
+  if args.infinite and (args.pipelined or args.resume_path is not None
+      or args.checkpoint_every is not None or args.on_settle is not None
+      or chosen_strategy_name(args) != "numpy"):
+    arg_parser.error("--infinite has its own strategy, and can't be used with other strategies, "
+      + "--pipelined, --resume, --checkpoint-every or --on-settle")
 
-opengl_draw_state = None
+  if args.replay_path is not None and (args.pipelined or args.infinite
+      or args.resume_path is not None or args.load_path is not None
+      or args.record_history_path is not None or args.on_settle is not None):
+    arg_parser.error("--replay can't be used with --pipelined, --infinite, --resume, --load, "
+      + "--record-history or --on-settle")
 
-# Set desired method of displaying the board state based on commandline options.
-# (framerate stats not displayed for text displays, since both print to the console)
-if args.use_ansi_text_display:
-  from screen.textscreen import AnsiTextScreen
-  screen = AnsiTextScreen(*args.screen_dimensions)
-elif args.use_text_display:
-  from screen.textscreen import TextScreen
-  screen = TextScreen(*args.screen_dimensions)
-else:
-  from screen.glscreen import OpenGLScreen
-  print_stats = True
-  screen = OpenGLScreen(*args.screen_dimensions)
-  opengl_draw_state = screen.get_opengl_draw_state()
+  if args.list_strategies:
+    list_strategies()
+    sys.exit(0)
+
+  print_stats = False
+
+  strategy_name = chosen_strategy_name(args)
+  if strategy_name == "auto":
+    from board.registry import choose_strategy
+    strategy_name = choose_strategy(*args.cell_dimensions, recalibrate=args.recalibrate,
+      report=print)
+    print("Using the", strategy_name, "strategy")
+
+  unavailable_reason = STRATEGIES[strategy_name].unavailable_reason()
+  if unavailable_reason is not None:
+    arg_parser.error("The " + strategy_name + " strategy is not available: " + unavailable_reason)
+  board_state_class = STRATEGIES[strategy_name].load_board_state_class()
+
+  from board.rules import Rule
+  rule = Rule(args.rule) if args.rule is not None else Rule()
+
+  history = None
+  if args.replay_path is not None:
+    from board.boardstate import BoardState
+    from board.history import HistoryRecorder
+    history = HistoryRecorder.load(args.replay_path)
+    board_state = BoardState(history.rows, history.cols)
+  elif args.resume_path is not None:
+    from board.checkpoint import open_checkpoint
+    board_state, checkpoint_rule = open_checkpoint(args.resume_path)
+    if args.rule is None:
+      rule = Rule(checkpoint_rule)
+    if type(board_state) is not board_state_class:
+      # The checkpoint's cells are laid out for another strategy's board
+      # state, so copy them into the kind the chosen strategy updates.
+      resumed_board_state = board_state
+      board_state = board_state_class(resumed_board_state.rows, resumed_board_state.cols)
+      board_state.load_rows(resumed_board_state.read_rows())
+      board_state.generation = resumed_board_state.generation
+  elif args.load_path is not None:
+    # Make the board big enough for the pattern, if it isn't already.
+    from board.patternio import load_pattern, pattern_dimensions
+    pattern_rows, pattern_cols = pattern_dimensions(args.load_path)
+    board_state = board_state_class(max(args.cell_dimensions[0], pattern_rows),
+      max(args.cell_dimensions[1], pattern_cols))
+    board_state, pattern_rule = load_pattern(args.load_path, board_state)
+    if args.rule is None and pattern_rule is not None:
+      rule = Rule(pattern_rule)
+  else:
+    board_state = board_state_class(*args.cell_dimensions)
+    board_state.randomize_state(density=args.density, seed=args.seed)
+
+  # The board that is updated: the board state itself, or for an infinite
+  # board, the sparse board of which the board state is a window.
+  simulated_board = board_state
+  if args.infinite:
+    from board.sparseboard import SparseBoard, SparseBoardWindow
+    simulated_board = SparseBoard()
+    simulated_board.load_rows(board_state.read_rows())
+    board_state = SparseBoardWindow(simulated_board, 0, 0, board_state.rows, board_state.cols)
+    simulated_board.add_observer(board_state)
+
+  if args.profile or args.profile_trace_path is not None:
+    from board.instrumentation import Profiler
+    profiler = Profiler(trace=args.profile_trace_path is not None)
+    simulated_board.instrumentation = profiler
+    if args.profile:
+      atexit.register(lambda: print(profiler.format_summary()))
+    if args.profile_trace_path is not None:
+      atexit.register(profiler.write_chrome_trace, args.profile_trace_path)
+
+  if args.save_path is not None:
+    from board.patternio import save_pattern
+    atexit.register(save_pattern, board_state, args.save_path, str(rule))
+
+  if args.checkpoint_every is not None:
+    from board.checkpoint import Checkpointer
+    checkpointer = Checkpointer(args.checkpoint_path, args.checkpoint_every, str(rule))
+    board_state.add_observer(checkpointer)
+    atexit.register(checkpointer.close)
+
+  if args.record_history_path is not None:
+    from board.history import HistoryRecorder
+    history_recorder = HistoryRecorder(keyframe_interval=args.history_keyframe_every,
+      memory_budget=args.history_budget << 20)
+    board_state.add_observer(history_recorder)
+    atexit.register(history_recorder.save, args.record_history_path)
+
+  cycle_detector = None
+  if args.on_settle is not None:
+    from board.cycledetector import CycleDetector
+    cycle_detector = CycleDetector(history_size=args.settle_history)
+    board_state.add_observer(cycle_detector)
+
+  if args.stats_path is not None:
+    from board.boardstatistics import StatisticsWriter
+    statistics_writer = StatisticsWriter(args.stats_path, format=args.stats_format,
+      writer_thread=args.stats_writer_thread)
+    if args.stats_every is not None:
+      from board.boardstate import EveryNGenerations
+      board_state.add_observer(statistics_writer, EveryNGenerations(args.stats_every))
+    else:
+      board_state.add_observer(statistics_writer)
+    atexit.register(statistics_writer.close)
+
+  if args.export_path is not None:
+    from screen.frameexporter import FrameExporter
+    frame_exporter = FrameExporter(args.export_path, scale=args.export_scale,
+      workers=args.export_workers, frame_rate=args.export_frame_rate)
+    if args.export_every is not None:
+      from board.boardstate import EveryNGenerations
+      board_state.add_observer(frame_exporter, EveryNGenerations(args.export_every))
+    else:
+      board_state.add_observer(frame_exporter)
+    atexit.register(frame_exporter.close)
+
+  if args.serve_port is not None:
+    from screen.spectatorserver import SpectatorServer
+    spectator_server = SpectatorServer(args.serve_host, args.serve_port)
+    spectator_server.start()
+    print("Serving spectators on", args.serve_host + ":" + str(spectator_server.port))
+    if args.serve_max_rate is not None:
+      from board.boardstate import AtMostNPerSecond
+      board_state.add_observer(spectator_server, AtMostNPerSecond(args.serve_max_rate))
+    else:
+      board_state.add_observer(spectator_server)
+    atexit.register(spectator_server.close)
+
+  opengl_draw_state = None
+
+  # Set desired method of displaying the board state based on commandline options.
+  # (framerate stats not displayed for text displays, since both print to the console)
+  if args.headless:
+    screen = None
+  elif args.use_ansi_diff_display:
+    from screen.textscreen import DiffAnsiTextScreen
+    screen = DiffAnsiTextScreen(*args.screen_dimensions, cell_style=args.text_cell_style)
+  elif args.use_ansi_text_display:
+    from screen.textscreen import AnsiTextScreen
+    screen = AnsiTextScreen(*args.screen_dimensions)
+  elif args.use_text_display:
+    from screen.textscreen import TextScreen
+    screen = TextScreen(*args.screen_dimensions)
+  else:
+    from screen.glscreen import OpenGLScreen
+    print_stats = True
+    screen = OpenGLScreen(*args.screen_dimensions)
+    opengl_draw_state = screen.get_opengl_draw_state()
+
+  # Ensure our method of display is notified as the board state changes, as often
+  # as requested.
+  if args.display_every is not None:
+    from board.boardstate import EveryNGenerations
+    display_policy = EveryNGenerations(args.display_every)
+  elif args.max_display_rate is not None:
+    from board.boardstate import AtMostNPerSecond
+    display_policy = AtMostNPerSecond(args.max_display_rate)
+  else:
+    display_policy = None
+  if args.pipelined:
+    # The screen is updated from this thread with copies of the board state,
+    # while another thread updates it, so the update strategy must not touch
+    # the draw state.
+    from board.pipeline import FramePublisher
+    frame_publisher = FramePublisher(board_state)
+    board_state.add_observer(frame_publisher, display_policy)
+    screen_draw_state = opengl_draw_state
+    opengl_draw_state = None
+  elif screen is not None:
+    board_state.add_observer(screen, display_policy)
+
+  if history is not None:
+    run_replay(args, history, board_state, opengl_draw_state)
+
+  # Create the chosen strategy, which may run CUDA kernels to update the
+  # board and/or display.
+  if args.infinite:
+    from board.sparseboard import SparseUpdateStrategy
+    update_strategy = SparseUpdateStrategy(rule=rule)
+    board_state.opengl_draw_state = opengl_draw_state
+  else:
+    from board.registry import create_strategy
+    update_strategy, _ = create_strategy(strategy_name, opengl_draw_state=opengl_draw_state,
+      rule=rule, threads=args.threads, tile_size=args.tile_size, workers=args.workers,
+      generations=args.jump)
+    if hasattr(update_strategy, "close"):
+      atexit.register(update_strategy.close)
+
+  if args.pipelined:
+    run_pipelined(args, board_state, update_strategy, screen, frame_publisher,
+      screen_draw_state, print_stats, cycle_detector)
+
+  original_start_time = start_time = time.time_ns()
+  next_report_time = start_time + NANOS_PER_SECOND
+
+  update_count_at_last_report = 0
+  update_count = 0
+
+  while True:
+    simulated_board.advance(update_strategy, args.updates_per_step)
+
+    update_count += args.updates_per_step
 
-# Ensure our method of display is notified as the board state changes.
-board_state.add_observer(screen)
+    if cycle_detector is not None and cycle_detector.is_settled():
+      update_strategy = handle_settled_board(args, cycle_detector, update_strategy)
+      cycle_detector = None
 
-# Run CUDA kernels to update the board and/or display, if indicated to do so.
-if args.use_cuda_strategy:
-  from board.cudaboardstrategy import CudaUpdateStrategy
-  update_strategy = CudaUpdateStrategy(opengl_draw_state=opengl_draw_state)
-else:
-  from board.pythonboardstrategy import StraightPythonUpdateStrategy
-  update_strategy = StraightPythonUpdateStrategy(opengl_draw_state=opengl_draw_state)
+    current_time = time.time_ns()
 
-original_start_time = start_time = time.time_ns()
-next_report_time = start_time + NANOS_PER_SECOND
+    # Periodically provide update rate statistics, if specified.
+    if print_stats and current_time >= next_report_time:
 
-update_count_at_last_report = 0
-update_count = 0
+      print("Update rate:", (update_count - update_count_at_last_report) 
+        / ((current_time - start_time)/NANOS_PER_SECOND), "f/s")
+      if hasattr(update_strategy, "active_tile_count"):
+        print("Active tiles:", update_strategy.active_tile_count, "of",
+          update_strategy.tile_count())
+      if hasattr(update_strategy, "active_chunk_count"):
+        print("Active chunks:", update_strategy.active_chunk_count)
+      next_report_time += NANOS_PER_SECOND
+      start_time = current_time
+      update_count_at_last_report = update_count
 
-while True:
-  board_state.update(update_strategy)
+    # Stop if a runtime was specified and it has elapsed.
+    if args.run_time is not None and current_time >= original_start_time + args.run_time[0] * NANOS_PER_SECOND:
+      sys.exit(0)
 
-  update_count += 1
+def chosen_strategy_name(args):
+  """Returns the name of the strategy chosen by --strategy or the older options."""
 
-  current_time = time.time_ns()
+  if args.strategy is not None:
+    return args.strategy
+  if args.use_cuda_strategy:
+    return "cuda"
+  if args.jump is not None:
+    return "hashlife"
+  if args.use_numba_strategy:
+    return "numba"
+  if args.use_packed_strategy:
+    return "packed"
+  if args.tile_size is not None:
+    return "tiled"
+  if args.workers is not None:
+    return "shared-memory"
+  if args.use_python_strategy:
+    return "python"
+  return "numpy"
 
-  # Periodically provide update rate statistics, if specified.
-  if print_stats and current_time >= next_report_time:
+def list_strategies():
+  """Print each strategy, and whether it is available on this machine."""
 
-    print("Update rate:", (update_count - update_count_at_last_report) 
-      / ((current_time - start_time)/NANOS_PER_SECOND), "f/s")
-    next_report_time += NANOS_PER_SECOND
-    start_time = current_time
-    update_count_at_last_report = update_count
+  from board.registry import strategy_availability
 
-  # Stop if a runtime was specified and it has elapsed.
-  if args.run_time is not None and current_time >= original_start_time + args.run_time[0] * NANOS_PER_SECOND:
+  for name, description, unavailable_reason in strategy_availability():
+    print(name.ljust(14), description.ljust(40),
+      "available" if unavailable_reason is None else "unavailable (" + unavailable_reason + ")")
+
+def handle_settled_board(args, cycle_detector, update_strategy):
+  """
+    Report that the board has settled, then either stop or return a strategy
+    that replays the cycle it settled into.
+  """
+
+  print("Settled at generation", cycle_detector.settled_generation, "with period",
+    cycle_detector.period)
+
+  if args.on_settle == "stop":
     sys.exit(0)
+
+  from board.cycledetector import CycleExtrapolationStrategy
+  return CycleExtrapolationStrategy(update_strategy, cycle_detector.period)
+
+def run_replay(args, history, board_state, opengl_draw_state):
+  """
+    Display each generation of a recorded history in turn, from --replay-from
+    on, by loading it into the board state and notifying its observers.
+  """
+
+  if opengl_draw_state is not None:
+    opengl_draw_state.set_cell_dimensions(board_state.rows, board_state.cols)
+
+  original_start_time = time.time_ns()
+  next_frame_time = original_start_time
+
+  for frame in history.replay(args.replay_from):
+    if args.replay_rate is not None:
+      current_time = time.time_ns()
+      if current_time < next_frame_time:
+        time.sleep((next_frame_time - current_time) / NANOS_PER_SECOND)
+      next_frame_time += int(NANOS_PER_SECOND / args.replay_rate)
+
+    board_state.load_rows(frame.read_rows())
+    board_state.generation = frame.generation
+    if opengl_draw_state is not None:
+      opengl_draw_state.refresh_cell_colors(board_state.read_rows())
+    board_state.notify_observers()
+
+    # Stop if a runtime was specified and it has elapsed.
+    if args.run_time is not None and time.time_ns() >= original_start_time + args.run_time[0] * NANOS_PER_SECOND:
+      break
+
+  sys.exit(0)
+
+def run_pipelined(args, board_state, update_strategy, screen, frame_publisher,
+    opengl_draw_state, print_stats, cycle_detector):
+  """
+    Update the board in a simulation thread, and display the latest frame it
+    published from this one, skipping any frames published in between.
+  """
+
+  from board.pipeline import SimulationThread
+
+  simulation = SimulationThread(board_state, update_strategy, args.updates_per_step)
+  simulation.start()
+
+  original_start_time = start_time = time.time_ns()
+  next_report_time = start_time + NANOS_PER_SECOND
+
+  generation_at_last_report = board_state.generation
+  render_count_at_last_report = 0
+  render_count = 0
+
+  # Stop the simulation thread before leaving, however that happens, so that
+  # the observers closed on exit are no longer being notified.
+  try:
+    while simulation.is_alive():
+      frame, is_new_frame = frame_publisher.read_latest()
+
+      if cycle_detector is not None and cycle_detector.is_settled():
+        # The simulation thread picks up the new strategy on its next step.
+        if args.on_settle == "stop":
+          simulation.stop()
+        simulation.update_strategy = handle_settled_board(args, cycle_detector,
+          simulation.update_strategy)
+        cycle_detector = None
+
+      if is_new_frame:
+        if opengl_draw_state is not None:
+          opengl_draw_state.set_cell_dimensions(frame.rows, frame.cols)
+          opengl_draw_state.refresh_cell_colors(frame.read_rows())
+        screen.on_update(frame)
+        render_count += 1
+      else:
+        # Nothing new to display; give the simulation thread a turn.
+        time.sleep(0.001)
+
+      current_time = time.time_ns()
+
+      # Periodically provide simulation and render rate statistics, if specified.
+      if print_stats and current_time >= next_report_time:
+
+        elapsed_seconds = (current_time - start_time) / NANOS_PER_SECOND
+        generation = board_state.generation
+        print("Simulation rate:", (generation - generation_at_last_report) / elapsed_seconds,
+          "generations/s")
+        print("Render rate:", (render_count - render_count_at_last_report) / elapsed_seconds,
+          "f/s")
+        next_report_time += NANOS_PER_SECOND
+        start_time = current_time
+        generation_at_last_report = generation
+        render_count_at_last_report = render_count
+
+      # Stop if a runtime was specified and it has elapsed.
+      if args.run_time is not None and current_time >= original_start_time + args.run_time[0] * NANOS_PER_SECOND:
+        sys.exit(0)
+
+    if simulation.error is not None:
+      raise simulation.error
+  finally:
+    simulation.stop()
+  sys.exit(0)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,303 @@
+from board.boardstate import BoardObserver
+import collections
+import concurrent.futures
+import multiprocessing
+import numpy
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+# PNG files are a signature followed by chunks, each its data's length, a
+# four-letter type, the data and a CRC of the type and data. Frames are
+# written as 8-bit indexed color, with each cell's state (0 or 1) being its
+# index into the palette, so the cells need no conversion other than
+# scaling. Animated PNGs (APNG) add an animation control chunk, and a frame
+# control chunk before each frame; frames after the first are held in frame
+# data chunks, which are image data chunks with a sequence number in front.
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Colors of dead and live cells, matching the OpenGL display.
+DEFAULT_PALETTE = ((0, 0, 0), (0, 0, 255))
+
+EXPORT_FORMATS = ("png", "apng")
+
+def png_chunk(kind, data):
+  """Returns a PNG chunk of the given type and data."""
+
+  return (struct.pack(">I", len(data)) + kind + data
+    + struct.pack(">I", zlib.crc32(kind + data)))
+
+def png_header(width, height, palette):
+  """Returns the signature, header and palette chunks of an indexed color PNG."""
+
+  return (PNG_SIGNATURE
+    + png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+    + png_chunk(b"PLTE", bytes(component for color in palette for component in color)))
+
+def compress_frame(cells, scale, compression_level=6):
+  """
+    Returns the compressed PNG image data for a two-dimensional array of
+    cells, each drawn as a scale x scale square of pixels.
+  """
+
+  pixels = cells
+  if scale > 1:
+    pixels = numpy.repeat(numpy.repeat(cells, scale, axis=0), scale, axis=1)
+
+  # Each scanline starts with its filter type; 0 leaves it unfiltered.
+  scanlines = numpy.zeros((pixels.shape[0], pixels.shape[1] + 1), dtype=numpy.uint8)
+  scanlines[:, 1:] = pixels
+  return zlib.compress(scanlines.tobytes(), compression_level)
+
+def write_png(path, cells, scale, palette):
+  """Encode cells as a PNG file. Runs in the exporter's worker processes."""
+
+  rows, cols = cells.shape
+  with open(path, "wb") as file:
+    file.write(png_header(cols * scale, rows * scale, palette)
+      + png_chunk(b"IDAT", compress_frame(cells, scale)) + png_chunk(b"IEND", b""))
+
+class FrameExporter(BoardObserver):
+  """
+    Observer that saves each generation it is notified of as an image: a
+    numbered PNG file per generation, or a frame of an animated PNG.
+
+    For a PNG sequence the path is formatted with the generation, e.g.
+    "frames/{generation:06d}.png". Cells are scaled up to scale x scale
+    pixels, and colored from the palette, one RGB color per cell state.
+
+    Encoding is done by a pool of worker processes. Notifications only copy
+    the cells and queue them for the workers; if max_pending_frames are
+    already queued, they wait for the oldest to be encoded before queueing
+    another, so a simulation that outruns the encoders is slowed to their
+    pace rather than filling memory with frames. An animation's frames are
+    written to the file in order, as each is encoded. Call close() to finish
+    encoding and stop the workers.
+  """
+
+  def __init__(self, path, format=None, scale=1, palette=DEFAULT_PALETTE, workers=None,
+      max_pending_frames=None, frame_rate=10):
+
+    if format is None:
+      format = "apng" if path.lower().endswith(".apng") else "png"
+    if format not in EXPORT_FORMATS:
+      raise Exception("Unrecognized export format " + format)
+    if format == "png" and "{generation" not in path:
+      raise Exception("PNG sequence paths must include {generation}, e.g. frame-{generation}.png")
+
+    self.path = path
+    self.format = format
+    self.scale = scale
+    self.palette = palette
+    self.frame_rate = frame_rate
+
+    worker_count = workers if workers else os.cpu_count()
+    self.max_pending_frames = (max_pending_frames if max_pending_frames
+      else 2 * worker_count)
+
+    # Workers are spawned rather than forked, as for SharedMemoryUpdateStrategy.
+    self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=worker_count,
+      mp_context=multiprocessing.get_context("spawn"))
+    self.pending_frames = collections.deque()
+    self.frame_count = 0
+
+    # Animations are written to as their frames are encoded; the number of
+    # frames is filled in on close().
+    self.file = None
+    self.dimensions = None
+    self.sequence_number = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception_info):
+    self.close()
+
+  def on_update(self, board_state):
+    """Queue the board's current generation for encoding."""
+
+    if len(self.pending_frames) >= self.max_pending_frames:
+      self.finish_frame()
+
+    cells = numpy.array(board_state.read_rows())
+    if self.format == "png":
+      future = self.executor.submit(write_png,
+        self.path.format(generation=board_state.generation), cells, self.scale, self.palette)
+    else:
+      if self.file is None:
+        self.start_animation(cells.shape)
+      elif cells.shape != self.dimensions:
+        raise Exception("Animations can only export boards of one size")
+      future = self.executor.submit(compress_frame, cells, self.scale)
+
+    self.pending_frames.append(future)
+    self.frame_count += 1
+
+  def finish_frame(self):
+    """Wait for the oldest queued frame to be encoded, and write it if it's animated."""
+
+    image_data = self.pending_frames.popleft().result()
+    if self.format == "apng":
+      self.write_animation_frame(image_data)
+
+  def start_animation(self, dimensions):
+    """Write the start of an animated PNG, for frames of the given dimensions."""
+
+    self.dimensions = dimensions
+    rows, cols = dimensions
+    self.file = open(self.path, "wb")
+    self.file.write(png_header(cols * self.scale, rows * self.scale, self.palette))
+
+    # The animation control chunk is rewritten once the number of frames is
+    # known, so note where it is.
+    self.animation_control_offset = self.file.tell()
+    self.file.write(png_chunk(b"acTL", struct.pack(">II", 0, 0)))
+
+  def write_animation_frame(self, image_data):
+    """Write an encoded frame of the animation."""
+
+    rows, cols = self.dimensions
+    self.file.write(png_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.sequence_number,
+      cols * self.scale, rows * self.scale, 0, 0, 1, self.frame_rate, 0, 0)))
+    self.sequence_number += 1
+
+    # The first frame is the image shown by viewers that don't animate.
+    if self.sequence_number == 1:
+      self.file.write(png_chunk(b"IDAT", image_data))
+    else:
+      self.file.write(png_chunk(b"fdAT", struct.pack(">I", self.sequence_number) + image_data))
+      self.sequence_number += 1
+
+  def close(self):
+    """Finish encoding and writing the queued frames, and stop the workers."""
+
+    if self.executor is None:
+      return
+
+    while self.pending_frames:
+      self.finish_frame()
+    self.executor.shutdown()
+    self.executor = None
+
+    if self.file is not None:
+      self.file.write(png_chunk(b"IEND", b""))
+      self.file.seek(self.animation_control_offset)
+      self.file.write(png_chunk(b"acTL", struct.pack(">II", self.frame_count, 0)))
+      self.file.close()
+
+
+class FrameExporterTests(unittest.TestCase):
+  """Tests for exporting generations as images."""
+
+  def read_chunks(self, path):
+    """Returns the (type, data) of each chunk of a PNG file, checking their CRCs."""
+
+    with open(path, "rb") as file:
+      contents = file.read()
+
+    self.assertEqual(contents[:8], PNG_SIGNATURE)
+    chunks = []
+    offset = 8
+    while offset < len(contents):
+      length, = struct.unpack(">I", contents[offset:offset + 4])
+      kind = contents[offset + 4:offset + 8]
+      data = contents[offset + 8:offset + 8 + length]
+      crc, = struct.unpack(">I", contents[offset + 8 + length:offset + 12 + length])
+      self.assertEqual(crc, zlib.crc32(kind + data))
+      chunks.append((kind, data))
+      offset += 12 + length
+    return chunks
+
+  def decode_pixels(self, image_data, width, height):
+    """Returns the palette indexes of unfiltered, compressed image data."""
+
+    scanlines = numpy.frombuffer(zlib.decompress(image_data), dtype=numpy.uint8).reshape(
+      height, width + 1)
+    self.assertFalse(scanlines[:, 0].any())
+    return scanlines[:, 1:]
+
+  def glider_board_state(self):
+
+    from board.boardstate import BoardState
+    return BoardState.from_string(
+      "------\n" +
+      "--X---\n" +
+      "---X--\n" +
+      "-XXX--\n" +
+      "------")
+
+  def test_png_sequence_is_scaled_and_palette_mapped(self):
+
+    from board.numpyboardstrategy import NumpyUpdateStrategy
+
+    board_state = self.glider_board_state()
+    palette = ((10, 20, 30), (200, 100, 0))
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "frame-{generation:03d}.png")
+      with FrameExporter(path, scale=3, palette=palette, workers=2) as exporter:
+        board_state.add_observer(exporter)
+        expected_cells = {}
+        for update in range(0, 4):
+          board_state.update(NumpyUpdateStrategy())
+          expected_cells[board_state.generation] = numpy.array(board_state.read_rows())
+
+      self.assertEqual(sorted(os.listdir(directory)),
+        ["frame-001.png", "frame-002.png", "frame-003.png", "frame-004.png"])
+
+      chunks = self.read_chunks(os.path.join(directory, "frame-004.png"))
+
+    self.assertEqual([kind for kind, data in chunks], [b"IHDR", b"PLTE", b"IDAT", b"IEND"])
+    self.assertEqual(struct.unpack(">IIBBBBB", chunks[0][1]), (18, 15, 8, 3, 0, 0, 0))
+    self.assertEqual(chunks[1][1], bytes([10, 20, 30, 200, 100, 0]))
+
+    pixels = self.decode_pixels(chunks[2][1], 18, 15)
+    self.assertTrue(numpy.array_equal(pixels[::3, ::3], expected_cells[4]))
+    self.assertTrue(numpy.array_equal(pixels[2::3, 2::3], expected_cells[4]))
+
+  def test_animation_frames_are_written_in_order(self):
+
+    from board.numpyboardstrategy import NumpyUpdateStrategy
+
+    board_state = self.glider_board_state()
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "glider.apng")
+
+      # With one pending frame allowed, each notification waits for the
+      # frame before it to be encoded.
+      with FrameExporter(path, workers=2, max_pending_frames=1, frame_rate=25) as exporter:
+        board_state.add_observer(exporter)
+        expected_cells = []
+        for update in range(0, 5):
+          board_state.update(NumpyUpdateStrategy())
+          expected_cells.append(numpy.array(board_state.read_rows()))
+          self.assertLessEqual(len(exporter.pending_frames), 1)
+
+      chunks = self.read_chunks(path)
+
+    kinds = [kind for kind, data in chunks]
+    self.assertEqual(kinds, [b"IHDR", b"PLTE", b"acTL", b"fcTL", b"IDAT"]
+      + [b"fcTL", b"fdAT"] * 4 + [b"IEND"])
+    self.assertEqual(struct.unpack(">II", chunks[2][1]), (5, 0))
+
+    frame_controls = [struct.unpack(">IIIIIHHBB", data) for kind, data in chunks
+      if kind == b"fcTL"]
+    self.assertEqual([control[0] for control in frame_controls], [0, 1, 3, 5, 7])
+    self.assertEqual(frame_controls[0][5:7], (1, 25))
+
+    frames = [data for kind, data in chunks if kind == b"IDAT"]
+    for kind, data in chunks:
+      if kind == b"fdAT":
+        frames.append(data[4:])
+    for frame, cells in zip(frames, expected_cells):
+      self.assertTrue(numpy.array_equal(self.decode_pixels(frame, 6, 5), cells))
+
+  def test_png_sequence_needs_generation_in_path(self):
+
+    with self.assertRaises(Exception):
+      FrameExporter("frame.png")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,14 +1,21 @@
 import numpy
+import unittest
+
+# Intensity of a live cell's color. Dead cells are 0.
+LIVE_CELL_INTENSITY = 255
 
 class OpenGLDrawState():
   """
-    Holds the cell vertex/color arrays used when drawing the cells via OpenGL.
+    Holds the cell colors used when drawing the cells via OpenGL.
 
-    Board update strategies can update these arrays - in particular, we can use
-    the same CUDA kernel that updates the board state to update these.  But
+    Board update strategies can update the colors - in particular, we can use
+    the same CUDA kernel that updates the board state to update them.  But
     this object helps decouple knowledge of OpenGL from the board state, so
     that OpenGL does not have to be installed in order to run the game with
     text-based displays.
+
+    Colors are kept compactly, as one intensity byte per cell, which can be
+    uploaded directly as a texture.
   """
 
   def __init__(self):
@@ -16,63 +23,53 @@ class OpenGLDrawState():
     self.rows = 0
     self.cols = 0
 
-    # Start with empty arrays. The set_cell_dimensions function will
-    # allocate appropriately-sized ones for a given board.
-    self.opengl_cell_colors = numpy.zeros(0, dtype=numpy.uint8)
-    self.opengl_cell_corners = numpy.zeros(0, dtype=numpy.float32)
-
-  def get_opengl_cell_vertex_colors(self):
-    """
-      Returns the array of cell colors. 
-      Each cell gets four three-byte RGB color values, one for each corner of
-      the rectangle drawn for the given cell.
+    # Start with an empty array. The set_cell_dimensions function will
+    # allocate an appropriately-sized one for a given board.
+    self.cell_intensities = numpy.zeros(0, dtype=numpy.uint8)
 
-      Array is one-dimensional, but represents the two-dimensional board of cells.
+  def get_cell_intensities(self):
     """
+      Returns the array of cell color intensities, one byte per cell: 0 for a
+      dead cell and LIVE_CELL_INTENSITY for a live one.
 
-    return self.opengl_cell_colors
-  
-  def get_opengl_cell_corner_vertices(self):
+      Array is one-dimensional, but represents the two-dimensional board of
+      cells, a row at a time.
     """
-      Returns the array of cell vertices.
-      Array is grouped into four vertices for each cell, where each vertex is one
-      corner of a rectangle drawn for the given cell.
 
-      Cell locations are based on a two-dimensional display ranging from location
-      (0.0, 0.0) to (1.0, 1.0).
+    return self.cell_intensities
 
-      Array is one-dimensional, but represents the two-dimensional board of cells.
+  def refresh_cell_colors(self, cells, start_row=0, start_col=0):
+    """
+      Set the colors of a rectangle of cells, with its top-left corner at the
+      given location, from a two-dimensional array of cells (e.g. a region of
+      BoardState.read_rows()) in one vectorized pass.
     """
 
-    return self.opengl_cell_corners
-  
-  def set_cell_dimensions(self, rows, cols):
-    """Set board dimensions and allocate arrays accordingly."""
+    intensities = self.cell_intensities.reshape(self.rows, self.cols)
+    numpy.multiply(cells, LIVE_CELL_INTENSITY, out=intensities[
+      start_row:start_row + cells.shape[0], start_col:start_col + cells.shape[1]],
+      casting="unsafe")
 
-    # Check if array needs to grow
-    if rows * cols * 3 * 4 > len(self.opengl_cell_colors):
-      self.opengl_cell_colors = numpy.zeros(3 * 4 * cols * rows, dtype=numpy.uint8)
-      self.opengl_cell_corners = numpy.zeros(2 * 4 * cols * rows, dtype=numpy.float32)
+  def set_cell_dimensions(self, rows, cols):
+    """Set board dimensions and allocate the intensities accordingly."""
 
     if rows != self.rows or cols != self.cols:
       self.rows = rows
       self.cols = cols
+      self.cell_intensities = numpy.zeros(rows * cols, dtype=numpy.uint8)
+
+
+class OpenGLDrawStateTests(unittest.TestCase):
+  """Tests for the OpenGL draw state."""
+
+  def test_refresh_cell_colors_sets_region(self):
+
+    draw_state = OpenGLDrawState()
+    draw_state.set_cell_dimensions(3, 3)
+    draw_state.refresh_cell_colors(numpy.array([[1, 0], [0, 1]], dtype=numpy.uint8), 1, 1)
+
+    self.assertEqual(draw_state.get_cell_intensities().tolist(),
+      [0, 0, 0, 0, LIVE_CELL_INTENSITY, 0, 0, 0, LIVE_CELL_INTENSITY])
 
-      # Set locations of each cell's corner vertices.
-      width = 1.0 / self.cols
-      height = 1.0 / self.rows
-
-      for row in range(0, self.rows):
-        for col in range(0, self.cols):
-          x = row * width
-          y = col * height
-          cell = (row * self.cols + col) * 8
-
-          self.opengl_cell_corners[cell + 0] = x
-          self.opengl_cell_corners[cell + 1] = y
-          self.opengl_cell_corners[cell + 2] = x
-          self.opengl_cell_corners[cell + 3] = y + height
-          self.opengl_cell_corners[cell + 4] = x + width
-          self.opengl_cell_corners[cell + 5] = y + height
-          self.opengl_cell_corners[cell + 6] = x + width
-          self.opengl_cell_corners[cell + 7] = y
+if __name__ == '__main__':
+  unittest.main()
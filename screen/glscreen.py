@@ -14,14 +14,36 @@ class OpenGLScreen(GameScreen, BoardObserver):
   def on_update(self, board_state):
     """Display the current board state."""
 
-    # The draw state should already have the correct vertices and the board strategy
-    # should have updated the colors to reflect alive/dead cells, so all we have
-    # to do is tell OpenGL to draw the results.
+    # The board strategy should have updated the cell intensities to reflect
+    # alive/dead cells, so all we have to do is upload them as a texture (one
+    # byte per cell) and draw it over the whole view.
     #
-    # Drawing via arrays has shown itself to be faster than loops to draw each cell.
-    glColorPointer(3, GL_BYTE, 0, self.opengl_draw_state.get_opengl_cell_vertex_colors())
-    glVertexPointer(2, GL_FLOAT, 0, self.opengl_draw_state.get_opengl_cell_corner_vertices())
-    glDrawArrays(GL_QUADS, 0, len(self.opengl_draw_state.get_opengl_cell_corner_vertices()) // 2)
+    # A single textured quad is much faster to draw, and much smaller to
+    # upload, than a quad for each cell.
+    draw_state = self.opengl_draw_state
+    cell_intensities = draw_state.get_cell_intensities()
+
+    if self.texture_dimensions != (draw_state.rows, draw_state.cols):
+      self.texture_dimensions = (draw_state.rows, draw_state.cols)
+      glTexImage2D(GL_TEXTURE_2D, 0, GL_LUMINANCE, draw_state.cols, draw_state.rows, 0,
+        GL_LUMINANCE, GL_UNSIGNED_BYTE, cell_intensities)
+    else:
+      glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, draw_state.cols, draw_state.rows,
+        GL_LUMINANCE, GL_UNSIGNED_BYTE, cell_intensities)
+
+    # Rows run along the x axis and columns along the y axis, so the
+    # texture's s (column) coordinate follows y and its t (row) coordinate
+    # follows x. This quad is the only place cells are laid out on screen.
+    glBegin(GL_QUADS)
+    glTexCoord2f(0.0, 0.0)
+    glVertex2f(0.0, 0.0)
+    glTexCoord2f(1.0, 0.0)
+    glVertex2f(0.0, 1.0)
+    glTexCoord2f(1.0, 1.0)
+    glVertex2f(1.0, 1.0)
+    glTexCoord2f(0.0, 1.0)
+    glVertex2f(1.0, 0.0)
+    glEnd()
 
     # Drawing done, so swap the buffer.
     pygame.display.flip()
@@ -56,8 +78,14 @@ class OpenGLScreen(GameScreen, BoardObserver):
     glMatrixMode(GL_MODELVIEW)
     glLoadIdentity()
 
-    # Enable use of arrays to specify vertices and their colors, since this is
-    # how we draw the cells.
-    glEnableClientState(GL_COLOR_ARRAY)
-    glEnableClientState(GL_VERTEX_ARRAY)
-
+    # Cells are drawn as a texture holding one intensity byte per cell, scaled
+    # up without smoothing, and tinted blue by the current color.
+    self.texture = glGenTextures(1)
+    self.texture_dimensions = None
+    glBindTexture(GL_TEXTURE_2D, self.texture)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glEnable(GL_TEXTURE_2D)
+    glColor3f(0.0, 0.0, 1.0)
@@ -0,0 +1,326 @@
+from board.boardstate import BoardObserver
+from board.boardstate import BoardState
+from board.history import KEYFRAME
+from board.history import SPARSE_DELTA
+from board.history import apply_delta
+from board.history import encode_delta
+from board.history import pack_cells
+import asyncio
+import numpy
+import socket
+import struct
+import threading
+import unittest
+
+# Spectators are sent a stream of messages, each a header followed by its
+# data. The header holds, in little-endian order: the kind of message, the
+# generation, the board's rows and columns, and the length of the data.
+# Kinds and data are those of history frames (see board.history): a
+# keyframe of the board's packed cells, or a delta from the last message
+# sent to that spectator.
+MESSAGE_HEADER_FORMAT = "<BQIIQ"
+MESSAGE_HEADER_SIZE = struct.calcsize(MESSAGE_HEADER_FORMAT)
+
+class Spectator():
+  """A connected spectator, the task sending to it, and the latest generation it was sent."""
+
+  def __init__(self, writer):
+
+    self.writer = writer
+    self.task = asyncio.current_task()
+    self.has_update = asyncio.Event()
+    self.generation = None
+    self.packed_cells = None
+
+class SpectatorServer(BoardObserver):
+  """
+    Observer that streams the generations it is notified of over TCP to any
+    number of spectators, e.g. dashboards watching a long run.
+
+    The server runs an asyncio event loop in a background thread, so that
+    notifications only pack the cells (one bit per cell) and hand them over,
+    without waiting for the network. Each new spectator is sent a keyframe
+    of the latest generation, and after that deltas of the cells that
+    changed since the last one it was sent.
+
+    Spectators are sent only the latest generation, never a backlog: one
+    that is still receiving a message when newer generations arrive is sent
+    the newest of them once it is ready, as a single delta. Spectators that
+    keep up share the deltas computed for each generation.
+  """
+
+  def __init__(self, host="127.0.0.1", port=0, max_buffered_bytes=1 << 16):
+
+    self.host = host
+    self.port = port
+    self.max_buffered_bytes = max_buffered_bytes
+
+    self.spectators = set()
+
+    # The latest generation notified of, as (generation, rows, cols, packed
+    # cells), and whether the event loop has been asked to pick it up.
+    self.lock = threading.Lock()
+    self.pending = None
+    self.is_pickup_scheduled = False
+
+    # The latest generation the event loop has picked up, and the deltas to
+    # it computed so far, by the generation they are from.
+    self.latest = None
+    self.latest_deltas = {}
+
+    self.loop = None
+    self.thread = None
+
+  def __enter__(self):
+    self.start()
+    return self
+
+  def __exit__(self, *exception_info):
+    self.close()
+
+  def start(self):
+    """Start serving, in a background thread. Sets port to the port listened on."""
+
+    is_listening = threading.Event()
+    errors = []
+
+    def serve():
+      try:
+        asyncio.run(self.serve(is_listening))
+      except Exception as error:
+        errors.append(error)
+        is_listening.set()
+
+    self.thread = threading.Thread(target=serve, daemon=True)
+    self.thread.start()
+    is_listening.wait()
+    if errors:
+      raise errors[0]
+
+  async def serve(self, is_listening):
+    """Accept spectators until close() is called."""
+
+    self.loop = asyncio.get_running_loop()
+    self.stopping = asyncio.Event()
+
+    server = await asyncio.start_server(self.handle_spectator, self.host, self.port)
+    self.port = server.sockets[0].getsockname()[1]
+    is_listening.set()
+
+    async with server:
+      await self.stopping.wait()
+
+      # Drop any unsent data rather than waiting for slow spectators to
+      # take it.
+      spectators = list(self.spectators)
+      for spectator in spectators:
+        spectator.writer.transport.abort()
+        spectator.has_update.set()
+      await asyncio.gather(*(spectator.task for spectator in spectators),
+        return_exceptions=True)
+
+  def on_update(self, board_state):
+    """Pass the board's current generation to the event loop to send."""
+
+    pending = (board_state.generation, board_state.rows, board_state.cols,
+      pack_cells(board_state))
+
+    with self.lock:
+      self.pending = pending
+      if self.is_pickup_scheduled or self.loop is None:
+        return
+      self.is_pickup_scheduled = True
+
+    self.loop.call_soon_threadsafe(self.pick_up_pending)
+
+  def pick_up_pending(self):
+    """Make the latest generation notified of the one to send, and wake spectators."""
+
+    with self.lock:
+      self.latest = self.pending
+      self.is_pickup_scheduled = False
+    self.latest_deltas = {}
+
+    for spectator in self.spectators:
+      spectator.has_update.set()
+
+  def message_for(self, spectator):
+    """Returns the message taking a spectator to the latest generation."""
+
+    generation, rows, cols, packed_cells = self.latest
+
+    kind = KEYFRAME
+    data = packed_cells.tobytes()
+    if spectator.packed_cells is not None and spectator.packed_cells.size == packed_cells.size:
+      if spectator.generation not in self.latest_deltas:
+        delta_kind, delta_data = encode_delta(spectator.packed_cells, packed_cells)
+        self.latest_deltas[spectator.generation] = (delta_kind, delta_data)
+      delta_kind, delta_data = self.latest_deltas[spectator.generation]
+      if len(delta_data) < len(data):
+        kind, data = delta_kind, delta_data
+
+    return struct.pack(MESSAGE_HEADER_FORMAT, kind, generation, rows, cols, len(data)) + data
+
+  async def handle_spectator(self, reader, writer):
+    """Send a spectator each latest generation, as it becomes ready for it."""
+
+    # Bound what is buffered for a spectator, both here and by the system,
+    # so that a slow one is noticed before it falls far behind.
+    writer.transport.set_write_buffer_limits(high=self.max_buffered_bytes)
+    writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+      self.max_buffered_bytes)
+    spectator = Spectator(writer)
+    self.spectators.add(spectator)
+    if self.latest is not None:
+      spectator.has_update.set()
+
+    try:
+      while True:
+        await spectator.has_update.wait()
+        spectator.has_update.clear()
+        if self.stopping.is_set() or writer.is_closing():
+          break
+        if self.latest[0] == spectator.generation:
+          continue
+
+        writer.write(self.message_for(spectator))
+        spectator.generation = self.latest[0]
+        spectator.packed_cells = self.latest[3]
+
+        # Wait for a slow spectator to take the message; generations that
+        # arrive meanwhile just replace the latest one.
+        await writer.drain()
+    except ConnectionError:
+      pass
+    finally:
+      self.spectators.discard(spectator)
+      writer.close()
+
+  def close(self):
+    """Disconnect the spectators and stop serving."""
+
+    if self.thread is None:
+      return
+
+    self.loop.call_soon_threadsafe(self.stopping.set)
+    self.thread.join()
+    self.thread = None
+
+class SpectatorClient():
+  """
+    Connects to a SpectatorServer and reassembles the generations it sends,
+    e.g. for a dashboard or a test. Blocks while waiting for them.
+  """
+
+  def __init__(self, host="127.0.0.1", port=0, timeout=None, receive_buffer_size=None):
+
+    self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if receive_buffer_size is not None:
+      self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer_size)
+    self.socket.settimeout(timeout)
+    self.socket.connect((host, port))
+
+    self.packed_cells = None
+    self.kinds = []
+
+  def close(self):
+    self.socket.close()
+
+  def read_exactly(self, length):
+    """Returns the next length bytes from the server."""
+
+    data = bytearray()
+    while len(data) < length:
+      chunk = self.socket.recv(length - len(data))
+      if not chunk:
+        raise Exception("Spectator server closed the connection")
+      data += chunk
+    return bytes(data)
+
+  def receive(self):
+    """Returns a BoardState of the next generation the server sends."""
+
+    kind, generation, rows, cols, length = struct.unpack(MESSAGE_HEADER_FORMAT,
+      self.read_exactly(MESSAGE_HEADER_SIZE))
+    data = self.read_exactly(length)
+    self.kinds.append(kind)
+
+    if kind == KEYFRAME:
+      self.packed_cells = numpy.frombuffer(data, dtype=numpy.uint8).copy()
+    else:
+      apply_delta(self.packed_cells, kind, data)
+
+    board_state = BoardState(rows, cols)
+    board_state.load_rows(numpy.unpackbits(self.packed_cells, count=rows * cols).reshape(
+      rows, cols))
+    board_state.generation = generation
+    return board_state
+
+  def receive_generation(self, generation):
+    """Returns a BoardState of the given generation, skipping any sent before it."""
+
+    while (board_state := self.receive()).generation < generation:
+      pass
+    return board_state
+
+
+class SpectatorServerTests(unittest.TestCase):
+  """Tests for streaming generations to spectators."""
+
+  def test_spectators_get_a_keyframe_then_deltas(self):
+
+    from board.numpyboardstrategy import NumpyUpdateStrategy
+
+    board_state = BoardState(rows=64, cols=64)
+    board_state.as_2d_view()[0:3, 0:3] = [[0, 1, 0], [0, 0, 1], [1, 1, 1]]
+
+    with SpectatorServer() as server:
+      board_state.add_observer(server)
+      board_state.notify_observers()
+
+      first_client = SpectatorClient(port=server.port, timeout=10)
+      self.assertEqual(first_client.receive().to_string(), board_state.to_string())
+
+      for update in range(0, 5):
+        board_state.update(NumpyUpdateStrategy())
+        self.assertEqual(first_client.receive_generation(board_state.generation).to_string(),
+          board_state.to_string())
+
+      # A spectator joining later starts from the generation it joined at.
+      second_client = SpectatorClient(port=server.port, timeout=10)
+      self.assertEqual(second_client.receive().to_string(), board_state.to_string())
+
+      board_state.update(NumpyUpdateStrategy())
+      for client in (first_client, second_client):
+        self.assertEqual(client.receive_generation(6).to_string(), board_state.to_string())
+        client.close()
+
+    self.assertEqual(first_client.kinds[0], KEYFRAME)
+    self.assertEqual(set(first_client.kinds[1:]), {SPARSE_DELTA})
+    self.assertEqual(second_client.kinds, [KEYFRAME, SPARSE_DELTA])
+
+  def test_slow_spectators_skip_to_the_latest_generation(self):
+
+    from board.numpyboardstrategy import NumpyUpdateStrategy
+
+    board_state = BoardState(rows=256, cols=256)
+    board_state.randomize_state(seed=5)
+
+    with SpectatorServer(max_buffered_bytes=4096) as server:
+      board_state.add_observer(server)
+      board_state.notify_observers()
+
+      # The client doesn't read until every update is done, and the
+      # connection can only hold a little of what was sent meanwhile.
+      client = SpectatorClient(port=server.port, timeout=10, receive_buffer_size=4096)
+      client.receive()
+      for update in range(0, 300):
+        board_state.update(NumpyUpdateStrategy())
+
+      self.assertEqual(client.receive_generation(300).to_string(), board_state.to_string())
+      client.close()
+
+    self.assertLess(len(client.kinds), 100)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,7 +1,30 @@
 from board.boardstate import BoardObserver
 from screen.screen import GameScreen
+import numpy
+import io
+import shutil
 import time
 import sys
+import unittest
+
+# Ways of drawing cells as characters, with the number of rows and columns of
+# cells each character covers.
+CELL_STYLE_DIMENSIONS = {
+  "cells": (1, 1),
+  "half-block": (2, 1),
+  "braille": (4, 2),
+}
+
+# Characters for each cell style, indexed by the bits of the cells a
+# character covers (see DiffAnsiTextScreen.frame_characters).
+CELL_CHARACTERS = numpy.array([ord("-"), ord("X")], dtype=numpy.uint32)
+HALF_BLOCK_CHARACTERS = numpy.array([ord(" "), ord("\u2580"), ord("\u2584"), ord("\u2588")],
+  dtype=numpy.uint32)
+
+# Bit of a braille character for the dot at each (row, col) of its 4x2 cells.
+BRAILLE_DOT_BITS = numpy.array([[0x01, 0x08], [0x02, 0x10], [0x04, 0x20], [0x40, 0x80]],
+  dtype=numpy.uint32)
+BRAILLE_BLANK = 0x2800
 
 class TextScreen(GameScreen, BoardObserver):
   """
@@ -16,7 +39,7 @@ class TextScreen(GameScreen, BoardObserver):
   def on_update(self, board_state):
     """ Display the board."""
 
-    print(board_state.to_string() + "\n")
+    sys.stdout.write(board_state.to_string() + "\n\n")
 
 class AnsiTextScreen(TextScreen):
   """
@@ -36,7 +59,153 @@ class AnsiTextScreen(TextScreen):
       sys.stdout.write("\033[2J")
       self.is_first_update = False
     
-    # Move cursor to origin.
-    sys.stdout.write("\033[1;1H")
+    # Move cursor to origin, and write the board in the same call.
+    sys.stdout.write("\033[1;1H" + board_state.to_string() + "\n\n")
+
+class DiffAnsiTextScreen(AnsiTextScreen):
+  """
+    Display the current board state as text, using ANSI control characters
+    to only rewrite the parts of the terminal that changed.
+
+    The previous frame is kept, and each new frame is compared with it a row
+    at a time. For each changed row, the cursor is moved to the first changed
+    character and the span up to the last changed one is rewritten. The whole
+    frame's output is sent with a single write.
+
+    Boards bigger than the terminal are scaled down to fit, with a character
+    alive if any of the cells it covers are. The cell style picks how many
+    cells each character covers: "cells" draws one cell per character,
+    "half-block" two rows of cells per character using Unicode half blocks,
+    and "braille" a 4x2 block of cells per character using braille dots.
+  """
+
+  def __init__(self, width, height, cell_style="cells", terminal_size=None, output=None):
+
+    if cell_style not in CELL_STYLE_DIMENSIONS:
+      raise Exception("Unknown cell style " + cell_style)
+
+    self.cell_style = cell_style
+    self.terminal_size = terminal_size
+    self.output = output
+    self.previous_frame = None
+
+  def get_terminal_size(self):
+    """Returns the number of (rows, columns) of characters available to draw in."""
+
+    if self.terminal_size is not None:
+      return self.terminal_size
+
+    columns, lines = shutil.get_terminal_size()
+    # Leave the last line free, so that the terminal never scrolls.
+    return max(lines - 1, 1), max(columns, 1)
+
+  def frame_characters(self, cells):
+    """
+      Returns the characters of a frame for a two-dimensional array of cells,
+      as a two-dimensional array of Unicode code points.
+    """
+
+    style_rows, style_cols = CELL_STYLE_DIMENSIONS[self.cell_style]
+    terminal_rows, terminal_cols = self.get_terminal_size()
+
+    # Each character covers a block of (style_rows, style_cols) pixels, and
+    # each pixel covers a block of cells, as many as needed to fit the board
+    # in the terminal.
+    rows, cols = cells.shape
+    scale = max(1,
+      -(-rows // (terminal_rows * style_rows)),
+      -(-cols // (terminal_cols * style_cols)))
+    frame_rows = -(-rows // (scale * style_rows))
+    frame_cols = -(-cols // (scale * style_cols))
+
+    padded_cells = numpy.zeros((frame_rows * style_rows * scale, frame_cols * style_cols * scale),
+      dtype=numpy.uint8)
+    padded_cells[:rows, :cols] = cells
+    pixels = padded_cells.reshape(frame_rows * style_rows, scale,
+      frame_cols * style_cols, scale).max(axis=(1, 3))
+    blocks = pixels.reshape(frame_rows, style_rows, frame_cols, style_cols).astype(numpy.uint32)
+
+    if self.cell_style == "cells":
+      return CELL_CHARACTERS[blocks[:, 0, :, 0]]
+    elif self.cell_style == "half-block":
+      return HALF_BLOCK_CHARACTERS[blocks[:, 0, :, 0] | (blocks[:, 1, :, 0] << 1)]
+    else:
+      dots = numpy.einsum("rack,ak->rc", blocks, BRAILLE_DOT_BITS)
+      return BRAILLE_BLANK + dots.astype(numpy.uint32)
+
+  def on_update(self, board_state):
+    """ Display the board, rewriting only what changed since the last display."""
+
+    frame = self.frame_characters(board_state.read_rows())
+
+    text = io.StringIO()
+
+    if self.previous_frame is None or self.previous_frame.shape != frame.shape:
+      # Nothing to compare against, so clear the screen and draw every row.
+      text.write("\033[2J")
+      changed = numpy.ones(frame.shape, dtype=bool)
+    else:
+      changed = frame != self.previous_frame
+
+    for row in numpy.flatnonzero(changed.any(axis=1)).tolist():
+      changed_cols = numpy.flatnonzero(changed[row])
+      start_col = changed_cols[0]
+      end_col = changed_cols[-1] + 1
+      text.write("\033[" + str(row + 1) + ";" + str(start_col + 1) + "H")
+      text.write(frame[row, start_col:end_col].tobytes().decode("utf-32-le"))
+
+    # Leave the cursor below the board.
+    text.write("\033[" + str(frame.shape[0] + 1) + ";1H")
+
+    output = self.output if self.output is not None else sys.stdout
+    output.write(text.getvalue())
+    output.flush()
+
+    self.previous_frame = frame
+
+
+class DiffAnsiTextScreenTests(unittest.TestCase):
+  """Tests for the diff-based ANSI text display."""
+
+  def test_only_changed_spans_are_rewritten(self):
+
+    from board.boardstate import BoardState
+
+    output = io.StringIO()
+    screen = DiffAnsiTextScreen(0, 0, terminal_size=(10, 10), output=output)
+    board_state = BoardState.from_string(
+      "-----\n" +
+      "-X---\n" +
+      "-----")
+
+    screen.on_update(board_state)
+    self.assertIn("\033[2;1H-X---", output.getvalue())
+
+    output.seek(0)
+    output.truncate()
+    board_state.set_cell(1, 3)
+    screen.on_update(board_state)
+
+    self.assertEqual(output.getvalue(), "\033[2;4HX\033[4;1H")
+
+  def test_large_boards_are_scaled_down(self):
+
+    from board.boardstate import BoardState
+
+    board_state = BoardState(rows=8, cols=8)
+    board_state.set_cell(0, 0)
+    board_state.set_cell(7, 7)
+
+    half_block_screen = DiffAnsiTextScreen(0, 0, cell_style="half-block", terminal_size=(4, 8))
+    self.assertEqual(half_block_screen.frame_characters(board_state.read_rows()).shape, (4, 8))
+
+    braille_screen = DiffAnsiTextScreen(0, 0, cell_style="braille", terminal_size=(1, 2))
+    frame = braille_screen.frame_characters(board_state.read_rows())
+    self.assertEqual(frame.tolist(), [[BRAILLE_BLANK + 0x01, BRAILLE_BLANK + 0x80]])
+
+    cells_screen = DiffAnsiTextScreen(0, 0, terminal_size=(2, 2))
+    frame = cells_screen.frame_characters(board_state.read_rows())
+    self.assertEqual(frame.tolist(), [[ord("X"), ord("-")], [ord("-"), ord("X")]])
 
-    TextScreen.on_update(self, board_state)
+if __name__ == '__main__':
+  unittest.main()
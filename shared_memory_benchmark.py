@@ -0,0 +1,24 @@
+from board.sharedmemoryboardstrategy import benchmark_scaling
+import argparse
+import os
+
+# Show how the shared memory update strategy scales with its number of workers.
+
+def main():
+
+  arg_parser = argparse.ArgumentParser("Shared memory update strategy benchmark")
+
+  arg_parser.add_argument("--cell-dimensions", dest="cell_dimensions", nargs=2, required=False, type=int, default=[2000,2000], help="Number of cell rows and columns")
+  arg_parser.add_argument("--generations", dest="generations", required=False, type=int, default=50, help="Number of generations to time for each worker count")
+  arg_parser.add_argument("--max-workers", dest="max_workers", required=False, type=int, default=os.cpu_count(), help="Largest number of workers to time")
+  args = arg_parser.parse_args()
+
+  results = benchmark_scaling(*args.cell_dimensions, args.generations, args.max_workers)
+
+  single_worker_rate = results[0][1]
+  for workers, cells_per_second in results:
+    print("Workers:", workers, " Update rate:", round(cells_per_second), "cells/s",
+      " Speedup:", round(cells_per_second / single_worker_rate, 2))
+
+if __name__ == '__main__':
+  main()